@@ -8,6 +8,9 @@ import shutil
 import signal
 import traceback
 import argparse # Added for argument parsing
+import json
+import urllib.request
+import urllib.error
 
 #  Constants and Paths (Can be overridden by command-line args)
 UNITY_EXECUTABLE = os.path.abspath(os.path.join("client", "CatanLearner.exe"))
@@ -15,6 +18,8 @@ AI_SERVER_SCRIPT = os.path.join("server", "catan_ai.py")
 TRAINING_SCRIPT = os.path.join("server", "train_from_logs.py")
 ITERATIONS_FOLDER = os.path.join("server", "iterations")
 MODEL_PATH = os.path.join("server", "model_weights.pth")
+TRAINED_WEIGHTS_PATH = os.path.join("server", "model_weights.pth") # State dict written by train_from_logs.py
+RUN_LOG_PATH = os.path.join("server", "run_log.jsonl") # One JSON line per launcher run (server startup times)
 VALID_MODES = {"train", "play", "bulktrain"}
 MAX_GAME_DURATION_SECONDS = 300
 
@@ -22,6 +27,21 @@ MAX_GAME_DURATION_SECONDS = 300
 FORCE_HEADLESS_OVERRIDE = False
 FORCE_GRAPHICAL_OVERRIDE = False
 
+# AI server serving options (passed to catan_ai.py via environment)
+VALID_SERVER_BACKENDS = {"flask", "waitress"}
+SERVER_BACKEND = "flask"
+SERVER_THREADS = 16
+SERVER_REQUEST_TIMEOUT = 30
+VALID_INFERENCE_BACKENDS = {"torch", "quantized", "torchscript", "numpy"}
+INFERENCE_BACKEND = "torch"
+EXPLORATION_SEED = None # Base seed for per-game exploration in train modes (None: unseeded)
+
+# AI server readiness handshake (GET /healthz, polled with exponential backoff)
+SERVER_HEALTH_URL = "http://127.0.0.1:5000/healthz"
+SERVER_STARTUP_TIMEOUT = 120
+READY_POLL_INITIAL_DELAY = 0.05
+READY_POLL_MAX_DELAY = 1.0
+
 # Global Process Tracking
 server_process_global = None
 game_processes_global = []
@@ -112,14 +132,58 @@ def clear_game_logs():
     except Exception as e:
         print(f"[Error] An error occurred during log clearing (Dir: {log_dir}): {e}")
 
+def ensure_numpy_weights():
+    """Converts MODEL_PATH to the .npz read by the NumPy backend if it is missing or older than the weights."""
+    npz_path = os.path.splitext(MODEL_PATH)[0] + ".npz"
+    if not os.path.exists(MODEL_PATH):
+        return # Nothing to convert; the server starts with fresh weights
+    if os.path.exists(npz_path) and os.path.getmtime(npz_path) >= os.path.getmtime(MODEL_PATH):
+        return
+    converter = os.path.join(os.path.dirname(AI_SERVER_SCRIPT), "numpy_policy.py")
+    print(f"Info: Converting {MODEL_PATH} to {npz_path} for the NumPy backend...")
+    result = subprocess.run([sys.executable, converter, "convert", "--weights", MODEL_PATH, "--output", npz_path])
+    if result.returncode != 0:
+        print(f"[Warning] Weight conversion failed (exit code {result.returncode}). The server will retry it at startup.")
+
+def state_dict_path():
+    """The .pth state dict behind MODEL_PATH: MODEL_PATH itself, or the trained weights when it is a TorchScript artifact."""
+    return TRAINED_WEIGHTS_PATH if INFERENCE_BACKEND == "torchscript" else MODEL_PATH
+
+def export_torchscript_model():
+    """Re-exports MODEL_PATH (torchscript backend) from the trained weights if it is missing or older than them."""
+    weights_path = state_dict_path()
+    if not os.path.exists(weights_path):
+        return
+    if os.path.exists(MODEL_PATH) and os.path.getmtime(MODEL_PATH) >= os.path.getmtime(weights_path):
+        return
+    exporter = os.path.join(os.path.dirname(AI_SERVER_SCRIPT), "compiled_model.py")
+    print(f"Info: Exporting {weights_path} to {MODEL_PATH} for the TorchScript backend...")
+    result = subprocess.run([sys.executable, exporter, "--weights", weights_path, "--output", MODEL_PATH, "--export-only"])
+    if result.returncode != 0:
+        print(f"[Warning] TorchScript export failed (exit code {result.returncode}). The server keeps the previous artifact.")
+
 def launch_ai_server(mode):
     """Starts the Python Flask AI server."""
     print("Info: Starting AI Server...")
+    if INFERENCE_BACKEND == "numpy":
+        ensure_numpy_weights()
+    elif INFERENCE_BACKEND == "torchscript":
+        export_torchscript_model()
     print(f"Info: Launching AI Server in {mode.upper()} mode...")
 
 
     env = os.environ.copy()
     env["CATAN_TRAIN_MODE"] = "1" if mode == "train" or mode == "bulktrain" else "0"
+    env["CATAN_SERVER_BACKEND"] = SERVER_BACKEND
+    env["CATAN_SERVER_THREADS"] = str(SERVER_THREADS)
+    env["CATAN_REQUEST_TIMEOUT"] = str(SERVER_REQUEST_TIMEOUT)
+    env["CATAN_WEIGHTS_PATH"] = os.path.abspath(MODEL_PATH) # Server hot-reloads this file after each training run
+    env["CATAN_INFERENCE_BACKEND"] = INFERENCE_BACKEND
+    env["CATAN_CHECKPOINT_DIR"] = os.path.abspath(ITERATIONS_FOLDER) # Checkpoints selectable per request/game by "modelId"
+    if EXPLORATION_SEED is not None:
+        env["CATAN_EXPLORATION_SEED"] = str(EXPLORATION_SEED) # Games sending a "gameId" become replayable
+    print(f"Info: Server backend: {SERVER_BACKEND} (Threads: {SERVER_THREADS}, Request timeout: {SERVER_REQUEST_TIMEOUT}s, "
+          f"Inference: {INFERENCE_BACKEND})")
     try:
         server_process = subprocess.Popen([sys.executable, AI_SERVER_SCRIPT], env=env)
         print(f"Info: AI Server started with PID: {server_process.pid}")
@@ -131,6 +195,59 @@ def launch_ai_server(mode):
         print(f"[Error] Failed to launch AI Server: {e}")
         return None
 
+def wait_for_server_ready(server_proc, timeout_seconds):
+    """
+    Polls the AI server's /healthz endpoint with exponential backoff until it reports ready.
+    Returns the health report (dict) with the launcher-measured "readySeconds" added,
+    or None if the server exits or does not become ready within timeout_seconds.
+    """
+    start_time = time.time()
+    deadline = start_time + timeout_seconds
+    delay = READY_POLL_INITIAL_DELAY
+    last_problem = "no response"
+    while True:
+        if server_proc.poll() is not None:
+            print(f"[Error] AI Server exited during startup (exit code {server_proc.returncode}).")
+            return None
+        try:
+            with urllib.request.urlopen(SERVER_HEALTH_URL, timeout=2) as response:
+                health = json.loads(response.read())
+            if health.get("ready"):
+                health["readySeconds"] = time.time() - start_time
+                return health
+            last_problem = "server reports not ready"
+        except urllib.error.HTTPError as e: # 503 while the model or batcher is not up yet
+            last_problem = f"HTTP {e.code}"
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            last_problem = str(getattr(e, "reason", e))
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            print(f"[Error] AI Server was not ready after {timeout_seconds}s ({SERVER_HEALTH_URL}: {last_problem}). "
+                  f"Increase --startup-timeout if the machine is just slow.")
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, READY_POLL_MAX_DELAY)
+
+def record_run_start(mode, health):
+    """Appends the server startup time of this run to RUN_LOG_PATH so it can be tracked across runs."""
+    entry = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": mode,
+        "serverBackend": SERVER_BACKEND,
+        "inferenceBackend": INFERENCE_BACKEND,
+        "device": health.get("device"),
+        "weightsVersion": health.get("weightsVersion"),
+        "serverStartupSeconds": health.get("startupSeconds"), # Measured by the server (imports + model load)
+        "readySeconds": round(health["readySeconds"], 3), # Measured by the launcher (process launch -> ready)
+        "explorationSeed": EXPLORATION_SEED,
+    }
+    try:
+        with open(RUN_LOG_PATH, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"[Warning] Could not write run log {RUN_LOG_PATH}: {e}")
+
 def launch_game(mode):
     """Launches the Unity game executable with arguments."""
     headless_flags = []
@@ -177,6 +294,8 @@ def train_model(mode):
         result = subprocess.run([sys.executable, TRAINING_SCRIPT, mode], check=False)
         if result.returncode == 0: print("Info: Training completed successfully.\n")
         else: print(f"[Warning] Training script exited with code {result.returncode}.\n")
+        if INFERENCE_BACKEND == "torchscript":
+            export_torchscript_model() # Training writes .pth; the server hot-reloads the re-exported artifact
     except FileNotFoundError:
         print(f"[Error] Training script not found: {TRAINING_SCRIPT}")
     except Exception as e:
@@ -197,16 +316,22 @@ def shutdown(server_proc):
             print(f"[Error] Error shutting down server: {e}")
 
 def save_model_checkpoint(set_num):
-    """Saves a numbered checkpoint copy of the current model weights."""
-    if not os.path.exists(MODEL_PATH):
-        print(f"[Warning] Main model file {MODEL_PATH} not found. Cannot create checkpoint.")
+    """Saves a numbered checkpoint copy of the current model weights (always the .pth state dict)."""
+    weights_path = state_dict_path()
+    if not os.path.exists(weights_path):
+        print(f"[Warning] Main model file {weights_path} not found. Cannot create checkpoint.")
         return
     os.makedirs(ITERATIONS_FOLDER, exist_ok=True)
     save_name = f"settlerbot_{set_num}.pth"
     save_path = os.path.join(ITERATIONS_FOLDER, save_name)
     try:
-        shutil.copy2(MODEL_PATH, save_path)
+        shutil.copy2(weights_path, save_path)
         print(f"Info: Saved model checkpoint to {save_path}")
+        npz_path = os.path.splitext(weights_path)[0] + ".npz"
+        if os.path.exists(npz_path): # Lets a numpy-backend server route to this checkpoint too
+            shutil.copy2(npz_path, os.path.splitext(save_path)[0] + ".npz")
+        if INFERENCE_BACKEND == "torchscript" and os.path.exists(MODEL_PATH): # Likewise for torchscript
+            shutil.copy2(MODEL_PATH, os.path.splitext(save_path)[0] + ".pt")
     except Exception as e:
         print(f"[Error] Failed to save model checkpoint to {save_path}: {e}")
 
@@ -333,6 +458,8 @@ def parse_args():
     """Parses command line arguments and overrides global constants if provided."""
     global MAX_GAME_DURATION_SECONDS, UNITY_EXECUTABLE, AI_SERVER_SCRIPT
     global TRAINING_SCRIPT, MODEL_PATH, FORCE_HEADLESS_OVERRIDE, FORCE_GRAPHICAL_OVERRIDE
+    global SERVER_BACKEND, SERVER_THREADS, SERVER_REQUEST_TIMEOUT, INFERENCE_BACKEND, SERVER_STARTUP_TIMEOUT
+    global EXPLORATION_SEED
 
     parser = argparse.ArgumentParser(description="Launch Catan AI Bot Matches.", add_help=False) # Defer help
 
@@ -361,6 +488,27 @@ def parse_args():
     optional.add_argument('--model-weights', type=str, metavar='PATH',
                         help=f'Override path to model weights file (default: {MODEL_PATH})')
     
+    optional.add_argument('--server-backend', type=str, choices=sorted(VALID_SERVER_BACKENDS),
+                        help=f'AI server backend: flask (development server) or waitress (multi-threaded production server) (default: {SERVER_BACKEND})')
+
+    optional.add_argument('--server-threads', type=int, metavar='N',
+                        help=f'Number of worker threads for the waitress backend (default: {SERVER_THREADS})')
+
+    optional.add_argument('--request-timeout', type=int, metavar='SECONDS',
+                        help=f'AI server request/keep-alive timeout (default: {SERVER_REQUEST_TIMEOUT}s)')
+
+    optional.add_argument('--backend', type=str, choices=sorted(VALID_INFERENCE_BACKENDS),
+                        help=f'Inference backend: torch (fp32), quantized (int8 TorchScript built from the weights) or '
+                             f'torchscript (--model-weights is an artifact exported by server/compiled_model.py) or '
+                             f'numpy (no torch in the server process) (default: {INFERENCE_BACKEND})')
+
+    optional.add_argument('--startup-timeout', type=int, metavar='SECONDS',
+                        help=f'Maximum time to wait for the AI server to report ready on /healthz (default: {SERVER_STARTUP_TIMEOUT}s)')
+
+    optional.add_argument('--seed', type=int, metavar='N',
+                        help='Base seed for train-mode exploration: each game (by its gameId) gets its own seeded generator, '
+                             'so its moves can be replayed exactly (default: unseeded)')
+
     optional.add_argument('-h', '--help', action='store_true', help='Show this help message and exit')
 
 
@@ -397,6 +545,31 @@ def parse_args():
     if args.model_weights:
         MODEL_PATH = os.path.abspath(args.model_weights)
         print(f"[Override] Model weights path set to: {MODEL_PATH}")
+    if args.server_backend:
+        SERVER_BACKEND = args.server_backend
+        print(f"[Override] AI server backend set to: {SERVER_BACKEND}")
+    if args.server_threads is not None:
+        if args.server_threads < 1:
+            print("[Error] --server-threads must be a positive integer."); sys.exit(1)
+        SERVER_THREADS = args.server_threads
+        print(f"[Override] AI server threads set to: {SERVER_THREADS}")
+    if args.request_timeout is not None:
+        if args.request_timeout < 1:
+            print("[Error] --request-timeout must be a positive integer."); sys.exit(1)
+        SERVER_REQUEST_TIMEOUT = args.request_timeout
+        print(f"[Override] AI server request timeout set to: {SERVER_REQUEST_TIMEOUT}s")
+
+    if args.backend:
+        INFERENCE_BACKEND = args.backend
+        print(f"[Override] Inference backend set to: {INFERENCE_BACKEND}")
+    if args.startup_timeout is not None:
+        if args.startup_timeout < 1:
+            print("[Error] --startup-timeout must be a positive integer."); sys.exit(1)
+        SERVER_STARTUP_TIMEOUT = args.startup_timeout
+        print(f"[Override] AI server startup timeout set to: {SERVER_STARTUP_TIMEOUT}s")
+    if args.seed is not None:
+        EXPLORATION_SEED = args.seed
+        print(f"[Override] Exploration seed set to: {EXPLORATION_SEED}")
 
     return remaining_args # Return positional arguments for mode processing
 
@@ -461,8 +634,14 @@ if __name__ == "__main__":
         server_process_global = launch_ai_server(mode)
         if not server_process_global:
             sys.exit(1)
-        print("Info: Waiting for AI server to initialize...")
-        time.sleep(5)
+        print(f"Info: Waiting for AI server to become ready (Timeout: {SERVER_STARTUP_TIMEOUT}s)...")
+        health = wait_for_server_ready(server_process_global, SERVER_STARTUP_TIMEOUT)
+        if health is None:
+            shutdown(server_process_global)
+            sys.exit(1)
+        print(f"Info: AI Server ready in {health['readySeconds']:.2f}s "
+              f"(Device: {health.get('device')}, Weights version: {health.get('weightsVersion')}).")
+        record_run_start(mode, health)
 
         if mode == "bulktrain":
             launch_bulk_train(games_per_set_bulk, num_sets_bulk, game_processes_global)
@@ -3,6 +3,8 @@ import logging
 import logging
 from typing import Optional
 
+import numpy as np
+
 #  Constants from game rules 
 NUM_ROADS = 72
 NUM_INTERSECTIONS = 54
@@ -47,6 +49,26 @@ TOTAL_ACTIONS = END_TURN_ACTION_END
 logging.info(f"Total number of theoretical actions defined: {TOTAL_ACTIONS}") # Should be 201
 
 
+#  Reverse lookup: action index -> action dict (same format as availableActions entries)
+ACTION_INDEX_TO_DICT = (
+    [{"actionType": "BUILD_ROAD", "edgeIndex": i} for i in range(NUM_ROADS)] +
+    [{"actionType": "BUILD_SETTLEMENT", "intersectionIndex": i} for i in range(NUM_INTERSECTIONS)] +
+    [{"actionType": "BUILD_CITY", "intersectionIndex": i} for i in range(NUM_INTERSECTIONS)] +
+    [{"actionType": "BANK_TRADE_4_1", "resourceOut": res_out, "resourceIn": res_in}
+     for (res_out, res_in), _ in sorted(BANK_TRADE_MAPPING.items(), key=lambda item: item[1])] +
+    [{"actionType": "END_TURN"}]
+)
+assert len(ACTION_INDEX_TO_DICT) == TOTAL_ACTIONS
+
+
+def get_action_from_index(action_idx: int) -> Optional[dict]:
+    """Maps a global action index back to a (fresh) action dictionary."""
+    if 0 <= action_idx < TOTAL_ACTIONS:
+        return dict(ACTION_INDEX_TO_DICT[action_idx])
+    logging.warning(f"Action index out of range: {action_idx}")
+    return None
+
+
 #  Function to get action index from action object 
 def get_action_index(action_dict: dict) -> Optional[int]:
     """Maps an action dictionary (from availableActions) to its global index."""
@@ -75,6 +97,57 @@ def get_action_index(action_dict: dict) -> Optional[int]:
     logging.warning(f"Could not map action to index: {action_dict}")
     return None
 
+#  Precomputed lookup: action dict fields -> global index, for building masks without the if/elif chain
+_INDEX_FIELD = {"BUILD_ROAD": "edgeIndex", "BUILD_SETTLEMENT": "intersectionIndex", "BUILD_CITY": "intersectionIndex"}
+ACTION_KEY_TO_INDEX = {}
+for _idx, _action in enumerate(ACTION_INDEX_TO_DICT):
+    if _action["actionType"] == "BANK_TRADE_4_1":
+        ACTION_KEY_TO_INDEX[("BANK_TRADE_4_1", _action["resourceOut"], _action["resourceIn"])] = _idx
+    else:
+        ACTION_KEY_TO_INDEX[(_action["actionType"], _action.get(_INDEX_FIELD.get(_action["actionType"])))] = _idx
+
+
+def lookup_action_index(action_dict) -> Optional[int]:
+    """Table lookup equivalent of get_action_index, without logging; None for unmappable actions."""
+    try:
+        action_type = action_dict.get("actionType")
+        if action_type == "BANK_TRADE_4_1":
+            return ACTION_KEY_TO_INDEX.get((action_type, action_dict.get("resourceOut"), action_dict.get("resourceIn")))
+        return ACTION_KEY_TO_INDEX.get((action_type, action_dict.get(_INDEX_FIELD.get(action_type))))
+    except (AttributeError, TypeError): # Not a dict, or unhashable field values
+        return None
+
+
+def build_action_masks(available_actions_lists, num_actions=TOTAL_ACTIONS):
+    """
+    Turns a batch of availableActions lists into a boolean (N, num_actions) mask of the
+    mappable actions and, per row, a dict from action index back to the action dict
+    (the last of duplicate entries wins). Unmappable entries are left out and counted in
+    one warning per batch.
+    """
+    mask = np.zeros((len(available_actions_lists), num_actions), dtype=bool)
+    lookups = []
+    unmapped = 0
+    for row, available_actions in enumerate(available_actions_lists):
+        lookup = {}
+        for action_dict in available_actions or ():
+            action_idx = lookup_action_index(action_dict)
+            if action_idx is not None and action_idx < num_actions:
+                lookup[action_idx] = action_dict
+            else:
+                unmapped += 1
+        mask[row, list(lookup)] = True
+        lookups.append(lookup)
+    if unmapped:
+        logging.warning(f"{unmapped} available action(s) could not be mapped to an index and were left out of the mask.")
+    return mask, lookups
+
+
+def build_action_mask(available_actions, num_actions=TOTAL_ACTIONS):
+    """Single-list build_action_masks: returns a (num_actions,) mask and the index -> action dict lookup."""
+    mask, lookups = build_action_masks([available_actions], num_actions)
+    return mask[0], lookups[0]
+
 #  Direct Testing
 if __name__ == "__main__":
     test_actions = [
@@ -0,0 +1,181 @@
+# server/benchmark_server.py
+#
+# Load benchmark for the AI server: requests/sec and latency percentiles at several
+# client concurrency levels, for each serving backend.
+#
+# Usage (from the project root):
+#   python server/benchmark_server.py                       # flask vs waitress at 1, 8, 32, 64 clients
+#   python server/benchmark_server.py --backends waitress --concurrency 1 64 --duration 20
+#   python server/benchmark_server.py --url http://localhost:5000   # benchmark an already running server
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_SCRIPT = os.path.join(SCRIPT_DIR, "catan_ai.py")
+
+RESOURCE_NAMES = ["WOOD", "BRICK", "SHEEP", "WHEAT", "STONE"]
+HEX_RESOURCES = RESOURCE_NAMES + ["DESERT"]
+NUMBER_TOKENS = [2, 3, 4, 5, 6, 8, 9, 10, 11, 12]
+
+
+def make_dummy_state(rng=random, num_actions=12):
+    """Builds a random but schema-valid State JSON object (as documented in the README)."""
+    actions = [{"actionType": "BUILD_ROAD", "edgeIndex": rng.randint(0, 71)} for _ in range(num_actions // 2)]
+    actions += [{"actionType": "BUILD_SETTLEMENT", "intersectionIndex": rng.randint(0, 53)} for _ in range(num_actions // 4)]
+    actions += [{"actionType": "BANK_TRADE_4_1", "resourceOut": rng.choice(RESOURCE_NAMES), "resourceIn": rng.choice(RESOURCE_NAMES)}]
+    actions.append({"actionType": "END_TURN"})
+
+    buildings = []
+    for i in range(54):
+        owner = rng.choice([-1, -1, -1, 0, 1])
+        buildings.append({"id": i, "ownerPlayerIndex": owner,
+                          "type": "NONE" if owner == -1 else rng.choice(["SETTLEMENT", "CITY"])})
+    return {
+        "gameStateId": f"bench_{rng.randint(0, 10**6)}",
+        "currentPlayerIndex": rng.choice([0, 1]),
+        "diceResult": rng.randint(2, 12),
+        "hexes": [{"id": i, "resource": rng.choice(HEX_RESOURCES), "numberToken": rng.choice(NUMBER_TOKENS + [None])} for i in range(19)],
+        "roads": [{"id": i, "ownerPlayerIndex": rng.choice([-1, -1, -1, 0, 1])} for i in range(72)],
+        "buildings": buildings,
+        "players": [{"index": p, "resources": {r: rng.randint(0, 8) for r in RESOURCE_NAMES},
+                     "victoryPoints": rng.randint(0, 9)} for p in range(2)],
+        "availableActions": actions,
+    }
+
+
+def wait_for_server(host, port, timeout=60.0):
+    """Polls /healthz until the server reports ready. Returns True when ready."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/healthz")
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            if response.status == 200:
+                return True
+            time.sleep(0.2)
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_load(host, port, path, payloads, concurrency, duration, content_type="application/json"):
+    """
+    Runs `concurrency` client threads for `duration` seconds. Each client keeps one
+    HTTP/1.1 connection alive and sends requests back to back.
+    Returns (requests_per_second, latencies_ms ndarray, error_count).
+    """
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    start_barrier = threading.Barrier(concurrency + 1)
+    stop_at = [0.0]
+
+    def client(worker_idx):
+        rng = random.Random(worker_idx)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        headers = {"Content-Type": content_type, "Connection": "keep-alive"}
+        start_barrier.wait()
+        while time.perf_counter() < stop_at[0]:
+            body = payloads[rng.randrange(len(payloads))]
+            t0 = time.perf_counter()
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[worker_idx] += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                errors[worker_idx] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            latencies[worker_idx].append((time.perf_counter() - t0) * 1000.0)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    stop_at[0] = time.perf_counter() + duration
+    wall_start = time.perf_counter()
+    start_barrier.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - wall_start
+
+    all_latencies = np.array([lat for per_client in latencies for lat in per_client], dtype=np.float64)
+    return len(all_latencies) / elapsed, all_latencies, sum(errors)
+
+
+def start_server(backend, port, threads, extra_env=None):
+    env = os.environ.copy()
+    env["CATAN_SERVER_BACKEND"] = backend
+    env["CATAN_SERVER_PORT"] = str(port)
+    env["CATAN_SERVER_THREADS"] = str(threads)
+    env.setdefault("CATAN_TRAIN_MODE", "0")
+    if extra_env:
+        env.update(extra_env)
+    return subprocess.Popen([sys.executable, SERVER_SCRIPT], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def print_row(label, concurrency, rps, latencies, errors):
+    if latencies.size:
+        p50, p99 = np.percentile(latencies, [50, 99])
+    else:
+        p50 = p99 = float("nan")
+    print(f"{label:<10} {concurrency:>7} {rps:>10.1f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Catan AI server.")
+    parser.add_argument("--backends", nargs="+", default=["flask", "waitress"], choices=["flask", "waitress"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--threads", type=int, default=16, help="Worker threads for the waitress backend")
+    parser.add_argument("--port", type=int, default=5055, help="Port used for servers started by the benchmark")
+    parser.add_argument("--url", type=str, default=None, help="Benchmark an already running server instead")
+    parser.add_argument("--states", type=int, default=256, help="Number of distinct random states to send")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    payloads = [json.dumps(make_dummy_state(rng)).encode("utf-8") for _ in range(args.states)]
+
+    print(f"{'backend':<10} {'clients':>7} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    if args.url:
+        parsed = urlparse(args.url)
+        for concurrency in args.concurrency:
+            rps, latencies, errors = run_load(parsed.hostname, parsed.port or 80, "/get_action", payloads, concurrency, args.duration)
+            print_row("external", concurrency, rps, latencies, errors)
+        return
+
+    for backend in args.backends:
+        server = start_server(backend, args.port, args.threads)
+        try:
+            if not wait_for_server("127.0.0.1", args.port):
+                print(f"[Error] {backend} server did not come up on port {args.port}.")
+                continue
+            for concurrency in args.concurrency:
+                rps, latencies, errors = run_load("127.0.0.1", args.port, "/get_action", payloads, concurrency, args.duration)
+                print_row(backend, concurrency, rps, latencies, errors)
+        finally:
+            server.terminate()
+            try: server.wait(timeout=10)
+            except subprocess.TimeoutExpired: server.kill()
+
+
+if __name__ == "__main__":
+    main()
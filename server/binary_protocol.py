@@ -0,0 +1,231 @@
+# server/binary_protocol.py
+#
+# Compact binary form of the State JSON. One state is a fixed 240-byte record followed by
+# a packed list of uint16 action indices (see action_mapping.py), all little-endian:
+#
+#   offset size  field
+#   0      4     magic b"CATN"
+#   4      1     format version (1)
+#   5      1     currentPlayerIndex
+#   6      1     diceResult (0 = none / not a 2-12 roll)
+#   7      1     section flags (game_state_encoder.SECTION_*; a cleared flag means "section missing")
+#   8      19    hex resource      (index into HEX_RESOURCE_TYPES)
+#   27     19    hex number token  (0 = none)
+#   46     72    road owner        (int8, -1 = empty)
+#   118    54    building owner    (int8, -1 = empty)
+#   172    54    building type     (index into BUILDING_TYPES)
+#   226    10    player resources  (2 players x RESOURCE_ORDER, saturating at 255)
+#   236    2     player victory points
+#   238    2     number of available actions (uint16)
+#   240    2*n   available action indices (uint16)
+#
+# A batch (for /get_actions) is b"CATB" + uint32 count, followed by `count` state records.
+
+import json
+import logging
+import random
+import struct
+import time
+
+import numpy as np
+
+try:
+    if __package__:
+        from .game_state_encoder import (vectorize_state, vectorize_index_arrays, HEX_RES_TO_INDEX, HEX_RESOURCE_TYPES,
+                                         BUILDING_TYPE_TO_INDEX, RESOURCE_ORDER, NUM_HEXES, NUM_ROADS,
+                                         NUM_INTERSECTIONS, NUM_PLAYERS, NUM_RESOURCES, SECTION_HEXES,
+                                         SECTION_ROADS, SECTION_BUILDINGS, SECTION_PLAYERS)
+        from .action_mapping import get_action_index, ACTION_INDEX_TO_DICT, TOTAL_ACTIONS
+    else:
+        from game_state_encoder import (vectorize_state, vectorize_index_arrays, HEX_RES_TO_INDEX, HEX_RESOURCE_TYPES,
+                                        BUILDING_TYPE_TO_INDEX, RESOURCE_ORDER, NUM_HEXES, NUM_ROADS,
+                                        NUM_INTERSECTIONS, NUM_PLAYERS, NUM_RESOURCES, SECTION_HEXES,
+                                        SECTION_ROADS, SECTION_BUILDINGS, SECTION_PLAYERS)
+        from action_mapping import get_action_index, ACTION_INDEX_TO_DICT, TOTAL_ACTIONS
+except ImportError as e:
+    logging.error(f"Binary Protocol Import Error: {e}")
+    raise
+
+BINARY_STATE_CONTENT_TYPE = "application/x-catan-state"
+
+STATE_MAGIC = b"CATN"
+BATCH_MAGIC = b"CATB"
+FORMAT_VERSION = 1
+
+STATE_RECORD_DTYPE = np.dtype([
+    ("magic", "S4"),
+    ("version", "u1"),
+    ("current_player", "u1"),
+    ("dice", "u1"),
+    ("sections", "u1"),
+    ("hex_resource", "u1", (NUM_HEXES,)),
+    ("hex_token", "u1", (NUM_HEXES,)),
+    ("road_owner", "i1", (NUM_ROADS,)),
+    ("building_owner", "i1", (NUM_INTERSECTIONS,)),
+    ("building_type", "u1", (NUM_INTERSECTIONS,)),
+    ("player_resources", "u1", (NUM_PLAYERS, NUM_RESOURCES)),
+    ("player_vp", "u1", (NUM_PLAYERS,)),
+    ("num_actions", "<u2"),
+])
+STATE_RECORD_SIZE = STATE_RECORD_DTYPE.itemsize # 240 bytes
+ACTION_DTYPE = np.dtype("<u2")
+BATCH_HEADER = struct.Struct("<4sI")
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+def _owner_code(owner):
+    return owner if isinstance(owner, int) and 0 <= owner < NUM_PLAYERS else -1
+
+
+#  Encoding (used by test clients and tools)
+def encode_state(state_data: dict) -> bytes:
+    """Packs a State JSON dict into the binary state format."""
+    record = np.zeros(1, dtype=STATE_RECORD_DTYPE)[0]
+    record["magic"] = STATE_MAGIC
+    record["version"] = FORMAT_VERSION
+    record["current_player"] = _clamp(state_data.get("currentPlayerIndex", 0), 0, 255)
+    dice_result = state_data.get("diceResult", 0)
+    record["dice"] = dice_result if isinstance(dice_result, int) and 2 <= dice_result <= 12 else 0
+
+    sections = 0
+    hexes = state_data.get("hexes", [])
+    if len(hexes) == NUM_HEXES:
+        sections |= SECTION_HEXES
+        record["hex_resource"] = [HEX_RES_TO_INDEX.get(h.get("resource", "DESERT"), len(HEX_RESOURCE_TYPES) - 1) for h in hexes]
+        record["hex_token"] = [_clamp(h.get("numberToken") or 0, 0, 255) for h in hexes]
+
+    roads = state_data.get("roads", [])
+    if len(roads) == NUM_ROADS:
+        sections |= SECTION_ROADS
+        record["road_owner"] = [_owner_code(r.get("ownerPlayerIndex", -1)) for r in roads]
+    else:
+        record["road_owner"] = -1
+
+    buildings = state_data.get("buildings", [])
+    if len(buildings) == NUM_INTERSECTIONS:
+        sections |= SECTION_BUILDINGS
+        record["building_owner"] = [_owner_code(b.get("ownerPlayerIndex", -1)) for b in buildings]
+        record["building_type"] = [BUILDING_TYPE_TO_INDEX.get(b.get("type", "NONE"), 0) for b in buildings]
+    else:
+        record["building_owner"] = -1
+
+    players = state_data.get("players", [])
+    if len(players) == NUM_PLAYERS:
+        sections |= SECTION_PLAYERS
+        for i, player_info in enumerate(players):
+            resources = player_info.get("resources", {})
+            record["player_resources"][i] = [_clamp(resources.get(res, 0), 0, 255) for res in RESOURCE_ORDER]
+            record["player_vp"][i] = _clamp(player_info.get("victoryPoints", 0), 0, 255)
+    record["sections"] = sections
+
+    action_indices = []
+    for action_dict in state_data.get("availableActions") or []:
+        action_idx = get_action_index(action_dict)
+        if action_idx is not None:
+            action_indices.append(action_idx)
+    record["num_actions"] = len(action_indices)
+
+    return record.tobytes() + np.asarray(action_indices, dtype=ACTION_DTYPE).tobytes()
+
+
+def encode_states(states) -> bytes:
+    """Packs a list of State JSON dicts into one binary batch body."""
+    return BATCH_HEADER.pack(BATCH_MAGIC, len(states)) + b"".join(encode_state(s) for s in states)
+
+
+#  Decoding (server side)
+def _read_records(body: bytes, count: int, offset: int):
+    """Walks `count` variable-length records; returns (records array, list of action index arrays)."""
+    records = []
+    action_lists = []
+    for _ in range(count):
+        if len(body) - offset < STATE_RECORD_SIZE:
+            raise ValueError("Truncated binary state record")
+        record = np.frombuffer(body, dtype=STATE_RECORD_DTYPE, count=1, offset=offset)
+        if record["magic"][0] != STATE_MAGIC or record["version"][0] != FORMAT_VERSION:
+            raise ValueError("Bad binary state header (magic/version mismatch)")
+        offset += STATE_RECORD_SIZE
+        num_actions = int(record["num_actions"][0])
+        if len(body) - offset < num_actions * ACTION_DTYPE.itemsize:
+            raise ValueError("Truncated binary action list")
+        actions = np.frombuffer(body, dtype=ACTION_DTYPE, count=num_actions, offset=offset)
+        offset += num_actions * ACTION_DTYPE.itemsize
+        if actions.size and int(actions.max()) >= TOTAL_ACTIONS:
+            raise ValueError("Binary action index out of range")
+        records.append(record)
+        action_lists.append(actions)
+    return (np.concatenate(records) if records else np.zeros(0, dtype=STATE_RECORD_DTYPE)), action_lists, offset
+
+
+def records_to_vectors(records) -> np.ndarray:
+    """Decodes an array of STATE_RECORD_DTYPE records straight into (N, TOTAL_VECTOR_SIZE) state vectors."""
+    return vectorize_index_arrays(records["hex_resource"], records["hex_token"], records["road_owner"],
+                                  records["building_owner"], records["building_type"], records["player_resources"],
+                                  records["player_vp"], records["current_player"], records["dice"],
+                                  sections=records["sections"])
+
+
+def action_dicts(action_indices):
+    """Expands packed action indices into availableActions-style dicts."""
+    return [dict(ACTION_INDEX_TO_DICT[i]) for i in action_indices.tolist()]
+
+
+def decode_state(body: bytes):
+    """
+    Decodes one binary state. Returns (state_vector, action_indices, current_player_index).
+    Raises ValueError on malformed input.
+    """
+    records, action_lists, _ = _read_records(body, 1, 0)
+    return records_to_vectors(records)[0], action_lists[0], int(records["current_player"][0])
+
+
+def decode_states(body: bytes):
+    """
+    Decodes a binary batch. Returns ((N, TOTAL_VECTOR_SIZE) state vectors, list of action index arrays).
+    Raises ValueError on malformed input.
+    """
+    if len(body) < BATCH_HEADER.size:
+        raise ValueError("Truncated binary batch header")
+    magic, count = BATCH_HEADER.unpack_from(body, 0)
+    if magic != BATCH_MAGIC:
+        raise ValueError("Bad binary batch header")
+    records, action_lists, _ = _read_records(body, count, BATCH_HEADER.size)
+    return records_to_vectors(records), action_lists
+
+
+#  Benchmark: JSON parse + vectorize_state vs binary decode
+if __name__ == "__main__":
+    if __package__:
+        from .benchmark_server import make_dummy_state
+    else:
+        from benchmark_server import make_dummy_state
+
+    rng = random.Random(0)
+    states = [make_dummy_state(rng) for _ in range(2000)]
+    json_bodies = [json.dumps(s).encode("utf-8") for s in states]
+    binary_bodies = [encode_state(s) for s in states]
+
+    # Both paths must produce identical vectors
+    for state, body in zip(states[:200], binary_bodies[:200]):
+        assert np.array_equal(vectorize_state(state), decode_state(body)[0]), "Binary decode mismatch!"
+
+    def bench(label, fn, bodies):
+        t0 = time.perf_counter()
+        for body in bodies:
+            fn(body)
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<28} {len(bodies) / elapsed:>12.0f} states/s  {elapsed / len(bodies) * 1e6:>8.1f} us/state")
+
+    print(f"Average body size: JSON {np.mean([len(b) for b in json_bodies]):.0f} bytes, "
+          f"binary {np.mean([len(b) for b in binary_bodies]):.0f} bytes")
+    bench("JSON loads + vectorize_state", lambda b: vectorize_state(json.loads(b)), json_bodies)
+    bench("binary decode_state", decode_state, binary_bodies)
+
+    batch_body = encode_states(states)
+    t0 = time.perf_counter()
+    vectors, _ = decode_states(batch_body)
+    elapsed = time.perf_counter() - t0
+    print(f"{'binary decode_states (batch)':<28} {len(states) / elapsed:>12.0f} states/s  {elapsed / len(states) * 1e6:>8.1f} us/state")
@@ -0,0 +1,231 @@
+# server/board_topology.py
+#
+# Geometry of the 19-hex / 54-intersection / 72-edge board, in the game client's index order:
+# edge e joins the two intersections of Board.edgePairs[e], and hex h (0-18) is the tile with
+# HexTile.Id h + 1. Built once at import as compact NumPy arrays:
+#   - HEX_INTERSECTIONS (19, 6): the corners of each hex
+#   - CSR neighbour lists (offsets, indices): the entries of row i are
+#     indices[offsets[i]:offsets[i + 1]] (see neighbours())
+#       INTERSECTION_HEXES, INTERSECTION_EDGES, INTERSECTION_NEIGHBOURS, EDGE_NEIGHBOURS, HEX_NEIGHBOURS
+#   - INTERSECTION_DISTANCES (54, 54): number of edges on the shortest path between intersections
+#   - Python int bitmasks of the same adjacency, for set-style rules (see legal_moves.py)
+#
+# Usage (from the project root):
+#   python server/board_topology.py                         # table summary, checked against client/SelfPlayLogs
+#   python server/board_topology.py --log-dir path/to/logs
+
+import argparse
+import logging
+import os
+from collections import deque
+
+import numpy as np
+
+try:
+    if __package__:
+        from .game_state_encoder import NUM_HEXES, NUM_ROADS, NUM_INTERSECTIONS, NUM_PLAYERS
+        from .log_reader import GameLogReader
+    else:
+        from game_state_encoder import NUM_HEXES, NUM_ROADS, NUM_INTERSECTIONS, NUM_PLAYERS
+        from log_reader import GameLogReader
+except ImportError as e:
+    logging.error(f"Board Topology Import Error: {e}")
+    raise
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LOG_DIR = os.path.join(SCRIPT_DIR, "..", "client", "SelfPlayLogs")
+
+CORNERS_PER_HEX = 6
+HEX_ID_BASE = 1 # HexTile.Id of hex 0
+
+#  Source tables (game client order)
+# Board.edgePairs: road index -> the two intersections it joins
+EDGE_INTERSECTIONS_LIST = (
+    (0, 1), (1, 2), (2, 3), (3, 4), (4, 5), (6, 7), (7, 8), (7, 34), (34, 33), (34, 35),
+    (33, 4), (33, 32), (32, 31), (32, 49), (31, 30), (30, 29), (29, 28), (28, 27), (30, 47), (29, 0),
+    (27, 26), (27, 46), (46, 47), (47, 48), (46, 45), (48, 53), (48, 49), (49, 50), (50, 51), (50, 35),
+    (35, 36), (36, 37), (36, 9), (9, 10), (10, 11), (11, 12), (9, 8), (12, 37), (37, 38), (38, 39),
+    (38, 51), (51, 52), (52, 41), (52, 53), (53, 44), (44, 43), (44, 45), (45, 24), (24, 23), (25, 24),
+    (23, 22), (22, 21), (22, 43), (43, 42), (42, 19), (42, 41), (41, 40), (40, 17), (40, 39), (39, 14),
+    (14, 15), (15, 16), (16, 17), (17, 18), (18, 19), (19, 20), (20, 21), (12, 13), (13, 14), (5, 6),
+    (2, 31), (26, 25),
+)
+
+# Intersection -> HexTile.Id of the tiles it touches (coast intersections 0-29 run around the
+# outer ring, 30-53 are the inner ones)
+INTERSECTION_HEX_IDS_LIST = (
+    (1,), (1,), (1, 2), (2,), (2, 3), (3,), (3,), (3, 7), (7,), (7, 12),
+    (12,), (12,), (12, 16), (16,), (16, 19), (19,), (19,), (19, 18), (18,), (18, 17),
+    (17,), (17,), (17, 13), (13,), (13, 8), (8,), (8,), (8, 4), (4,), (4, 1),
+    (4, 1, 5), (1, 5, 2), (5, 2, 6), (2, 6, 3), (6, 3, 7), (6, 7, 11), (7, 11, 12), (11, 12, 16), (11, 16, 15), (16, 15, 19),
+    (15, 19, 18), (15, 18, 14), (18, 14, 17), (14, 17, 13), (14, 13, 9), (13, 9, 8), (9, 8, 4), (9, 4, 5), (9, 5, 10), (5, 10, 6),
+    (10, 6, 11), (10, 11, 15), (10, 15, 14), (10, 14, 9),
+)
+
+
+def _csr(rows):
+    """List of index lists -> (offsets int32 (len(rows) + 1,), indices int8) CSR arrays."""
+    offsets = np.zeros(len(rows) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.array([i for row in rows for i in row], dtype=np.int8)
+    offsets.flags.writeable = False
+    indices.flags.writeable = False
+    return offsets, indices
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+def neighbours(csr, i):
+    """Row i of a CSR table, e.g. neighbours(INTERSECTION_EDGES, 30) -> the edges at intersection 30."""
+    offsets, indices = csr
+    return indices[offsets[i]:offsets[i + 1]]
+
+def _to_mask(positions) -> int:
+    mask = 0
+    for i in positions:
+        mask |= 1 << int(i)
+    return mask
+
+
+#  Tables
+EDGE_INTERSECTIONS = _frozen(np.array(EDGE_INTERSECTIONS_LIST, dtype=np.int8)) # (NUM_ROADS, 2)
+
+_intersection_hexes = [sorted(hex_id - HEX_ID_BASE for hex_id in ids) for ids in INTERSECTION_HEX_IDS_LIST]
+_hex_intersections = [[i for i in range(NUM_INTERSECTIONS) if h in _intersection_hexes[i]] for h in range(NUM_HEXES)]
+_intersection_edges = [[e for e, pair in enumerate(EDGE_INTERSECTIONS_LIST) if i in pair] for i in range(NUM_INTERSECTIONS)]
+_intersection_neighbours = [sorted(a if b == i else b for a, b in (EDGE_INTERSECTIONS_LIST[e] for e in edges))
+                            for i, edges in enumerate(_intersection_edges)]
+_edge_neighbours = [sorted({f for i in pair for f in _intersection_edges[i]} - {e}) for e, pair in enumerate(EDGE_INTERSECTIONS_LIST)]
+# Hexes are neighbours when they share a side, i.e. two corners
+_hex_neighbours = [[g for g in range(NUM_HEXES) if g != h and len(set(_hex_intersections[h]) & set(_hex_intersections[g])) == 2]
+                   for h in range(NUM_HEXES)]
+
+HEX_INTERSECTIONS = _frozen(np.array(_hex_intersections, dtype=np.int8)) # (NUM_HEXES, 6), ascending
+INTERSECTION_HEXES = _csr(_intersection_hexes)
+INTERSECTION_EDGES = _csr(_intersection_edges)
+INTERSECTION_NEIGHBOURS = _csr(_intersection_neighbours)
+EDGE_NEIGHBOURS = _csr(_edge_neighbours) # Edges sharing an endpoint
+HEX_NEIGHBOURS = _csr(_hex_neighbours)
+
+def _bfs_distances():
+    distances = np.full((NUM_INTERSECTIONS, NUM_INTERSECTIONS), -1, dtype=np.int8)
+    for source in range(NUM_INTERSECTIONS):
+        distances[source, source] = 0
+        queue = deque([source])
+        while queue:
+            i = queue.popleft()
+            for j in _intersection_neighbours[i]:
+                if distances[source, j] < 0:
+                    distances[source, j] = distances[source, i] + 1
+                    queue.append(j)
+    return distances
+
+INTERSECTION_DISTANCES = _frozen(_bfs_distances()) # Edges on the shortest path (-1: unreachable, never on this board)
+
+#  Bitmasks (bit i = intersection/edge i)
+ALL_INTERSECTIONS_MASK = (1 << NUM_INTERSECTIONS) - 1
+EDGE_ENDPOINTS_MASK = [_to_mask(pair) for pair in EDGE_INTERSECTIONS_LIST] # edge -> its two intersections
+INTERSECTION_EDGES_MASK = [_to_mask(edges) for edges in _intersection_edges] # intersection -> edges touching it
+INTERSECTION_NEIGHBOURS_MASK = [_to_mask(adjacent) for adjacent in _intersection_neighbours] # intersection -> one edge away
+HEX_INTERSECTIONS_MASK = [_to_mask(corners) for corners in _hex_intersections] # hex -> its six corners
+
+
+def check_topology():
+    """
+    Structural checks of the tables; raises ValueError on the first failure. Checked at import:
+    72 distinct edges, 18 coast intersections of degree 2 and 36 of degree 3, six corners per hex
+    joined by six edges into one ring, and a connected board.
+    """
+    if len(set(map(frozenset, EDGE_INTERSECTIONS_LIST))) != NUM_ROADS or any(a == b for a, b in EDGE_INTERSECTIONS_LIST):
+        raise ValueError("Board edges are not 72 distinct intersection pairs")
+    degrees = sorted(len(edges) for edges in _intersection_edges)
+    if degrees != [2] * 18 + [3] * 36:
+        raise ValueError(f"Unexpected intersection degrees: {degrees}")
+    for h, corners in enumerate(_hex_intersections):
+        corner_set = set(corners)
+        ring = [pair for pair in EDGE_INTERSECTIONS_LIST if set(pair) <= corner_set]
+        if len(corners) != CORNERS_PER_HEX or len(ring) != CORNERS_PER_HEX or any(
+                sum(i in pair for pair in ring) != 2 for i in corners):
+            raise ValueError(f"Corners of hex {h} (HexTile.Id {h + HEX_ID_BASE}) do not form a ring of board edges: {corners}")
+    if (INTERSECTION_DISTANCES < 0).any():
+        raise ValueError("Board graph is not connected")
+
+check_topology()
+
+
+def hex_positions(hexes):
+    """
+    Topology hex index of each entry of a State JSON hex list, from its "id" (HexTile.Id; the client
+    sends the tiles in scene order, not sorted). Falls back to list order when the ids are not a
+    permutation of the expected range.
+    """
+    ids = [h.get("id") if isinstance(h, dict) else None for h in hexes]
+    positions = [hex_id - HEX_ID_BASE if type(hex_id) is int else -1 for hex_id in ids]
+    if sorted(positions) != list(range(NUM_HEXES)):
+        return list(range(len(hexes)))
+    return positions
+
+
+#  Validation against logged games
+def validate_against_logs(log_dir, max_files=None):
+    """
+    Checks the offered actions of logged states against the tables. An offered road must touch an
+    intersection holding the player's building or one of their roads. An offered settlement must keep
+    distance 2 from every building. Returns counters: states, roads and settlements checked, and the
+    number of violations of each kind (0 on the client's board).
+    """
+    counts = {"files": 0, "states": 0, "roads": 0, "road_violations": 0, "settlements": 0, "settlement_violations": 0}
+    log_files = sorted(f for f in os.listdir(log_dir) if f.endswith(".jsonl"))[:max_files]
+    for file_name in log_files:
+        counts["files"] += 1
+        for state, _, _ in GameLogReader(os.path.join(log_dir, file_name)):
+            if isinstance(state, dict):
+                _check_logged_state(state, counts)
+    return counts
+
+def _check_logged_state(state, counts):
+    roads = state.get("roads") or []
+    buildings = state.get("buildings") or []
+    player = state.get("currentPlayerIndex")
+    if len(roads) != NUM_ROADS or len(buildings) != NUM_INTERSECTIONS or not isinstance(player, int):
+        return
+    counts["states"] += 1
+    road_owner = [r.get("ownerPlayerIndex", -1) for r in roads]
+    building_owner = [b.get("ownerPlayerIndex", -1) for b in buildings]
+    occupied = [i for i, owner in enumerate(building_owner) if type(owner) is int and 0 <= owner < NUM_PLAYERS]
+    own = {i for i in occupied if building_owner[i] == player}
+    own |= {int(i) for e, owner in enumerate(road_owner) if owner == player for i in EDGE_INTERSECTIONS[e]}
+    for action in state.get("availableActions") or []:
+        if not isinstance(action, dict):
+            continue
+        if action.get("actionType") == "BUILD_ROAD" and type(action.get("edgeIndex")) is int and 0 <= action["edgeIndex"] < NUM_ROADS:
+            counts["roads"] += 1
+            counts["road_violations"] += int(not own & set(EDGE_INTERSECTIONS_LIST[action["edgeIndex"]]))
+        elif action.get("actionType") == "BUILD_SETTLEMENT" and type(action.get("intersectionIndex")) is int and 0 <= action["intersectionIndex"] < NUM_INTERSECTIONS:
+            counts["settlements"] += 1
+            counts["settlement_violations"] += int(bool(occupied) and INTERSECTION_DISTANCES[action["intersectionIndex"], occupied].min() < 2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Board topology tables, checked against self-play logs.")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR, help="Directory of self-play .jsonl logs")
+    parser.add_argument("--max-files", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"\nBoard: {NUM_HEXES} hexes, {NUM_INTERSECTIONS} intersections, {NUM_ROADS} edges (structural checks passed)")
+    for name, (offsets, indices) in (("intersection -> hexes", INTERSECTION_HEXES), ("intersection -> edges", INTERSECTION_EDGES),
+                                     ("intersection -> intersections", INTERSECTION_NEIGHBOURS), ("edge -> edges", EDGE_NEIGHBOURS),
+                                     ("hex -> hexes", HEX_NEIGHBOURS)):
+        sizes = np.diff(offsets)
+        print(f"{name:<30} {len(indices):>4} entries, {sizes.min()}-{sizes.max()} per row, {offsets.nbytes + indices.nbytes} bytes")
+    print(f"{'intersection distances':<30} max {INTERSECTION_DISTANCES.max()} edges, {INTERSECTION_DISTANCES.nbytes} bytes")
+
+    if os.path.isdir(args.log_dir):
+        counts = validate_against_logs(args.log_dir, args.max_files)
+        print(f"\nLogged games in {args.log_dir}: {counts['files']} files, {counts['states']} states")
+        print(f"offered roads {counts['roads']} ({counts['road_violations']} not touching the player's network), "
+              f"offered settlements {counts['settlements']} ({counts['settlement_violations']} breaking the distance rule)")
+    else:
+        print(f"\nNo self-play logs at {args.log_dir}; skipped the check against logged games.")
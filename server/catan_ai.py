@@ -1,25 +1,43 @@
 # server/catan_ai.py
 
-from flask import Flask, request, jsonify
+import time
+SERVER_STARTED_AT = time.time() # Startup time reported by /healthz covers imports and model loading
+
+from flask import Flask, request, jsonify, g
 from typing import Optional
 import random
 import logging
 import json
 import numpy as np
 import os
-import torch
 
 # Import from custom modules
 try:
     # Use relative imports if part of a package
-    from .game_state_encoder import vectorize_state, TOTAL_VECTOR_SIZE
-    from .action_mapping import get_action_index, TOTAL_ACTIONS
-    from .model import CatanSimpleMLP
+    from .game_state_encoder import vectorize_state, vectorize_states, apply_state_delta, TOTAL_VECTOR_SIZE, HEX_SECTION_CACHE
+    from .action_mapping import get_action_index, build_action_mask, TOTAL_ACTIONS
+    from .inference_batcher import InferenceBatcher, to_model_input, run_model
+    from .model_store import ModelStore
+    from .model_registry import ModelRegistry, UnknownModelError
+    from .session_cache import SessionCache, derive_game_seed
+    from .metrics import MetricsRegistry
+    from .decision_cache import DecisionCache, decision_key
+    from .numpy_policy import NumpyPolicy, ensure_npz
+    from .binary_protocol import BINARY_STATE_CONTENT_TYPE, decode_state, decode_states, action_dicts
+    from .legal_moves import legal_actions_from_vector
 except ImportError:
     # Fallback for running script directly
-    from game_state_encoder import vectorize_state, TOTAL_VECTOR_SIZE
-    from action_mapping import get_action_index, TOTAL_ACTIONS
-    from model import CatanSimpleMLP
+    from game_state_encoder import vectorize_state, vectorize_states, apply_state_delta, TOTAL_VECTOR_SIZE, HEX_SECTION_CACHE
+    from action_mapping import get_action_index, build_action_mask, TOTAL_ACTIONS
+    from inference_batcher import InferenceBatcher, to_model_input, run_model
+    from model_store import ModelStore
+    from model_registry import ModelRegistry, UnknownModelError
+    from session_cache import SessionCache, derive_game_seed
+    from metrics import MetricsRegistry
+    from decision_cache import DecisionCache, decision_key
+    from numpy_policy import NumpyPolicy, ensure_npz
+    from binary_protocol import BINARY_STATE_CONTENT_TYPE, decode_state, decode_states, action_dicts
+    from legal_moves import legal_actions_from_vector
 
 #  Flask App Setup 
 app = Flask(__name__)
@@ -29,79 +47,593 @@ app.logger.setLevel(logging.INFO) # Set to debug for more verbosity
 TRAIN_MODE = os.environ.get("CATAN_TRAIN_MODE", "0") == "1"
 app.logger.info(f"Server running in {'TRAIN' if TRAIN_MODE else 'PLAY'} mode.")
 
-if torch.cuda.is_available():
-    device = torch.device("cuda")
-    app.logger.info("Using GPU for inference.")
+# Micro-batching of concurrent /get_action requests (set CATAN_BATCHING=0 to disable)
+BATCHING_ENABLED = os.environ.get("CATAN_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("CATAN_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("CATAN_BATCH_MAX_WAIT_MS", "2.0"))
+
+# Upper bound on the number of states accepted by one /get_actions request
+MAX_STATES_PER_REQUEST = int(os.environ.get("CATAN_MAX_STATES_PER_REQUEST", "4096"))
+
+# Per-game sessions: requests carrying a "gameId" can send only changed entries ("delta": true)
+SESSIONS_ENABLED = os.environ.get("CATAN_SESSIONS", "1") == "1"
+SESSION_MAX_GAMES = int(os.environ.get("CATAN_SESSION_MAX_GAMES", "256"))
+SESSION_TTL_SECONDS = float(os.environ.get("CATAN_SESSION_TTL_SECONDS", "600"))
+
+# Train-mode exploration seed: a game with a "gameId" draws its epsilon-greedy choices from its own generator
+# seeded from this value and the game id, so the game can be replayed exactly (a "seed" in the request overrides it)
+EXPLORATION_SEED = os.environ.get("CATAN_EXPLORATION_SEED") or None
+
+# LRU cache of greedy /get_action decisions keyed by state + available actions (0 disables)
+DECISION_CACHE_SIZE = int(os.environ.get("CATAN_DECISION_CACHE_SIZE", "0"))
+
+# Encoded hex sections of recently seen boards, reused for every later turn of a game (0 disables)
+HEX_CACHE_SIZE = int(os.environ.get("CATAN_HEX_CACHE_SIZE", "1024"))
+HEX_SECTION_CACHE.resize(HEX_CACHE_SIZE)
+
+# Serving: "flask" is the single-process development server, "waitress" the production server
+SERVER_BACKEND = os.environ.get("CATAN_SERVER_BACKEND", "flask").lower()
+SERVER_HOST = os.environ.get("CATAN_SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("CATAN_SERVER_PORT", "5000"))
+SERVER_THREADS = int(os.environ.get("CATAN_SERVER_THREADS", "16"))
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("CATAN_REQUEST_TIMEOUT", "30"))
+
+# Inference backend: "torch" (fp32 eager), "quantized" (int8 TorchScript built from the weights file on load),
+# "torchscript" (CATAN_WEIGHTS_PATH is an artifact exported by compiled_model.py)
+# or "numpy" (NumPy-only forward pass from the .npz next to the weights; torch is never imported)
+INFERENCE_BACKENDS = ("torch", "quantized", "torchscript", "numpy")
+INFERENCE_BACKEND = os.environ.get("CATAN_INFERENCE_BACKEND", "torch").lower()
+if INFERENCE_BACKEND not in INFERENCE_BACKENDS:
+    app.logger.warning(f"Unknown inference backend '{INFERENCE_BACKEND}'. Using 'torch'.")
+    INFERENCE_BACKEND = "torch"
+
+# Hot reload: poll the weights file for changes (0 disables polling; POST /admin/reload_weights still works)
+WEIGHTS_PATH = os.environ.get("CATAN_WEIGHTS_PATH", os.path.join(os.path.dirname(__file__), "model_weights.pth"))
+WEIGHTS_POLL_SECONDS = float(os.environ.get("CATAN_WEIGHTS_POLL_SECONDS", "2.0"))
+
+# Multi-checkpoint routing: requests/sessions with a "modelId" are served by <CATAN_CHECKPOINT_DIR>/<modelId>.pth
+CHECKPOINT_DIR = os.environ.get("CATAN_CHECKPOINT_DIR", os.path.join(os.path.dirname(__file__), "iterations"))
+MAX_RESIDENT_MODELS = int(os.environ.get("CATAN_MAX_RESIDENT_MODELS", "4"))
+CHECKPOINT_EXTENSIONS = {"numpy": ".npz", "torchscript": ".pt"} # Others load .pth state dicts
+
+#  Metrics (GET /metrics, Prometheus text format)
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram("catan_ai_stage_seconds",
+                                  "Time spent in each stage of handling a request (tensor/forward are per forward pass).",
+                                  ["stage"])
+REQUEST_SECONDS = metrics.histogram("catan_ai_request_seconds", "End-to-end handler latency by endpoint.", ["endpoint"])
+ACTIONS_TOTAL = metrics.counter("catan_ai_actions_total", "Actions returned, by action type.", ["action_type"])
+ERRORS_TOTAL = metrics.counter("catan_ai_errors_total", "Failed requests, by failure branch.", ["branch"])
+IN_FLIGHT = metrics.gauge("catan_ai_requests_in_flight", "Inference requests currently being handled.")
+INFERENCE_ENDPOINTS = ("get_action", "get_actions")
+
+if INFERENCE_BACKEND == "numpy":
+    device = "cpu"
+    if WEIGHTS_PATH.endswith(".pth"):
+        WEIGHTS_PATH = ensure_npz(WEIGHTS_PATH) # Written by train_from_logs.py / numpy_policy.py convert, else converted here
+    if not TRAIN_MODE and not os.path.exists(WEIGHTS_PATH):
+        # Only training may start from random weights
+        raise RuntimeError(f"NumPy backend: no weights at {WEIGHTS_PATH}. Train a model or convert one with 'python server/numpy_policy.py convert'.")
+    model_factory = lambda: NumpyPolicy.initialized(TOTAL_VECTOR_SIZE, TOTAL_ACTIONS)
+    model_loader = NumpyPolicy.load
+    app.logger.info("Using NumPy for inference (torch not loaded).")
 else:
-    device = torch.device("cpu")
-    app.logger.info("Using CPU for inference.")
+    import torch
+    try:
+        from .model import CatanSimpleMLP
+        from .compiled_model import make_model_loader
+    except ImportError:
+        from model import CatanSimpleMLP
+        from compiled_model import make_model_loader
+
+    if INFERENCE_BACKEND != "torch":
+        device = torch.device("cpu") # Compiled int8 graphs run on the CPU
+        app.logger.info(f"Using CPU for inference ({INFERENCE_BACKEND} backend).")
+    elif torch.cuda.is_available():
+        device = torch.device("cuda")
+        app.logger.info("Using GPU for inference.")
+    else:
+        device = torch.device("cpu")
+        app.logger.info("Using CPU for inference.")
+    model_factory = lambda: CatanSimpleMLP(input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS)
+    model_loader = make_model_loader(INFERENCE_BACKEND)
 
 #  Model Initialization 
-model = CatanSimpleMLP(input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS)
-WEIGHTS_PATH = os.path.join(os.path.dirname(__file__), "model_weights.pth")
+# Handlers take one (model, version) snapshot per request via model_store.get(),
+# so a hot reload never changes the model halfway through a request.
+model_store = ModelStore(WEIGHTS_PATH, device, model_factory, loader=model_loader)
+model_store.load_initial()
+model_store.start_watcher(WEIGHTS_POLL_SECONDS)
+app.logger.info(f"Model ready on {device} (weights version {model_store.version}).")
 
-if os.path.exists(WEIGHTS_PATH):
-    try:
-        model.load_state_dict(torch.load(WEIGHTS_PATH, map_location=device))
-        app.logger.info(f"Loaded existing model weights from {WEIGHTS_PATH} onto {device}.")
-    except Exception as e:
-        app.logger.error(f"Error loading weights from {WEIGHTS_PATH}: {e}. Starting fresh.")
+# Default model plus an LRU cache of checkpoints loaded on demand by model id
+model_registry = ModelRegistry(model_store, CHECKPOINT_DIR, device, model_factory, loader=model_loader,
+                               extension=CHECKPOINT_EXTENSIONS.get(INFERENCE_BACKEND, ".pth"),
+                               max_models=MAX_RESIDENT_MODELS)
+
+batcher = None
+if BATCHING_ENABLED:
+    batcher = InferenceBatcher(model_registry.get, device, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                               stage_seconds=STAGE_SECONDS)
+    batcher.start()
+    app.logger.info(f"Micro-batching enabled: MaxBatch={BATCH_MAX_SIZE}, MaxWait={BATCH_MAX_WAIT_MS}ms.")
 else:
-    app.logger.info(f"No weights found at {WEIGHTS_PATH}. Starting fresh.")
+    app.logger.info("Micro-batching disabled. Running one forward pass per request.")
+
+session_cache = SessionCache(SESSION_MAX_GAMES, SESSION_TTL_SECONDS) if SESSIONS_ENABLED else None
+
+decision_cache = None
+if DECISION_CACHE_SIZE > 0:
+    decision_cache = DecisionCache(DECISION_CACHE_SIZE)
+    app.logger.info(f"Decision cache enabled: MaxEntries={DECISION_CACHE_SIZE}.")
+
+STARTUP_SECONDS = time.time() - SERVER_STARTED_AT
+app.logger.info(f"Server initialized in {STARTUP_SECONDS:.2f}s.")
+
+
+def _error_response(branch, body, status):
+    """Counts the failure branch and builds the JSON error response."""
+    ERRORS_TOTAL.inc(branch)
+    return jsonify(body), status
+
+
+def _action_response(result):
+    """Serializes a chosen action (or batch of results), timing the serialization stage."""
+    with STAGE_SECONDS.time("serialize"):
+        return jsonify(result)
+
+
+@app.before_request
+def start_request_metrics():
+    if request.endpoint in INFERENCE_ENDPOINTS:
+        g.request_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    started = g.pop("request_started", None)
+    if started is not None:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.endpoint)
 
-model.to(device)
-model.eval() # Set to evaluation mode
-app.logger.info(f"Model ready on {device}.")
 
 @app.route('/get_action', methods=['POST'])
 def get_action():
-    """Receives game state, predicts best available action, returns it."""
+    """Receives game state (JSON or binary, by Content-Type), predicts best available action, returns it."""
+
+    if request.mimetype == BINARY_STATE_CONTENT_TYPE:
+        try:
+            with STAGE_SECONDS.time("binary_decode"):
+                state_vector, action_indices, current_player = decode_state(request.get_data())
+        except ValueError as decode_err:
+            app.logger.error(f"Malformed binary state: {decode_err}")
+            return _error_response("malformed_binary", {"error": "Malformed binary state", "details": str(decode_err)}, 400)
+        return _choose_action(state_vector, action_dicts(action_indices), current_player, request.headers.get("X-Model-Id"))
 
     if not request.is_json:
         app.logger.error("Request received was not JSON")
-        return jsonify({"error": "Request must be JSON"}), 400
+        return _error_response("not_json", {"error": f"Request must be JSON or {BINARY_STATE_CONTENT_TYPE}"}, 400)
 
     try:
-        state_data = request.get_json()
+        with STAGE_SECONDS.time("parse"):
+            state_data = request.get_json()
         app.logger.debug(f"Received state for player {state_data.get('currentPlayerIndex', 'N/A')}")
 
-        state_vector = vectorize_state(state_data)
-        if state_vector is None or state_vector.shape[0] != TOTAL_VECTOR_SIZE:
-             app.logger.error("State vectorization failed or produced incorrect size.")
-             return jsonify({"error": "State vectorization failed"}), 500
+        game_id = state_data.get('gameId') if session_cache is not None else None
+        model_id = state_data.get('modelId') or request.headers.get("X-Model-Id")
+        if game_id is not None and state_data.get('delta'):
+            # Patch the game's cached vector with the changed entries instead of re-vectorizing the board
+            try:
+                with STAGE_SECONDS.time("apply_delta"):
+                    state_vector = session_cache.patch(game_id, lambda vector: apply_state_delta(vector, state_data))
+            except (ValueError, TypeError) as delta_err:
+                app.logger.error(f"Invalid state delta for game {game_id}: {delta_err}")
+                return _error_response("invalid_delta", {"error": "Invalid state delta", "details": str(delta_err)}, 400)
+            if state_vector is None:
+                app.logger.warning(f"Delta received for unknown or expired game session {game_id}.")
+                return _error_response("unknown_session", {"error": "Unknown or expired game session, resend the full state",
+                                                           "resync": True}, 409)
+            model_id = model_id or session_cache.model_id_for(game_id)
+        else:
+            with STAGE_SECONDS.time("vectorize"):
+                state_vector = vectorize_state(state_data)
+            if state_vector is None or state_vector.shape[0] != TOTAL_VECTOR_SIZE:
+                 app.logger.error("State vectorization failed or produced incorrect size.")
+                 return _error_response("vectorize_failed", {"error": "State vectorization failed"}, 500)
+            if game_id is not None:
+                model_id = session_cache.put(game_id, state_vector.copy(), model_id).model_id # Sticky per game
+
+        return _choose_action(state_vector, _available_actions(state_data, state_vector), state_data.get('currentPlayerIndex', '?'), model_id,
+                              game_id=game_id, seed=_request_seed(state_data, game_id))
 
-        try:
-            state_tensor = torch.tensor(state_vector, dtype=torch.float32).to(device)
-            with torch.no_grad():
-                 model_output = model(state_tensor)
-            app.logger.debug(f"Model output tensor shape: {model_output.shape}")
-            app.logger.debug(f"Raw scores sample: {model_output.squeeze(0)[:10].tolist()}")
+    except Exception as e:
+        app.logger.exception("Internal server error processing '/get_action':")
+        return _error_response("internal", {"error": "Internal server error", "details": str(e)}, 500)
 
-        except Exception as model_err:
-            app.logger.exception("Error during model prediction:") # Log full traceback
-            return jsonify({"error": "Model inference failed", "details": str(model_err)}), 500
 
-        available_actions = state_data.get('availableActions')
-        if not available_actions: # Check if list exists and is not empty
-            app.logger.warning("Received state with no available actions.")
-            return jsonify({"error": "No available actions provided in state"}), 400
+def _available_actions(state_data, state_vector):
+    """The state's availableActions, or the legal actions generated from the encoded board when the client omits them."""
+    available_actions = state_data.get('availableActions')
+    if available_actions is None and state_vector is not None:
+        with STAGE_SECONDS.time("legal_moves"):
+            available_actions = legal_actions_from_vector(state_vector)
+    return available_actions
+
 
-        app.logger.debug(f"Available actions: {available_actions}")
-        chosen_action = model.predict_action(state_tensor, available_actions, use_exploration=TRAIN_MODE)
+def _request_seed(state_data, game_id):
+    """Exploration seed of a request: its own "seed", else one derived from CATAN_EXPLORATION_SEED and the game id, else None."""
+    seed = state_data.get('seed')
+    if isinstance(seed, int) and not isinstance(seed, bool):
+        return seed % (1 << 63) # torch and NumPy both need a non-negative seed
+    if EXPLORATION_SEED is not None and game_id is not None:
+        return derive_game_seed(EXPLORATION_SEED, game_id)
+    return None
 
-        if chosen_action:
-            app.logger.info(f"P{state_data.get('currentPlayerIndex', '?')} Action: {chosen_action.get('actionType', 'Unknown')}")
-            return jsonify(chosen_action)
+
+def _choose_action(state_vector, available_actions, current_player, model_id=None, game_id=None, seed=None):
+    """
+    Scores one encoded state with model `model_id` (None: default) and returns the chosen action as a Flask response.
+    In train mode, games with a seed (or a seeded session) explore with their own generator (see _seeded_exploration).
+    """
+    if not available_actions: # Check if list exists and is not empty
+        app.logger.warning("Received state with no available actions.")
+        return _error_response("no_actions", {"error": "No available actions provided in state"}, 400)
+
+    app.logger.debug(f"Available actions: {available_actions}")
+    try:
+        use_exploration = TRAIN_MODE
+        chosen_action = None
+        if TRAIN_MODE and (seed is not None or game_id is not None):
+            explored, seeded = _seeded_exploration(available_actions, model_id, game_id, seed)
+            if seeded:
+                # The random draw is already made; what is left is the (deterministic) greedy choice
+                chosen_action, use_exploration = explored, False
+
+        if chosen_action is not None:
+            pass
+        elif not model_registry.is_default(model_id):
+            model_registry.get(model_id) # Load the checkpoint now so an unknown id fails here, not in the batcher
+            chosen_action = _run_inference(state_vector, available_actions, use_exploration=use_exploration, model_id=model_id)
+        elif decision_cache is not None:
+            chosen_action = _cached_inference(state_vector, available_actions, use_exploration=use_exploration)
         else:
-            # This should ideally not happen if available_actions is not empty and mapping works
-            app.logger.error("Model.predict_action failed to select an action.")
-            return jsonify({"error": "Failed to select a valid action"}), 500
+            chosen_action = _run_inference(state_vector, available_actions, use_exploration=use_exploration)
+
+    except UnknownModelError as model_id_err:
+        app.logger.error(f"Unknown model requested: {model_id_err}")
+        return _error_response("unknown_model", {"error": "Unknown model", "details": str(model_id_err)}, 404)
+    except TimeoutError as timeout_err:
+        app.logger.error(f"Inference timed out: {timeout_err}")
+        return _error_response("timeout", {"error": "Model inference timed out", "details": str(timeout_err)}, 504)
+    except Exception as model_err:
+        app.logger.exception("Error during model prediction:") # Log full traceback
+        return _error_response("inference_failed", {"error": "Model inference failed", "details": str(model_err)}, 500)
+
+    if chosen_action:
+        action_type = chosen_action.get('actionType', 'Unknown')
+        ACTIONS_TOTAL.inc(action_type)
+        app.logger.info(f"P{current_player} Action: {action_type}")
+        return _action_response(chosen_action)
+    else:
+        # This should ideally not happen if available_actions is not empty and mapping works
+        app.logger.error("Model.predict_action failed to select an action.")
+        return _error_response("no_action_selected", {"error": "Failed to select a valid action"}, 500)
+
+
+def _run_inference(state_vector, available_actions, use_exploration, model_id=None):
+    """Scores one state (batched with concurrent requests if enabled) and picks an action. Sets g.model_version."""
+    if batcher is not None:
+        # Queued with other concurrent requests for the same model and scored in one (N, TOTAL_VECTOR_SIZE) forward pass
+        chosen_action, g.model_version = batcher.submit(state_vector, available_actions, use_exploration=use_exploration,
+                                                        timeout=REQUEST_TIMEOUT_SECONDS, model_id=model_id)
+        return chosen_action
+
+    # Same steps as model.predict_action, split up so each stage is timed
+    model, g.model_version = model_registry.get(model_id)
+    with STAGE_SECONDS.time("tensor"):
+        model_input = to_model_input(model, np.asarray(state_vector, dtype=np.float32)[None, :], device)
+    with STAGE_SECONDS.time("forward"):
+        scores = run_model(model, model_input)[0]
+    with STAGE_SECONDS.time("select"):
+        return model.select_action(scores, available_actions, use_exploration=use_exploration)
+
+
+def _seeded_exploration(available_actions, model_id, game_id, seed):
+    """
+    Epsilon-greedy draw of a seeded game, from the game session's generator (or, without a
+    session, a fresh one seeded with `seed`) via model.draw_exploration. Returns
+    (explored action or None for a greedy decision, whether the game is seeded).
+    """
+    model, g.model_version = model_registry.get(model_id)
+    mask, lookup = build_action_mask(available_actions, model.output_size)
+    session, generator = (None, None)
+    if game_id is not None and session_cache is not None:
+        session, generator = session_cache.generator_for(game_id, seed, model.make_generator)
+    if session is not None and generator is not None:
+        with session.lock: # Concurrent requests of one game must not interleave their draws
+            explored_idx = int(model.draw_exploration(mask[None, :], generator=generator)[0])
+    elif seed is not None:
+        explored_idx = int(model.draw_exploration(mask[None, :], generator=model.make_generator(seed))[0])
+    else:
+        return None, False # Unseeded game
+    return (lookup[explored_idx] if explored_idx >= 0 else None), True
+
+
+def _cached_inference(state_vector, available_actions, use_exploration=TRAIN_MODE):
+    """
+    _run_inference with the decision cache in front of it. With exploration the epsilon-greedy
+    draw is made here first, exactly as select_action would: exploring requests take a random
+    action and never touch the cache, so only greedy decisions are cached and served.
+    """
+    model, version = model_store.get()
+    if use_exploration and random.random() < model.epsilon:
+        g.model_version = version
+        return random.choice(available_actions)
+
+    action_indices = [get_action_index(action_dict) for action_dict in available_actions]
+    key = decision_key(state_vector, [idx for idx in action_indices if idx is not None])
+    cached_idx = decision_cache.get(key, version)
+    if cached_idx is not None:
+        g.model_version = version
+        return available_actions[action_indices.index(cached_idx)]
+
+    chosen_action = _run_inference(state_vector, available_actions, use_exploration=False)
+    if chosen_action:
+        chosen_idx = get_action_index(chosen_action)
+        if chosen_idx is not None:
+            decision_cache.put(key, chosen_idx, g.model_version)
+    return chosen_action
+
+
+@app.route('/get_actions', methods=['POST'])
+def get_actions():
+    """
+    Receives a list of game states (a JSON list, or a binary batch by Content-Type) and returns
+    a list of chosen actions in the same order. All valid states are scored together in one
+    batched forward pass. Items that cannot be processed get an {"error": ...} entry instead
+    of failing the whole request.
+    """
+
+    if request.mimetype == BINARY_STATE_CONTENT_TYPE:
+        try:
+            with STAGE_SECONDS.time("binary_decode"):
+                vectors, action_lists = decode_states(request.get_data())
+        except ValueError as decode_err:
+            app.logger.error(f"Malformed binary batch: {decode_err}")
+            return _error_response("malformed_binary", {"error": "Malformed binary batch", "details": str(decode_err)}, 400)
+        if len(action_lists) > MAX_STATES_PER_REQUEST:
+            return _error_response("too_many_states", {"error": f"Too many states in one request ({len(action_lists)} > {MAX_STATES_PER_REQUEST})"}, 413)
+        try:
+            model_ids = [request.headers.get("X-Model-Id")] * len(action_lists)
+            return _score_batch(vectors, [action_dicts(indices) for indices in action_lists], model_ids)
+        except Exception as e:
+            app.logger.exception("Internal server error processing '/get_actions':")
+            return _error_response("internal", {"error": "Internal server error", "details": str(e)}, 500)
+
+    if not request.is_json:
+        app.logger.error("Request received was not JSON")
+        return _error_response("not_json", {"error": f"Request must be JSON or {BINARY_STATE_CONTENT_TYPE}"}, 400)
+
+    try:
+        with STAGE_SECONDS.time("parse"):
+            states = request.get_json()
+        if not isinstance(states, list):
+            return _error_response("bad_batch", {"error": "Request body must be a JSON list of states"}, 400)
+        if len(states) > MAX_STATES_PER_REQUEST:
+            return _error_response("too_many_states", {"error": f"Too many states in one request ({len(states)} > {MAX_STATES_PER_REQUEST})"}, 413)
+
+        action_lists = []
+        model_ids = []
+        default_model_id = request.headers.get("X-Model-Id")
+        with STAGE_SECONDS.time("vectorize"):
+            object_rows = [i for i, state_data in enumerate(states) if isinstance(state_data, dict)]
+            encoded, valid = vectorize_states([states[i] for i in object_rows], return_valid=True)
+            vectors = [None] * len(states)
+            for row, i in enumerate(object_rows):
+                if valid[row]:
+                    vectors[i] = encoded[row]
+            for state_data, state_vector in zip(states, vectors):
+                if not isinstance(state_data, dict):
+                    action_lists.append({"error": "State must be a JSON object"})
+                    model_ids.append(None)
+                    continue
+                action_lists.append(_available_actions(state_data, state_vector))
+                model_ids.append(state_data.get('modelId') or default_model_id)
+
+        return _score_batch(vectors, action_lists, model_ids)
 
     except Exception as e:
-        app.logger.exception("Internal server error processing '/get_action':")
-        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+        app.logger.exception("Internal server error processing '/get_actions':")
+        return _error_response("internal", {"error": "Internal server error", "details": str(e)}, 500)
+
+
+def _score_batch(vectors, action_lists, model_ids=None):
+    """
+    Scores encoded states and returns the per-item results as a Flask response. States for the same
+    model (model_ids[i], None for the default model) share one forward pass.
+    An action list that is an {"error": ...} dict is passed through as that item's result.
+    """
+    model_ids = model_ids or [None] * len(action_lists)
+    results = [None] * len(action_lists)
+    rows_by_model = {} # model id -> positions in the request that made it into that model's batch
+    for i, (state_vector, available_actions) in enumerate(zip(vectors, action_lists)):
+        if isinstance(available_actions, dict):
+            results[i] = available_actions
+        elif not available_actions:
+            results[i] = {"error": "No available actions provided in state"}
+        elif state_vector is None or state_vector.shape[0] != TOTAL_VECTOR_SIZE:
+            results[i] = {"error": "State vectorization failed"}
+        else:
+            rows_by_model.setdefault(None if model_registry.is_default(model_ids[i]) else model_ids[i], []).append(i)
+
+    versions = []
+    scored = 0
+    for model_id, valid_rows in rows_by_model.items():
+        try:
+            model, version = model_registry.get(model_id)
+        except UnknownModelError as model_id_err:
+            for i in valid_rows:
+                results[i] = {"error": "Unknown model", "details": str(model_id_err)}
+            continue
+        versions.append(version)
+        try:
+            with STAGE_SECONDS.time("tensor"):
+                states_np = np.stack([vectors[i] for i in valid_rows]).astype(np.float32, copy=False)
+                model_input = to_model_input(model, states_np, device)
+            with STAGE_SECONDS.time("forward"):
+                scores = run_model(model, model_input)
+        except Exception as model_err:
+            app.logger.exception("Error during batched model prediction:")
+            return _error_response("inference_failed", {"error": "Model inference failed", "details": str(model_err)}, 500)
+
+        scored += len(valid_rows)
+        try:
+            with STAGE_SECONDS.time("select"):
+                # One masked argmax over the whole group
+                chosen_actions = model.select_actions(scores, [action_lists[i] for i in valid_rows], use_exploration=TRAIN_MODE)
+        except Exception as select_err:
+            app.logger.warning(f"Action selection failed for {len(valid_rows)} batch items: {select_err}")
+            chosen_actions = [{"error": "Failed to select a valid action", "details": str(select_err)}] * len(valid_rows)
+        for i, chosen_action in zip(valid_rows, chosen_actions):
+            if chosen_action and "error" not in chosen_action:
+                ACTIONS_TOTAL.inc(chosen_action.get('actionType', 'Unknown'))
+                results[i] = chosen_action
+            else:
+                results[i] = chosen_action or {"error": "Failed to select a valid action"}
+    if versions:
+        g.model_version = ",".join(versions)
+
+    failed_items = sum(1 for result in results if "error" in result)
+    if failed_items:
+        ERRORS_TOTAL.inc("batch_item", amount=failed_items)
+    app.logger.info(f"/get_actions: {scored}/{len(action_lists)} states scored in {len(versions)} batch(es).")
+    return _action_response(results)
+
+
+@app.route('/admin/reload_weights', methods=['POST'])
+def reload_weights():
+    """
+    Loads the weights file in the background and swaps it in once fully loaded.
+    Pass ?wait=1 to block until the reload has finished.
+    """
+    force = request.args.get("force", "0") == "1"
+    if request.args.get("wait", "0") == "1":
+        changed = model_store.reload(force=force)
+        return jsonify({"reloaded": changed, "version": model_store.version, "error": model_store.last_error})
+    model_store.reload_async(force=force)
+    return jsonify({"status": "reload started", "version": model_store.version}), 202
+
+
+@app.after_request
+def add_model_version_header(response):
+    """Reports the weights version that served the request (or the active one) on every response."""
+    response.headers["X-Model-Version"] = g.get("model_version") or model_store.version
+    return response
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Readiness check: 200 once a model is loaded and the batcher (if enabled) is running,
+    503 otherwise. The launcher polls this before starting games.
+    """
+    model, version = model_store.get()
+    batcher_running = batcher.is_running() if batcher is not None else None
+    ready = model is not None and batcher_running is not False
+    body = {
+        "ready": ready,
+        "modelLoaded": model is not None,
+        "weightsVersion": version,
+        "device": str(device),
+        "inferenceBackend": INFERENCE_BACKEND,
+        "trainMode": TRAIN_MODE,
+        "batcherRunning": batcher_running,
+        "startupSeconds": round(STARTUP_SECONDS, 3),
+        "uptimeSeconds": round(time.time() - SERVER_STARTED_AT, 3),
+        "lastReloadError": model_store.last_error,
+    }
+    return jsonify(body), (200 if ready else 503)
+
+
+@app.route('/batch_stats', methods=['GET'])
+def batch_stats():
+    """Reports micro-batching statistics (batch sizes and queue waits) for tuning."""
+    if batcher is None:
+        return jsonify({"enabled": False})
+    stats = batcher.get_stats()
+    stats["enabled"] = True
+    return jsonify(stats)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Exposes per-stage latency histograms, action/error counters and the in-flight gauge for Prometheus."""
+    return app.response_class(metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+
+
+@app.route('/decision_cache_stats', methods=['GET'])
+def decision_cache_stats():
+    """Reports decision cache hits, misses, evictions and invalidations."""
+    if decision_cache is None:
+        return jsonify({"enabled": False})
+    stats = decision_cache.get_stats()
+    stats["enabled"] = True
+    return jsonify(stats)
+
+
+@app.route('/models', methods=['GET'])
+def models():
+    """Reports the default model, the resident checkpoints (with weight memory) and the checkpoints available to load."""
+    return jsonify(model_registry.get_stats())
+
+
+@app.route('/encoder_stats', methods=['GET'])
+def encoder_stats():
+    """Reports hex section cache usage (boards cached, hits, misses, evictions)."""
+    stats = HEX_SECTION_CACHE.get_stats()
+    stats["enabled"] = HEX_CACHE_SIZE > 0
+    return jsonify(stats)
+
+
+@app.route('/session_stats', methods=['GET'])
+def session_stats():
+    """Reports per-game session cache usage and evictions."""
+    if session_cache is None:
+        return jsonify({"enabled": False})
+    stats = session_cache.get_stats()
+    stats["enabled"] = True
+    return jsonify(stats)
+
+
+def run_waitress():
+    """
+    Serves the app with waitress: an asynchronous I/O front end that keeps HTTP/1.1
+    connections alive and hands requests to a pool of worker threads sharing one model
+    (concurrent requests still meet in the micro-batcher). Returns False if waitress is missing.
+    """
+    try:
+        from waitress import serve
+    except ImportError:
+        app.logger.error("waitress is not installed (pip install waitress). Falling back to the Flask development server.")
+        return False
+
+    app.logger.info(f"Starting Catan AI server with waitress on {SERVER_HOST}:{SERVER_PORT} "
+                    f"(Threads={SERVER_THREADS}, Timeout={REQUEST_TIMEOUT_SECONDS}s)...")
+    serve(app, host=SERVER_HOST, port=SERVER_PORT,
+          threads=SERVER_THREADS,
+          channel_timeout=REQUEST_TIMEOUT_SECONDS, # Idle keep-alive connections are closed after this
+          connection_limit=max(100, SERVER_THREADS * 8),
+          backlog=1024,
+          ident="CatanAI")
+    return True
 
 
 if __name__ == '__main__':
-    app.logger.info("Starting Catan AI Flask server...")
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    if SERVER_BACKEND == "waitress" and run_waitress():
+        pass
+    else:
+        if SERVER_BACKEND not in ("flask", "waitress"):
+            app.logger.warning(f"Unknown server backend '{SERVER_BACKEND}'. Using the Flask development server.")
+        app.logger.info("Starting Catan AI Flask server...")
+        app.run(host=SERVER_HOST, port=SERVER_PORT, debug=False, threaded=True) # Threads let concurrent requests share batches
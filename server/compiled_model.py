@@ -0,0 +1,262 @@
+# server/compiled_model.py
+#
+# Optimized CPU inference for CatanSimpleMLP: the three nn.Linear layers are dynamically
+# quantized to int8 and the network is traced into a TorchScript graph.
+#
+# Usage (from the project root):
+#   python server/compiled_model.py                                   # export server/model_weights.int8.pt, parity check, benchmark
+#   python server/compiled_model.py --weights server/iterations/settlerbot_2.pth --output bot2.int8.pt
+#   python server/compiled_model.py --skip-benchmark --replay-dir client/OldLogs
+#   python server/compiled_model.py --export-only                     # export only (the launcher does this after training)
+#
+# The AI server uses this through CATAN_INFERENCE_BACKEND (launcher: --backend):
+#   torch        fp32 eager CatanSimpleMLP (default)
+#   quantized    the server quantizes and traces model_weights.pth itself on every (re)load
+#   torchscript  the server loads an artifact exported by this script (point --model-weights at it)
+
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+try:
+    if __package__:
+        from .model import CatanSimpleMLP, DEFAULT_EPSILON
+        from .game_state_encoder import vectorize_state, TOTAL_VECTOR_SIZE
+        from .action_mapping import TOTAL_ACTIONS
+        from .log_reader import GameLogReader
+    else:
+        from model import CatanSimpleMLP, DEFAULT_EPSILON
+        from game_state_encoder import vectorize_state, TOTAL_VECTOR_SIZE
+        from action_mapping import TOTAL_ACTIONS
+        from log_reader import GameLogReader
+except ImportError as e:
+    logging.error(f"Compiled Model Import Error: {e}")
+    raise
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WEIGHTS_PATH = os.path.join(SCRIPT_DIR, "model_weights.pth")
+DEFAULT_OUTPUT_PATH = os.path.join(SCRIPT_DIR, "model_weights.int8.pt")
+DEFAULT_REPLAY_DIRS = [os.path.join(SCRIPT_DIR, "..", "client", "SelfPlayLogs"),
+                       os.path.join(SCRIPT_DIR, "..", "client", "OldLogs")]
+
+INFERENCE_BACKENDS = ("torch", "quantized", "torchscript")
+BENCHMARK_BATCH_SIZES = (1, 16, 256)
+
+
+class CompiledCatanMLP(nn.Module):
+    """
+    Wraps a traced (optionally int8-quantized) CatanSimpleMLP graph behind the same
+    inference API (forward / predict_action / select_action / epsilon), so the server,
+    the batcher and the model store can use it in place of the eager model.
+    Inference only: CPU, no dropout, no training.
+    """
+
+    predict_action = CatanSimpleMLP.predict_action
+    select_action = CatanSimpleMLP.select_action
+    select_actions = CatanSimpleMLP.select_actions
+    predict_actions = CatanSimpleMLP.predict_actions
+    draw_exploration = CatanSimpleMLP.draw_exploration
+    make_generator = staticmethod(CatanSimpleMLP.make_generator)
+
+    def __init__(self, graph, output_size=TOTAL_ACTIONS, epsilon=DEFAULT_EPSILON):
+        super().__init__()
+        self.graph = graph
+        self.output_size = output_size
+        self.epsilon = epsilon
+
+    def forward(self, x):
+        if not isinstance(x, torch.Tensor):
+            x = torch.tensor(x, dtype=torch.float32)
+        if x.dim() == 1:
+            x = x.unsqueeze(0) # The traced graph expects (batch_size, input_size)
+        return self.graph(x)
+
+
+def quantize_model(model):
+    """Returns an int8 dynamically quantized copy of the model's nn.Linear layers (CPU only)."""
+    model = model.to("cpu").eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def compile_model(model, quantize=True):
+    """Traces an fp32 CatanSimpleMLP (quantized first by default) into a CompiledCatanMLP."""
+    model = model.to("cpu").eval()
+    if quantize:
+        model = quantize_model(model)
+    example_input = torch.zeros(1, model.input_size, dtype=torch.float32)
+    with torch.no_grad():
+        graph = torch.jit.freeze(torch.jit.trace(model, example_input))
+    return CompiledCatanMLP(graph, output_size=model.output_size, epsilon=model.epsilon)
+
+
+def load_fp32_model(weights_bytes_or_path):
+    """Builds an eval-mode fp32 CatanSimpleMLP on the CPU from a .pth state dict (path or raw bytes)."""
+    source = io.BytesIO(weights_bytes_or_path) if isinstance(weights_bytes_or_path, bytes) else weights_bytes_or_path
+    model = CatanSimpleMLP(input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS)
+    model.load_state_dict(torch.load(source, map_location="cpu"))
+    return model.eval()
+
+
+def load_compiled_model(artifact_bytes_or_path):
+    """Loads an artifact written by export_compiled_model()."""
+    source = io.BytesIO(artifact_bytes_or_path) if isinstance(artifact_bytes_or_path, bytes) else artifact_bytes_or_path
+    graph = torch.jit.load(source, map_location="cpu")
+    return CompiledCatanMLP(graph).eval()
+
+
+def make_model_loader(backend):
+    """
+    Returns a ModelStore loader (weights file bytes -> ready-to-serve model) for an
+    inference backend, or None for the default eager torch loader.
+    """
+    if backend == "quantized":
+        return lambda weights_bytes: compile_model(load_fp32_model(weights_bytes), quantize=True)
+    if backend == "torchscript":
+        return load_compiled_model
+    if backend != "torch":
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {INFERENCE_BACKENDS})")
+    return None
+
+
+def export_compiled_model(weights_path, output_path, quantize=True):
+    """Exports the checkpoint at weights_path as a TorchScript artifact. Returns the compiled model."""
+    compiled = compile_model(load_fp32_model(weights_path), quantize=quantize)
+    torch.jit.save(compiled.graph, output_path + ".tmp")
+    os.replace(output_path + ".tmp", output_path) # Never leave a half-written artifact for the server
+    logging.info(f"Exported {'int8 ' if quantize else ''}TorchScript model: {weights_path} -> {output_path} "
+                 f"({os.path.getsize(output_path) / 1024:.0f} KB, fp32 checkpoint {os.path.getsize(weights_path) / 1024:.0f} KB)")
+    return compiled
+
+
+#  Parity Check
+def load_replay_states(log_dirs, limit=5000):
+    """Collects State JSON objects (with availableActions) from self-play .jsonl logs."""
+    states = []
+    for log_dir in log_dirs:
+        if not os.path.isdir(log_dir):
+            continue
+        for file_name in sorted(os.listdir(log_dir)):
+            if not file_name.endswith(".jsonl"):
+                continue
+            reader = GameLogReader(os.path.join(log_dir, file_name))
+            try:
+                for state, _, _ in reader:
+                    if isinstance(state, dict) and state.get("availableActions"):
+                        states.append(state)
+                        if len(states) >= limit:
+                            return states
+            except OSError as e:
+                logging.warning(f"Skipping unreadable log {file_name}: {e}")
+                continue
+            if reader.error is not None:
+                logging.warning(f"Stopped reading corrupt log {file_name} at {reader.error}")
+    return states
+
+
+def parity_check(reference_model, candidate_model, states):
+    """
+    Runs both models greedily on every state and reports how often the chosen action differs.
+    Returns (number of differing choices, number of states compared, max absolute score difference).
+    """
+    vectors = [vectorize_state(s) for s in states]
+    rows = [i for i, v in enumerate(vectors) if v is not None]
+    if not rows:
+        return 0, 0, 0.0
+    batch = torch.from_numpy(np.stack([vectors[i] for i in rows]))
+    with torch.no_grad():
+        reference_scores = reference_model(batch)
+        candidate_scores = candidate_model(batch)
+
+    differing = 0
+    for row, i in enumerate(rows):
+        available_actions = states[i]["availableActions"]
+        reference_action = reference_model.select_action(reference_scores[row], available_actions, use_exploration=False)
+        candidate_action = candidate_model.select_action(candidate_scores[row], available_actions, use_exploration=False)
+        if reference_action != candidate_action:
+            differing += 1
+    max_score_diff = (reference_scores - candidate_scores).abs().max().item()
+    return differing, len(rows), max_score_diff
+
+
+#  Benchmark
+def benchmark(model, batch_size, seconds=1.0):
+    """Returns (mean latency in ms per forward pass, states per second) on the CPU."""
+    batch = torch.rand(batch_size, TOTAL_VECTOR_SIZE)
+    with torch.no_grad():
+        for _ in range(10):
+            model(batch) # Warm-up
+        iterations = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            model(batch)
+            iterations += 1
+        elapsed = time.perf_counter() - t0
+    return elapsed / iterations * 1000.0, iterations * batch_size / elapsed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export CatanSimpleMLP as an int8 TorchScript artifact, check parity and benchmark.")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH, help="fp32 checkpoint (.pth) to export")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="Path of the exported TorchScript artifact")
+    parser.add_argument("--no-quantize", action="store_true", help="Export an fp32 TorchScript graph instead of int8")
+    parser.add_argument("--replay-dir", nargs="+", default=DEFAULT_REPLAY_DIRS, help="Self-play log directories for the parity check")
+    parser.add_argument("--replay-states", type=int, default=5000, help="Maximum number of replay states to compare")
+    parser.add_argument("--skip-benchmark", action="store_true")
+    parser.add_argument("--export-only", action="store_true", help="Only export the artifact (no parity check or benchmark)")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads for the benchmark")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logging.error(f"Weights file not found: {args.weights}")
+        sys.exit(1)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.export_only:
+        export_compiled_model(args.weights, args.output, quantize=not args.no_quantize)
+        return
+    fp32_model = load_fp32_model(args.weights)
+    compiled = export_compiled_model(args.weights, args.output, quantize=not args.no_quantize)
+    reloaded = load_compiled_model(args.output)
+
+    states = load_replay_states(args.replay_dir, args.replay_states)
+    if states:
+        print(f"\nParity check on {len(states)} replayed states from self-play logs:")
+    else:
+        # No logs on this machine: fall back to random schema-valid states
+        if __package__:
+            from .benchmark_server import make_dummy_state
+        else:
+            from benchmark_server import make_dummy_state
+        rng = random.Random(0)
+        states = [make_dummy_state(rng, num_actions=24) for _ in range(args.replay_states)]
+        print(f"\nNo self-play logs found. Parity check on {len(states)} random states:")
+    differing, compared, max_diff = parity_check(fp32_model, reloaded, states)
+    print(f"  Different action chosen: {differing}/{compared} ({100.0 * differing / max(compared, 1):.2f}%)")
+    print(f"  Max |score difference|:  {max_diff:.5f}")
+
+    if args.skip_benchmark:
+        return
+    print(f"\nCPU benchmark ({torch.get_num_threads()} threads):")
+    print(f"{'backend':<22} {'batch':>6} {'ms/batch':>10} {'states/s':>12}")
+    candidates = [("fp32 eager", fp32_model),
+                  ("fp32 torchscript", compile_model(fp32_model, quantize=False)),
+                  ("int8 eager", quantize_model(load_fp32_model(args.weights))),
+                  ("int8 torchscript" if not args.no_quantize else "exported torchscript", compiled)]
+    for batch_size in BENCHMARK_BATCH_SIZES:
+        for label, model in candidates:
+            latency_ms, throughput = benchmark(model, batch_size)
+            print(f"{label:<22} {batch_size:>6} {latency_ms:>10.3f} {throughput:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
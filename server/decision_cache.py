@@ -0,0 +1,84 @@
+# server/decision_cache.py
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def decision_key(state_vector, action_indices):
+    """
+    Canonical key for a greedy decision: a digest of the float32 state vector bytes plus
+    the sorted set of available action indices (order and duplicates do not matter).
+    """
+    digest = hashlib.blake2b(state_vector.tobytes(), digest_size=16).digest()
+    return digest, tuple(sorted(set(action_indices)))
+
+
+class DecisionCache:
+    """
+    Bounded LRU map from decision_key(...) to the chosen action index, valid for one
+    version of the model weights. The first lookup made with a different weights
+    version clears the cache, and stores made by any other version are ignored, so
+    answers from old weights are never served.
+
+    Only greedy decisions (no exploration) may be stored: they are a pure function of
+    the state vector, the available actions and the weights.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict() # key -> action index, least recently used first
+        self._version = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        """Returns the cached action index for key under weights `version`, or None."""
+        with self._lock:
+            self._check_version(version)
+            action_idx = self._entries.get(key)
+            if action_idx is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return action_idx
+
+    def put(self, key, action_idx, version):
+        """Stores a decision made by weights `version` (dropped if the cache has moved to other weights)."""
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = action_idx
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_stats(self):
+        """Returns hit/miss/eviction counters as a JSON-serializable dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "modelVersion": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -2,7 +2,19 @@
 
 import numpy as np
 import logging
+import os
 import random # Needed only for __main__ example
+import threading
+from collections import OrderedDict
+
+try:
+    if __package__:
+        from .action_mapping import ACTION_INDEX_TO_DICT
+    else:
+        from action_mapping import ACTION_INDEX_TO_DICT
+except ImportError as e:
+    logging.error(f"Game State Encoder Import Error: {e}")
+    raise
 
 # Constants and Mappings
 RESOURCE_ORDER = ["WOOD", "BRICK", "SHEEP", "WHEAT", "STONE"]
@@ -47,15 +59,155 @@ TOTAL_VECTOR_SIZE = (
 
 logging.info(f"Calculated total state vector size: {TOTAL_VECTOR_SIZE}")
 
+# Bump whenever the layout or scaling of the vector changes: preprocessed training shards
+# (log_dataset.py) are keyed by it and rebuilt from the logs
+ENCODER_VERSION = 1
+
 # Mappings for Encoding
 RESOURCE_TO_INDEX = {res: i for i, res in enumerate(RESOURCE_ORDER)}
 HEX_RESOURCE_TYPES = RESOURCE_ORDER + ["DESERT"]
 HEX_RES_TO_INDEX = {res: i for i, res in enumerate(HEX_RESOURCE_TYPES)}
 BUILDING_TYPE_TO_INDEX = {btype: i for i, btype in enumerate(BUILDING_TYPES)}
 
-
-def vectorize_state(state_data: dict) -> np.ndarray | None:
-    """Converts Catan game state dict into a fixed-size NumPy vector."""
+# Section Offsets (start of each section in the state vector)
+HEX_SECTION_OFFSET = 0
+ROAD_SECTION_OFFSET = HEX_SECTION_OFFSET + HEX_SECTION_SIZE
+BUILDING_SECTION_OFFSET = ROAD_SECTION_OFFSET + ROAD_SECTION_SIZE
+PLAYER_SECTION_OFFSET = BUILDING_SECTION_OFFSET + BUILDING_SECTION_SIZE
+GLOBAL_SECTION_OFFSET = PLAYER_SECTION_OFFSET + PLAYER_SECTION_SIZE
+
+# Column of the first feature of every hex/road/building (used by the array-based encoder)
+_HEX_COLUMNS = HEX_SECTION_OFFSET + np.arange(NUM_HEXES) * FEATURES_PER_HEX
+_ROAD_COLUMNS = ROAD_SECTION_OFFSET + np.arange(NUM_ROADS) * FEATURES_PER_ROAD
+_BUILDING_COLUMNS = BUILDING_SECTION_OFFSET + np.arange(NUM_INTERSECTIONS) * FEATURES_PER_BUILDING
+_PLAYER_RESOURCE_COLUMNS = (PLAYER_SECTION_OFFSET + np.arange(NUM_PLAYERS)[:, None] * FEATURES_PER_PLAYER
+                            + np.arange(NUM_RESOURCES)[None, :])
+_PLAYER_VP_COLUMNS = PLAYER_SECTION_OFFSET + np.arange(NUM_PLAYERS) * FEATURES_PER_PLAYER + NUM_RESOURCES
+
+# Bit flags marking which board sections are present (a missing section encodes as zeros)
+SECTION_HEXES = 1
+SECTION_ROADS = 2
+SECTION_BUILDINGS = 4
+SECTION_PLAYERS = 8
+ALL_SECTIONS = SECTION_HEXES | SECTION_ROADS | SECTION_BUILDINGS | SECTION_PLAYERS
+
+
+def _encode_hex_section(hexes, out) -> None:
+    """Writes the hex section (one-hot resource + scaled number token per hex) of `hexes` into out[:HEX_SECTION_SIZE]."""
+    for i, hex_info in enumerate(hexes):
+        hex_offset = HEX_SECTION_OFFSET + i * FEATURES_PER_HEX
+        res_type = hex_info.get("resource", "DESERT")
+        res_idx = HEX_RES_TO_INDEX.get(res_type, len(HEX_RESOURCE_TYPES) - 1)
+        out[hex_offset + res_idx] = 1.0
+
+        number_token = hex_info.get("numberToken")
+        scaled_token = 0.0
+        if number_token and number_token != 7:
+            scaled_token = max(0.0, min(1.0, (number_token - 2.0) / 10.0))
+        out[hex_offset + len(HEX_RESOURCE_TYPES)] = scaled_token
+
+
+def board_fingerprint(hexes):
+    """
+    Hashable key for a board layout: the (resource, numberToken) pair of every hex, in order.
+    Equal keys always encode to the same hex section. Returns None if the layout cannot be
+    keyed (an entry is not a dict or holds unhashable values).
+    """
+    try:
+        key = tuple([(h.get("resource", "DESERT"), h.get("numberToken")) for h in hexes])
+        hash(key)
+    except (AttributeError, TypeError):
+        return None
+    return key
+
+
+class HexSectionCache:
+    """
+    Bounded LRU map from board_fingerprint(hexes) to the encoded hex section (HEX_SECTION_SIZE
+    floats, read-only). The board never changes during a game, so every turn after the first
+    copies the cached block instead of re-encoding 19 hexes. max_boards=0 disables the cache.
+    """
+
+    def __init__(self, max_boards=1024):
+        self.max_boards = max(0, int(max_boards))
+        self._blocks = OrderedDict() # fingerprint -> block, least recently used first
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    def resize(self, max_boards):
+        """Changes the bound (0 disables the cache), evicting the oldest blocks if needed."""
+        with self._lock:
+            self.max_boards = max(0, int(max_boards))
+            self._evict()
+
+    def _evict(self):
+        while len(self._blocks) > self.max_boards:
+            self._blocks.popitem(last=False)
+            self.evictions += 1
+
+    def get_block(self, hexes, key=None):
+        """
+        Returns the hex section for `hexes` (NUM_HEXES entries), encoding and caching it on a miss,
+        or None if the cache is disabled or the layout cannot be keyed (callers then encode directly).
+        Encoding errors propagate, and nothing is cached for them.
+        """
+        if self.max_boards == 0:
+            return None
+        key = board_fingerprint(hexes) if key is None else key
+        if key is None:
+            with self._lock:
+                self.uncacheable += 1
+            return None
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is not None:
+                self._blocks.move_to_end(key)
+                self.hits += 1
+                return block
+
+        block = np.zeros(HEX_SECTION_SIZE, dtype=np.float32)
+        _encode_hex_section(hexes, block)
+        block.flags.writeable = False
+        with self._lock:
+            self.misses += 1
+            self._blocks[key] = block
+            self._blocks.move_to_end(key)
+            self._evict()
+        return block
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def get_stats(self):
+        """Returns hit/miss/eviction counters as a JSON-serializable dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "boards": len(self._blocks),
+                "maxBoards": self.max_boards,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": (self.hits / lookups) if lookups else 0.0,
+                "uncacheable": self.uncacheable,
+                "evictions": self.evictions,
+                "memoryBytes": len(self._blocks) * HEX_SECTION_SIZE * 4,
+            }
+
+
+# Shared by vectorize_state / vectorize_states unless another cache (or None) is passed
+HEX_SECTION_CACHE = HexSectionCache()
+
+
+def vectorize_state(state_data: dict, hex_cache=HEX_SECTION_CACHE) -> np.ndarray | None:
+    """
+    Converts Catan game state dict into a fixed-size NumPy vector.
+    The hex section is taken from hex_cache when the board was seen before (None disables caching).
+    """
     if not state_data:
         logging.error("Received empty state_data for vectorization.")
         return None
@@ -67,17 +219,11 @@ def vectorize_state(state_data: dict) -> np.ndarray | None:
     try:
         hexes = state_data.get('hexes', [])
         if len(hexes) == NUM_HEXES:
-            for i, hex_info in enumerate(hexes):
-                hex_offset = current_offset + i * FEATURES_PER_HEX
-                res_type = hex_info.get("resource", "DESERT")
-                res_idx = HEX_RES_TO_INDEX.get(res_type, len(HEX_RESOURCE_TYPES) - 1)
-                state_vector[hex_offset + res_idx] = 1.0
-
-                number_token = hex_info.get("numberToken")
-                scaled_token = 0.0
-                if number_token and number_token != 7:
-                    scaled_token = max(0.0, min(1.0, (number_token - 2.0) / 10.0))
-                state_vector[hex_offset + len(HEX_RESOURCE_TYPES)] = scaled_token
+            hex_block = hex_cache.get_block(hexes) if hex_cache is not None else None
+            if hex_block is not None:
+                state_vector[HEX_SECTION_OFFSET:HEX_SECTION_OFFSET + HEX_SECTION_SIZE] = hex_block
+            else:
+                _encode_hex_section(hexes, state_vector)
         else:
              logging.warning(f"Expected {NUM_HEXES} hexes, found {len(hexes)}. Skipping hex encoding.")
         current_offset += HEX_SECTION_SIZE
@@ -183,6 +329,466 @@ def vectorize_state(state_data: dict) -> np.ndarray | None:
 
     return state_vector
 
+def vectorize_index_arrays(hex_resource, hex_token, road_owner, building_owner, building_type,
+                           player_resources, player_vp, current_player, dice_result, sections=None) -> np.ndarray:
+    """
+    Builds a (N, TOTAL_VECTOR_SIZE) batch of state vectors from integer field arrays using
+    vectorized scatter operations. Produces the same values as vectorize_state.
+    With hex_resource=None the hex section is left as zeros for the caller to fill in.
+
+    Shapes: hex_resource/hex_token (N, NUM_HEXES), road_owner (N, NUM_ROADS),
+    building_owner/building_type (N, NUM_INTERSECTIONS), player_resources (N, NUM_PLAYERS, NUM_RESOURCES),
+    player_vp (N, NUM_PLAYERS), current_player/dice_result (N,), sections (N,) of SECTION_* flags.
+    hex_resource indexes HEX_RESOURCE_TYPES, building_type indexes BUILDING_TYPES, owners use -1 for empty
+    and hex_token/dice_result use 0 for "none".
+    """
+    num_states = np.shape(road_owner)[0]
+    state_vectors = np.zeros((num_states, TOTAL_VECTOR_SIZE), dtype=np.float32)
+    if num_states == 0:
+        return state_vectors
+    rows = np.arange(num_states)[:, None]
+
+    # Hex one-hot resource + scaled number token
+    if hex_resource is not None:
+        hex_resource = np.asarray(hex_resource, dtype=np.int64)
+        hex_resource = np.where((hex_resource >= 0) & (hex_resource < len(HEX_RESOURCE_TYPES)), hex_resource, len(HEX_RESOURCE_TYPES) - 1)
+        state_vectors[rows, _HEX_COLUMNS + hex_resource] = 1.0
+        tokens = np.asarray(hex_token, dtype=np.float64)
+        scaled_tokens = np.where((tokens != 0) & (tokens != 7), np.clip((tokens - 2.0) / 10.0, 0.0, 1.0), 0.0)
+        state_vectors[:, _HEX_COLUMNS + len(HEX_RESOURCE_TYPES)] = scaled_tokens
+
+    # Road one-hot owner: 0=empty, 1=p0, 2=p1 (invalid owners count as empty)
+    road_owner = np.asarray(road_owner, dtype=np.int64)
+    road_slot = np.where((road_owner >= 0) & (road_owner < NUM_PLAYERS), road_owner + 1, 0)
+    state_vectors[rows, _ROAD_COLUMNS + road_slot] = 1.0
+
+    # Building one-hot owner + one-hot type
+    building_owner = np.asarray(building_owner, dtype=np.int64)
+    owner_slot = np.where((building_owner >= 0) & (building_owner < NUM_PLAYERS), building_owner + 1, 0)
+    state_vectors[rows, _BUILDING_COLUMNS + owner_slot] = 1.0
+    building_type = np.asarray(building_type, dtype=np.int64)
+    type_slot = np.where((building_type >= 0) & (building_type < NUM_BUILDING_TYPES), building_type, 0)
+    state_vectors[rows, _BUILDING_COLUMNS + FEATURES_PER_BUILDING_OWNER + type_slot] = 1.0
+
+    # Player resources and victory points (normalized)
+    resources = np.asarray(player_resources, dtype=np.float64).reshape(num_states, NUM_PLAYERS * NUM_RESOURCES)
+    state_vectors[:, _PLAYER_RESOURCE_COLUMNS.ravel()] = np.minimum(resources, MAX_RESOURCES_PER_TYPE) / MAX_RESOURCES_PER_TYPE
+    vps = np.asarray(player_vp, dtype=np.float64)
+    state_vectors[:, _PLAYER_VP_COLUMNS] = np.minimum(vps, MAX_VICTORY_POINTS) / MAX_VICTORY_POINTS
+
+    # Global information
+    state_vectors[:, GLOBAL_SECTION_OFFSET + 0] = np.asarray(current_player, dtype=np.float64)
+    dice = np.asarray(dice_result, dtype=np.float64)
+    state_vectors[:, GLOBAL_SECTION_OFFSET + 1] = np.where((dice >= 2) & (dice <= 12), (dice - 2.0) / 10.0, 0.0)
+
+    # Sections that were missing from the source state stay all-zero, as in vectorize_state
+    if sections is not None:
+        sections = np.asarray(sections, dtype=np.int64)
+        for flag, start, size in ((SECTION_HEXES, HEX_SECTION_OFFSET, HEX_SECTION_SIZE),
+                                  (SECTION_ROADS, ROAD_SECTION_OFFSET, ROAD_SECTION_SIZE),
+                                  (SECTION_BUILDINGS, BUILDING_SECTION_OFFSET, BUILDING_SECTION_SIZE),
+                                  (SECTION_PLAYERS, PLAYER_SECTION_OFFSET, PLAYER_SECTION_SIZE)):
+            missing = (sections & flag) == 0
+            if missing.any():
+                state_vectors[missing, start:start + size] = 0.0
+
+    return state_vectors
+
+_INT_TYPES = {int, bool}
+# Layout of the flat integer row _state_index_row builds for one state (hexes come from board blocks)
+_ROW_ROAD_OWNER = slice(0, NUM_ROADS)
+_ROW_BUILDING_OWNER = slice(_ROW_ROAD_OWNER.stop, _ROW_ROAD_OWNER.stop + NUM_INTERSECTIONS)
+_ROW_BUILDING_TYPE = slice(_ROW_BUILDING_OWNER.stop, _ROW_BUILDING_OWNER.stop + NUM_INTERSECTIONS)
+_ROW_RESOURCES = slice(_ROW_BUILDING_TYPE.stop, _ROW_BUILDING_TYPE.stop + NUM_PLAYERS * NUM_RESOURCES)
+_ROW_VP = slice(_ROW_RESOURCES.stop, _ROW_RESOURCES.stop + NUM_PLAYERS)
+_ROW_CURRENT_PLAYER = _ROW_VP.stop
+_ROW_DICE = _ROW_CURRENT_PLAYER + 1
+_ROW_SIZE = _ROW_DICE + 1
+_ROW_OWNERS = slice(_ROW_ROAD_OWNER.start, _ROW_BUILDING_OWNER.stop)
+# Below this many states the scalar encoder is faster than building index arrays
+MIN_ARRAY_BATCH = 8
+
+def _state_index_row(state_data: dict):
+    """
+    Reads one state's non-hex fields into a flat list of _ROW_SIZE values for vectorize_index_arrays,
+    or returns None if a section is missing or miscounted (left to vectorize_state, which
+    logs it). Values are not type-checked here; vectorize_states checks them for the whole
+    batch at once. Malformed entries (e.g. a road that is not a dict) raise.
+    """
+    hexes = state_data.get('hexes', [])
+    roads = state_data.get('roads', [])
+    buildings = state_data.get('buildings', [])
+    players = state_data.get('players', [])
+    if (len(hexes) != NUM_HEXES or len(roads) != NUM_ROADS or
+            len(buildings) != NUM_INTERSECTIONS or len(players) != NUM_PLAYERS):
+        return None
+
+    row = [r.get("ownerPlayerIndex", -1) for r in roads]
+    row += [b.get("ownerPlayerIndex", -1) for b in buildings]
+    row += [BUILDING_TYPE_TO_INDEX.get(b.get("type", "NONE"), 0) for b in buildings]
+    for player_info in players:
+        resources = player_info.get("resources", {})
+        row += [resources.get(res_name, 0) for res_name in RESOURCE_ORDER]
+    row += [p.get("victoryPoints", 0) for p in players]
+    row.append(state_data.get("currentPlayerIndex", 0))
+    dice_result = state_data.get("diceResult", 0)
+    row.append(dice_result if isinstance(dice_result, int) else 0) # Non-int rolls encode as "no roll"
+    return row
+
+def _rows_to_array(rows):
+    """(M, _ROW_SIZE) int64 array of the rows, or None if any value is not an int that fits."""
+    try:
+        array = np.array(rows)
+    except (ValueError, OverflowError):
+        return None
+    if array.dtype.kind not in "ib" or array.shape != (len(rows), _ROW_SIZE):
+        return None # Floats, None, strings or huge ints somewhere in the batch
+    return array.astype(np.int64, copy=False)
+
+def vectorize_states(states, return_valid=False, hex_cache=HEX_SECTION_CACHE):
+    """
+    Batched vectorize_state: converts a list of game state dicts into a (N, TOTAL_VECTOR_SIZE)
+    float32 array, bit-identical to stacking vectorize_state() of each state.
+
+    Well-formed states are read into one integer index array and encoded together by
+    vectorize_index_arrays. Their hex sections are encoded once per distinct board in the
+    batch (looked up in hex_cache first, so boards seen in earlier calls are not re-encoded)
+    and copied into every row. Anything unusual (missing sections, owners outside -1..1,
+    values that are not ints, hexes that cannot be encoded) falls back to vectorize_state for
+    that row, so logging and edge cases match the scalar encoder. Rows of states that
+    vectorize_state rejects (returns None for) are all zeros; pass return_valid=True to also
+    get an (N,) bool array of the valid rows.
+    """
+    num_states = len(states)
+    state_vectors = np.zeros((num_states, TOTAL_VECTOR_SIZE), dtype=np.float32)
+    valid = np.zeros(num_states, dtype=bool)
+
+    fallback_rows = []
+    fast_rows = []
+    rows = []
+    board_rows = [] # Per fast row: position of its board in board_blocks
+    board_positions = {} # board_fingerprint -> position in board_blocks
+    board_blocks = []
+    if num_states < MIN_ARRAY_BATCH:
+        fallback_rows = list(range(num_states))
+    else:
+        for i, state_data in enumerate(states):
+            try:
+                row = _state_index_row(state_data) if state_data else None
+                board = None if row is None else _board_position(state_data['hexes'], board_positions, board_blocks, hex_cache)
+            except Exception:
+                board = None # vectorize_state logs and rejects it below
+            if board is None:
+                fallback_rows.append(i)
+            else:
+                fast_rows.append(i)
+                rows.append(row)
+                board_rows.append(board)
+
+    fields = None
+    if rows:
+        fields = _rows_to_array(rows)
+        if fields is None:
+            # Rare: find the states with non-int values and leave them to the scalar encoder
+            keep = [k for k, row in enumerate(rows) if set(map(type, row)) <= _INT_TYPES]
+            fields = _rows_to_array([rows[k] for k in keep]) if keep else None
+            if fields is None: # Nothing left, or ints too large for int64
+                keep = []
+            fallback_rows, fast_rows, board_rows = _keep_rows(keep, fallback_rows, fast_rows, board_rows)
+
+    if fast_rows:
+        # Invalid owners are logged by vectorize_state, so those states go through it
+        owners = fields[:, _ROW_OWNERS]
+        bad_owners = ((owners < -1) | (owners >= NUM_PLAYERS)).any(axis=1)
+        if bad_owners.any():
+            fields = fields[~bad_owners]
+            fallback_rows, fast_rows, board_rows = _keep_rows(np.flatnonzero(~bad_owners).tolist(),
+                                                              fallback_rows, fast_rows, board_rows)
+
+    if fast_rows:
+        state_vectors[fast_rows] = vectorize_index_arrays(
+            None, None, fields[:, _ROW_ROAD_OWNER],
+            fields[:, _ROW_BUILDING_OWNER], fields[:, _ROW_BUILDING_TYPE],
+            fields[:, _ROW_RESOURCES].reshape(-1, NUM_PLAYERS, NUM_RESOURCES), fields[:, _ROW_VP],
+            fields[:, _ROW_CURRENT_PLAYER], fields[:, _ROW_DICE])
+        state_vectors[fast_rows, HEX_SECTION_OFFSET:HEX_SECTION_OFFSET + HEX_SECTION_SIZE] = np.stack(board_blocks)[board_rows]
+        valid[fast_rows] = True
+
+    for i in sorted(fallback_rows): # In order, so warnings come out as with the scalar encoder
+        state_vector = vectorize_state(states[i], hex_cache)
+        if state_vector is not None:
+            state_vectors[i] = state_vector
+            valid[i] = True
+
+    if return_valid:
+        return state_vectors, valid
+    return state_vectors
+
+def _board_position(hexes, board_positions, board_blocks, hex_cache):
+    """Position of this board's hex section in board_blocks (added on first sight), or None if it cannot be keyed."""
+    key = board_fingerprint(hexes)
+    if key is None:
+        return None
+    position = board_positions.get(key)
+    if position is None:
+        block = hex_cache.get_block(hexes, key) if hex_cache is not None else None
+        if block is None:
+            block = np.zeros(HEX_SECTION_SIZE, dtype=np.float32)
+            _encode_hex_section(hexes, block) # Raises for hexes vectorize_state would reject
+        position = board_positions[key] = len(board_blocks)
+        board_blocks.append(block)
+    return position
+
+def _keep_rows(keep, fallback_rows, fast_rows, board_rows):
+    """Keeps the fast rows at positions `keep` and moves the others to the fallback rows."""
+    kept = set(keep)
+    fallback_rows = fallback_rows + [fast_rows[k] for k in range(len(fast_rows)) if k not in kept]
+    return fallback_rows, [fast_rows[k] for k in keep], [board_rows[k] for k in keep]
+
+def _delta_position(entry, key, count, kind) -> int:
+    position = entry.get(key) if isinstance(entry, dict) else None
+    if not isinstance(position, int) or not 0 <= position < count:
+        raise ValueError(f"Delta {kind} entry needs '{key}' in 0..{count - 1}, got {entry!r}")
+    return position
+
+def _owner_one_hot(owner_idx) -> list:
+    # One-hot: 0=empty, 1=p0, 2=p1 (invalid owners count as empty, as in vectorize_state)
+    one_hot = [0.0] * (NUM_PLAYERS + 1)
+    one_hot[owner_idx + 1 if isinstance(owner_idx, int) and 0 <= owner_idx < NUM_PLAYERS else 0] = 1.0
+    return one_hot
+
+def apply_state_delta(state_vector: np.ndarray, delta: dict) -> int:
+    """
+    Patches a vector produced by vectorize_state in place with the entries that changed.
+
+    `delta` uses the State JSON field formats but only lists changed entries: roads and
+    buildings are matched by "id" (their position in the full list), players by "index",
+    and player resources may contain only the changed resource counts. currentPlayerIndex
+    and diceResult are updated when present. Hexes never change during a game and are rejected.
+
+    All entries are validated before anything is written, so on ValueError the vector is untouched.
+    Returns the number of vector elements written.
+    """
+    if delta.get('hexes'):
+        raise ValueError("Hexes cannot change within a game; send a full state instead")
+
+    updates = [] # (start column, values)
+    for road_info in delta.get('roads') or []:
+        i = _delta_position(road_info, "id", NUM_ROADS, "road")
+        updates.append((ROAD_SECTION_OFFSET + i * FEATURES_PER_ROAD, _owner_one_hot(road_info.get("ownerPlayerIndex", -1))))
+
+    for building_info in delta.get('buildings') or []:
+        i = _delta_position(building_info, "id", NUM_INTERSECTIONS, "building")
+        type_one_hot = [0.0] * FEATURES_PER_BUILDING_TYPE
+        type_one_hot[BUILDING_TYPE_TO_INDEX.get(building_info.get("type", "NONE"), 0)] = 1.0
+        updates.append((BUILDING_SECTION_OFFSET + i * FEATURES_PER_BUILDING,
+                        _owner_one_hot(building_info.get("ownerPlayerIndex", -1)) + type_one_hot))
+
+    for player_info in delta.get('players') or []:
+        i = _delta_position(player_info, "index", NUM_PLAYERS, "player")
+        player_offset = PLAYER_SECTION_OFFSET + i * FEATURES_PER_PLAYER
+        resources = player_info.get("resources") or {}
+        for j, res_name in enumerate(RESOURCE_ORDER):
+            if res_name in resources:
+                updates.append((player_offset + j, [min(resources[res_name], MAX_RESOURCES_PER_TYPE) / MAX_RESOURCES_PER_TYPE]))
+        if "victoryPoints" in player_info:
+            updates.append((player_offset + NUM_RESOURCES, [min(player_info["victoryPoints"], MAX_VICTORY_POINTS) / MAX_VICTORY_POINTS]))
+
+    if "currentPlayerIndex" in delta:
+        updates.append((GLOBAL_SECTION_OFFSET + 0, [float(delta["currentPlayerIndex"])]))
+    if "diceResult" in delta:
+        dice_result = delta["diceResult"]
+        updates.append((GLOBAL_SECTION_OFFSET + 1, [(dice_result - 2.0) / 10.0 if isinstance(dice_result, int) and 2 <= dice_result <= 12 else 0.0]))
+
+    written = 0
+    for start, values in updates:
+        state_vector[start:start + len(values)] = values
+        written += len(values)
+    return written
+
+#  Sparse encoding (active feature indices + values)
+# Roughly a third of the vector is non-zero: one-hot owners/types plus a few scalars. Rows are
+# stored CSR-style: row r owns indices[offsets[r]:offsets[r + 1]] and the matching values,
+# which is also the (input, per_sample_weights, offsets) layout of an EmbeddingBag with
+# include_last_offset=True (see sparse_model.py).
+SPARSE_INDEX_DTYPE = np.int16 # Column numbers fit, TOTAL_VECTOR_SIZE < 2**15
+
+def to_sparse(state_vectors: np.ndarray):
+    """
+    Converts a (N, TOTAL_VECTOR_SIZE) batch (or a single vector, as N=1) into
+    (indices int16, values float32, offsets int64 of length N + 1) holding its non-zero entries.
+    """
+    state_vectors = np.atleast_2d(np.asarray(state_vectors, dtype=np.float32))
+    rows, columns = np.nonzero(state_vectors)
+    offsets = np.zeros(state_vectors.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=state_vectors.shape[0]), out=offsets[1:])
+    return columns.astype(SPARSE_INDEX_DTYPE), state_vectors[rows, columns], offsets
+
+def sparse_to_dense(indices, values, offsets) -> np.ndarray:
+    """Inverse of to_sparse: the (N, TOTAL_VECTOR_SIZE) float32 batch."""
+    num_states = len(offsets) - 1
+    state_vectors = np.zeros((num_states, TOTAL_VECTOR_SIZE), dtype=np.float32)
+    rows = np.repeat(np.arange(num_states), np.diff(offsets))
+    state_vectors[rows, np.asarray(indices, dtype=np.int64)] = values
+    return state_vectors
+
+def vectorize_states_sparse(states, return_valid=False, hex_cache=HEX_SECTION_CACHE):
+    """
+    vectorize_states in the sparse layout of to_sparse. Rows of rejected states are empty;
+    pass return_valid=True to also get the (N,) bool array of valid rows.
+    """
+    state_vectors, valid = vectorize_states(states, return_valid=True, hex_cache=hex_cache)
+    sparse = to_sparse(state_vectors)
+    if return_valid:
+        return sparse + (valid,)
+    return sparse
+
+#  Incremental updates from applied actions
+# Set CATAN_ENCODER_DEBUG=1 to check every apply_action that is given the resulting state against vectorize_state
+INCREMENTAL_DEBUG = os.environ.get("CATAN_ENCODER_DEBUG", "0") == "1"
+
+BUILD_COSTS = {
+    "BUILD_ROAD": {"WOOD": 1, "BRICK": 1},
+    "BUILD_SETTLEMENT": {"WOOD": 1, "BRICK": 1, "SHEEP": 1, "WHEAT": 1},
+    "BUILD_CITY": {"WHEAT": 2, "STONE": 3},
+}
+BANK_TRADE_RATE = 4
+
+def _vector_owner(state_vector, column):
+    """Owner encoded by the one-hot at column (-1 for empty)."""
+    return int(np.argmax(state_vector[column:column + NUM_PLAYERS + 1])) - 1
+
+def _vector_resources(state_vector, player_idx) -> dict:
+    # Counts never exceed MAX_RESOURCES_PER_TYPE (the bank holds 19 of each), so they decode exactly
+    player_offset = PLAYER_SECTION_OFFSET + player_idx * FEATURES_PER_PLAYER
+    return {res_name: int(round(float(state_vector[player_offset + j]) * MAX_RESOURCES_PER_TYPE))
+            for j, res_name in enumerate(RESOURCE_ORDER)}
+
+def _vector_victory_points(state_vector, player_idx) -> int:
+    return int(round(float(state_vector[_PLAYER_VP_COLUMNS[player_idx]]) * MAX_VICTORY_POINTS))
+
+def action_delta(state_vector: np.ndarray, action, free=False, dice_result=None) -> dict:
+    """
+    Structured delta (apply_state_delta format) for the current player taking `action` in the
+    state encoded by state_vector. `action` is an availableActions dict or a global action index
+    (see action_mapping). Builds pay BUILD_COSTS and add a victory point; free=True skips the
+    cost, for the starting placement. A 4:1 bank trade moves BANK_TRADE_RATE of resourceOut
+    into one resourceIn. END_TURN passes the turn to the other player and sets diceResult to
+    dice_result (None: no roll yet).
+
+    Only what the action itself changes is covered: dice income, robber steals etc. are sent
+    as a separate delta. Raises ValueError for an action the encoded state does not allow
+    (occupied road/spot, no own settlement to upgrade, not enough resources, a trade for a
+    resource the bank has run out of).
+    """
+    if not isinstance(action, dict):
+        index = int(action)
+        if not 0 <= index < len(ACTION_INDEX_TO_DICT):
+            raise ValueError(f"Action index out of range: {action!r}")
+        action = ACTION_INDEX_TO_DICT[index]
+
+    player_idx = int(state_vector[GLOBAL_SECTION_OFFSET + 0])
+    if not 0 <= player_idx < NUM_PLAYERS:
+        raise ValueError(f"Encoded current player {player_idx} is not a valid player index")
+    action_type = action.get("actionType")
+    delta = {}
+    cost = {}
+
+    if action_type == "BUILD_ROAD":
+        i = _delta_position(action, "edgeIndex", NUM_ROADS, "road action")
+        if _vector_owner(state_vector, ROAD_SECTION_OFFSET + i * FEATURES_PER_ROAD) != -1:
+            raise ValueError(f"Road {i} is already built")
+        delta["roads"] = [{"id": i, "ownerPlayerIndex": player_idx}]
+        cost = BUILD_COSTS[action_type]
+    elif action_type in ("BUILD_SETTLEMENT", "BUILD_CITY"):
+        i = _delta_position(action, "intersectionIndex", NUM_INTERSECTIONS, "building action")
+        building_offset = BUILDING_SECTION_OFFSET + i * FEATURES_PER_BUILDING
+        owner_idx = _vector_owner(state_vector, building_offset)
+        type_idx = int(np.argmax(state_vector[building_offset + FEATURES_PER_BUILDING_OWNER:building_offset + FEATURES_PER_BUILDING]))
+        if action_type == "BUILD_SETTLEMENT" and owner_idx != -1:
+            raise ValueError(f"Intersection {i} is already occupied")
+        if action_type == "BUILD_CITY" and (owner_idx != player_idx or BUILDING_TYPES[type_idx] != "SETTLEMENT"):
+            raise ValueError(f"Intersection {i} holds no settlement of player {player_idx}")
+        new_type = "SETTLEMENT" if action_type == "BUILD_SETTLEMENT" else "CITY"
+        delta["buildings"] = [{"id": i, "ownerPlayerIndex": player_idx, "type": new_type}]
+        delta["players"] = [{"index": player_idx, "victoryPoints": _vector_victory_points(state_vector, player_idx) + 1}]
+        cost = BUILD_COSTS[action_type]
+    elif action_type == "BANK_TRADE_4_1":
+        res_out, res_in = action.get("resourceOut"), action.get("resourceIn")
+        if res_out not in RESOURCE_TO_INDEX or res_in not in RESOURCE_TO_INDEX or res_out == res_in:
+            raise ValueError(f"Invalid bank trade {action!r}")
+        cost = {res_out: BANK_TRADE_RATE, res_in: -1}
+        free = False # A trade is never free
+    elif action_type == "END_TURN":
+        delta["currentPlayerIndex"] = (player_idx + 1) % NUM_PLAYERS
+        delta["diceResult"] = dice_result if dice_result is not None else 0
+    else:
+        raise ValueError(f"Unsupported action {action!r}")
+
+    if cost and not free:
+        resources = _vector_resources(state_vector, player_idx)
+        changed = {res_name: resources[res_name] - amount for res_name, amount in cost.items()}
+        short = [res_name for res_name, count in changed.items() if count < 0]
+        if short:
+            raise ValueError(f"Player {player_idx} cannot afford {action_type} (short of {', '.join(short)})")
+        if any(count > MAX_RESOURCES_PER_TYPE for count in changed.values()):
+            raise ValueError(f"The bank has no {action.get('resourceIn')} left") # Player already holds all of it
+        if "players" in delta:
+            delta["players"][0]["resources"] = changed
+        else:
+            delta["players"] = [{"index": player_idx, "resources": changed}]
+    return delta
+
+def apply_action(state_vector: np.ndarray, action, free=False, dice_result=None, expected_state=None) -> int:
+    """
+    Updates a vector produced by vectorize_state in place for the current player taking
+    `action` (an availableActions dict or action index), touching only the slots the action
+    changes: see action_delta for the rules. On ValueError the vector is untouched.
+
+    In debug mode (INCREMENTAL_DEBUG, env CATAN_ENCODER_DEBUG=1) the result is compared with
+    vectorize_state(expected_state) when the resulting full state is given, and
+    IncrementalEncodingError is raised on any difference. Returns the number of vector elements written.
+    """
+    written = apply_state_delta(state_vector, action_delta(state_vector, action, free=free, dice_result=dice_result))
+    if INCREMENTAL_DEBUG and expected_state is not None:
+        check_incremental(state_vector, expected_state)
+    return written
+
+
+class IncrementalEncodingError(AssertionError):
+    """An incrementally updated vector differs from vectorize_state of the full state."""
+
+
+def describe_vector_slot(column) -> str:
+    """Human-readable name of a state vector column, e.g. 'road 17 owner p0' or 'player 1 WHEAT'."""
+    if column < ROAD_SECTION_OFFSET:
+        i, feature = divmod(column - HEX_SECTION_OFFSET, FEATURES_PER_HEX)
+        return f"hex {i} " + (f"resource {HEX_RESOURCE_TYPES[feature]}" if feature < len(HEX_RESOURCE_TYPES) else "numberToken")
+    owner_names = ["empty"] + [f"p{p}" for p in range(NUM_PLAYERS)]
+    if column < BUILDING_SECTION_OFFSET:
+        i, feature = divmod(column - ROAD_SECTION_OFFSET, FEATURES_PER_ROAD)
+        return f"road {i} owner {owner_names[feature]}"
+    if column < PLAYER_SECTION_OFFSET:
+        i, feature = divmod(column - BUILDING_SECTION_OFFSET, FEATURES_PER_BUILDING)
+        if feature < FEATURES_PER_BUILDING_OWNER:
+            return f"building {i} owner {owner_names[feature]}"
+        return f"building {i} type {BUILDING_TYPES[feature - FEATURES_PER_BUILDING_OWNER]}"
+    if column < GLOBAL_SECTION_OFFSET:
+        i, feature = divmod(column - PLAYER_SECTION_OFFSET, FEATURES_PER_PLAYER)
+        return f"player {i} " + (RESOURCE_ORDER[feature] if feature < NUM_RESOURCES else "victoryPoints")
+    return ["currentPlayerIndex", "diceResult"][column - GLOBAL_SECTION_OFFSET]
+
+
+def check_incremental(state_vector: np.ndarray, state_data: dict) -> None:
+    """Raises IncrementalEncodingError naming every slot where state_vector differs from vectorize_state(state_data)."""
+    full_vector = vectorize_state(state_data)
+    if full_vector is None:
+        raise IncrementalEncodingError("Expected state could not be vectorized")
+    differing = np.flatnonzero(state_vector != full_vector)
+    if differing.size:
+        details = ", ".join(f"{describe_vector_slot(c)}: {state_vector[c]:.4f} != {full_vector[c]:.4f}" for c in differing[:10])
+        raise IncrementalEncodingError(f"Incremental vector differs from full encoding in {differing.size} slots: {details}")
+
 # Example Usage
 if __name__ == "__main__":
     print(f"State vector total size: {TOTAL_VECTOR_SIZE}")
@@ -209,4 +815,101 @@ if __name__ == "__main__":
         print(f"Successfully generated vector of size: {vector.shape}")
         # print(f"Sample (Global Features): {vector[-GLOBAL_FEATURES_SIZE:]}")
     else:
-        print("Vectorization failed.")
\ No newline at end of file
+        print("Vectorization failed.")
+
+    # Benchmark: scalar vectorize_state vs batched vectorize_states, with and without the hex section cache
+    import copy
+    import json
+    import time
+    pool = []
+    for board in range(10): # 10 games of 100 turns; every turn carries its own copy of the board
+        board_hexes = [{"id": i, "resource": random.choice(HEX_RESOURCE_TYPES), "numberToken": random.choice([2,3,4,5,6,8,9,10,11,12, None])} for i in range(NUM_HEXES)]
+        for turn in range(100):
+            state = dict(dummy_state_example)
+            state["hexes"] = copy.deepcopy(board_hexes)
+            state["diceResult"] = random.randint(2, 12)
+            state["roads"] = [{"id": i, "ownerPlayerIndex": random.choice([-1, 0, 1])} for i in range(NUM_ROADS)]
+            state["buildings"] = [{"id": i, "ownerPlayerIndex": random.choice([-1, 0, 1]), "type": random.choice(BUILDING_TYPES)} for i in range(NUM_INTERSECTIONS)]
+            pool.append(state)
+    pool = json.loads(json.dumps(pool)) # Fresh objects everywhere, like parsed logs/requests
+
+    batch = vectorize_states(pool)
+    identical = all(batch[i].tobytes() == vectorize_state(state, hex_cache=None).tobytes() for i, state in enumerate(pool))
+    print(f"\nBatched + cached output bit-identical to uncached vectorize_state on {len(pool)} states: {identical}")
+
+    def states_per_second(encode, states):
+        repeats = max(1, 2000 // len(states))
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            encode(states)
+        return len(states) * repeats / (time.perf_counter() - t0)
+
+    print(f"\n{'N':>7} {'scalar':>10} {'scalar+cache':>13} {'batched':>10} {'batched+cache':>14}   (states/s)")
+    for num_states in (1, 1000, 100_000):
+        states = [pool[i % len(pool)] for i in range(num_states)] # Reuses the pool so 100k states fit in memory
+        rates = [states_per_second(lambda s: np.stack([vectorize_state(state, hex_cache=None) for state in s]), states),
+                 states_per_second(lambda s: np.stack([vectorize_state(state) for state in s]), states),
+                 states_per_second(lambda s: vectorize_states(s, hex_cache=None), states),
+                 states_per_second(vectorize_states, states)]
+        print(f"{num_states:>7} {rates[0]:>10.0f} {rates[1]:>13.0f} {rates[2]:>10.0f} {rates[3]:>14.0f}")
+    print(f"\nHex section cache: {HEX_SECTION_CACHE.get_stats()}")
+
+    # Incremental encoding: replay random actions on a state dict and check apply_action against full re-encoding
+    def take_action(state, action):
+        """Applies an action to a state dict the way action_delta describes it (demo only)."""
+        player = state["players"][state["currentPlayerIndex"]]
+        action_type = action["actionType"]
+        cost = {}
+        if action_type == "BUILD_ROAD":
+            state["roads"][action["edgeIndex"]]["ownerPlayerIndex"] = state["currentPlayerIndex"]
+            cost = BUILD_COSTS[action_type]
+        elif action_type in ("BUILD_SETTLEMENT", "BUILD_CITY"):
+            building = state["buildings"][action["intersectionIndex"]]
+            building.update(ownerPlayerIndex=state["currentPlayerIndex"], type="SETTLEMENT" if action_type == "BUILD_SETTLEMENT" else "CITY")
+            player["victoryPoints"] += 1
+            cost = BUILD_COSTS[action_type]
+        elif action_type == "BANK_TRADE_4_1":
+            cost = {action["resourceOut"]: BANK_TRADE_RATE, action["resourceIn"]: -1}
+        else:
+            state["currentPlayerIndex"] = 1 - state["currentPlayerIndex"]
+            state["diceResult"] = action["dice"]
+        for res_name, amount in cost.items():
+            player["resources"][res_name] -= amount
+
+    def random_action(state, vector):
+        """A random action that action_delta accepts for this state, or END_TURN."""
+        for _ in range(20):
+            action = dict(random.choice(ACTION_INDEX_TO_DICT))
+            try:
+                action_delta(vector, action)
+                return action
+            except ValueError:
+                continue
+        return {"actionType": "END_TURN"}
+
+    game = copy.deepcopy(pool[0])
+    game["roads"] = [{"id": i, "ownerPlayerIndex": -1} for i in range(NUM_ROADS)]
+    game["buildings"] = [{"id": i, "ownerPlayerIndex": -1, "type": "NONE"} for i in range(NUM_INTERSECTIONS)]
+    for player_info in game["players"]:
+        player_info["resources"] = {res_name: 12 for res_name in RESOURCE_ORDER}
+    vector = vectorize_state(game)
+    steps, mismatches, written, incremental_seconds, full_seconds = 2000, 0, 0, 0.0, 0.0
+    for step in range(steps):
+        action = random_action(game, vector)
+        dice = random.randint(2, 12) if action["actionType"] == "END_TURN" else None
+        take_action(game, dict(action, dice=dice))
+        t0 = time.perf_counter()
+        written += apply_action(vector, action, dice_result=dice)
+        t1 = time.perf_counter()
+        full_vector = vectorize_state(game)
+        full_seconds += time.perf_counter() - t1
+        incremental_seconds += t1 - t0
+        mismatches += int(not np.array_equal(vector, full_vector))
+        if action["actionType"] == "END_TURN": # Dice income, sent as a separate delta
+            income = {res_name: min(MAX_RESOURCES_PER_TYPE, game["players"][game["currentPlayerIndex"]]["resources"][res_name] + random.randint(0, 2))
+                      for res_name in RESOURCE_ORDER}
+            game["players"][game["currentPlayerIndex"]]["resources"] = income
+            apply_state_delta(vector, {"players": [{"index": game["currentPlayerIndex"], "resources": income}]})
+    print(f"\nIncremental apply_action over {steps} random actions: {mismatches} mismatches with vectorize_state, "
+          f"{written / steps:.1f} slots written per action")
+    print(f"apply_action {steps / incremental_seconds:.0f} actions/s vs vectorize_state {steps / full_seconds:.0f} states/s")
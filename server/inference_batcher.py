@@ -0,0 +1,276 @@
+# server/inference_batcher.py
+
+import threading
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+#  Defaults (overridable via environment in catan_ai.py)
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 2.0
+WAIT_SAMPLE_WINDOW = 2048 # Number of recent queue waits kept for percentile stats
+
+# Upper bounds of the batch size histogram buckets (last bucket catches the rest)
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+
+
+def to_model_input(model, states_np, device):
+    """
+    Turns a (N, input_size) float32 batch into what model() accepts: the array itself for
+    NumPy models (numpy_policy.NumpyPolicy), otherwise a torch tensor on `device`.
+    torch is imported here rather than at module level so NumPy-only servers never load it.
+    """
+    if getattr(model, "runs_on_numpy", False):
+        return states_np
+    import torch
+    return torch.from_numpy(states_np).to(device)
+
+
+def run_model(model, model_input):
+    """Forward pass without autograd bookkeeping. Returns (N, output_size) scores."""
+    if getattr(model, "runs_on_numpy", False):
+        return model(model_input)
+    import torch
+    with torch.no_grad():
+        return model(model_input)
+
+
+class _PendingRequest:
+    """One queued /get_action request waiting for its slot in a batch."""
+    __slots__ = ("state_vector", "available_actions", "use_exploration", "model_id",
+                 "enqueued_at", "done", "result", "model_version", "error")
+
+    def __init__(self, state_vector, available_actions, use_exploration, model_id=None):
+        self.state_vector = state_vector
+        self.available_actions = available_actions
+        self.use_exploration = use_exploration
+        self.model_id = model_id
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.model_version = None
+        self.error = None
+
+
+class InferenceBatcher:
+    """
+    Collects concurrent inference requests into a single (N, input_size) batch.
+    A background thread flushes the queue when max_batch_size requests are waiting
+    or the oldest request has waited max_wait_ms, runs one forward pass and hands
+    each waiting request the action chosen from its own row of scores.
+
+    Requests can name a model (model_id, None for the default one). A flushed batch is
+    split into one group per model id, keeping the requests of each group in arrival
+    order, and each group gets its own forward pass. model_provider(model_id) is called
+    once per group and must return a (model, version) pair, so every request in a group
+    is scored by the same model even if weights are swapped while the batch is running.
+
+    If stage_seconds (a metrics.Histogram with a "stage" label) is given, queue waits,
+    tensor creation and the forward pass (once per batch) and action selection (per
+    request) are observed on it.
+    """
+
+    def __init__(self, model_provider, device, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 stage_seconds=None):
+        self.model_provider = model_provider
+        self.device = device
+        self.stage_seconds = stage_seconds
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_seconds = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # Statistics (guarded by _stats_lock)
+        self._stats_lock = threading.Lock()
+        self._total_requests = 0
+        self._total_batches = 0
+        self._max_batch_seen = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._recent_waits_ms = deque(maxlen=WAIT_SAMPLE_WINDOW)
+        self._total_wait_ms = 0.0
+        self._full_flushes = 0
+        self._timeout_flushes = 0
+        self._forward_passes = 0
+
+    def start(self):
+        """Starts the background batching thread (idempotent)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="InferenceBatcher", daemon=True)
+        self._thread.start()
+        logging.info(f"InferenceBatcher started: MaxBatch={self.max_batch_size}, MaxWait={self.max_wait_seconds * 1000.0:.2f}ms")
+
+    def is_running(self):
+        """True while the batching thread is alive and accepting requests."""
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        """Stops the batching thread after it finishes the current batch."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def submit(self, state_vector, available_actions, use_exploration=False, timeout=None, model_id=None):
+        """
+        Queues one state vector (scored by model `model_id`) and blocks until its action has been chosen.
+        Returns (chosen action dict or None, version of the weights that scored it).
+        Raises TimeoutError if no result arrives within `timeout` seconds and
+        RuntimeError if the batch containing this request failed.
+        """
+        pending = _PendingRequest(state_vector, available_actions, use_exploration, model_id)
+        with self._cond:
+            self._queue.append(pending)
+            self._cond.notify()
+
+        if not pending.done.wait(timeout):
+            raise TimeoutError(f"Timed out after {timeout}s waiting for batched inference")
+        if pending.error is not None:
+            raise RuntimeError(f"Batched inference failed: {pending.error}")
+        return pending.result, pending.model_version
+
+    #  Worker Thread
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+            if batch:
+                self._process_batch(batch)
+
+    def _collect_batch(self):
+        """Waits for the first request, then gathers more until the batch is full or max wait expires."""
+        with self._cond:
+            while self._running and not self._queue:
+                self._cond.wait()
+            if not self._running and not self._queue:
+                return None
+
+            # The flush deadline is measured from when the oldest request entered the queue
+            deadline = self._queue[0].enqueued_at + self.max_wait_seconds
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self._running:
+                    break
+                self._cond.wait(remaining)
+
+            batch_len = min(len(self._queue), self.max_batch_size)
+            batch = [self._queue.popleft() for _ in range(batch_len)]
+
+        with self._stats_lock:
+            if batch_len >= self.max_batch_size: self._full_flushes += 1
+            else: self._timeout_flushes += 1
+        return batch
+
+    def _process_batch(self, batch):
+        flushed_at = time.perf_counter()
+        groups = {} # model_id -> requests for that model, in arrival order
+        for pending in batch:
+            groups.setdefault(pending.model_id, []).append(pending)
+        try:
+            for model_id, group in groups.items():
+                self._process_group(model_id, group)
+        finally:
+            self._record_batch(batch, flushed_at)
+            for pending in batch:
+                pending.done.set()
+
+    def _process_group(self, model_id, group):
+        """One forward pass for the requests of a batch that use the same model."""
+        group_started = time.perf_counter()
+        try:
+            states_np = np.stack([p.state_vector for p in group]).astype(np.float32, copy=False)
+            model, version = self.model_provider(model_id)
+            model_input = to_model_input(model, states_np, self.device)
+            tensor_done = time.perf_counter()
+            scores = run_model(model, model_input)
+            forward_done = time.perf_counter()
+            self._observe("tensor", tensor_done - group_started)
+            self._observe("forward", forward_done - tensor_done)
+            with self._stats_lock:
+                self._forward_passes += 1
+
+            for pending in group:
+                pending.model_version = version
+            for use_exploration in (False, True):
+                # One masked argmax per exploration setting (normally all requests share one)
+                rows = [row for row, pending in enumerate(group) if bool(pending.use_exploration) == use_exploration]
+                if not rows:
+                    continue
+                try:
+                    select_start = time.perf_counter()
+                    results = model.select_actions(scores[rows], [group[row].available_actions for row in rows],
+                                                   use_exploration=use_exploration)
+                    self._observe("select", time.perf_counter() - select_start)
+                    for row, result in zip(rows, results):
+                        group[row].result = result
+                except Exception as select_err:
+                    logging.exception("Error selecting actions for batched requests:")
+                    for row in rows:
+                        group[row].error = select_err
+        except Exception as batch_err:
+            logging.exception(f"Error during batched inference (model {model_id or 'default'}, group size {len(group)}):")
+            for pending in group:
+                pending.error = batch_err
+
+    #  Statistics
+    def _observe(self, stage, seconds):
+        if self.stage_seconds is not None:
+            self.stage_seconds.observe(seconds, stage)
+
+    def _record_batch(self, batch, flushed_at):
+        size = len(batch)
+        bucket = next((i for i, upper in enumerate(BATCH_SIZE_BUCKETS) if size <= upper), len(BATCH_SIZE_BUCKETS))
+        with self._stats_lock:
+            self._total_requests += size
+            self._total_batches += 1
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._batch_size_counts[bucket] += 1
+            for pending in batch:
+                wait_ms = (flushed_at - pending.enqueued_at) * 1000.0
+                self._recent_waits_ms.append(wait_ms)
+                self._total_wait_ms += wait_ms
+        for pending in batch:
+            self._observe("queue_wait", flushed_at - pending.enqueued_at)
+
+    def get_stats(self):
+        """Returns batch-size and queue-wait statistics as a JSON-serializable dict."""
+        with self._stats_lock:
+            waits = np.array(self._recent_waits_ms, dtype=np.float64)
+            total_requests = self._total_requests
+            total_batches = self._total_batches
+            histogram = {}
+            lower = 1
+            for upper, count in zip(BATCH_SIZE_BUCKETS, self._batch_size_counts):
+                histogram[f"{lower}-{upper}" if lower != upper else f"{upper}"] = count
+                lower = upper + 1
+            histogram[f"{lower}+"] = self._batch_size_counts[-1]
+
+            stats = {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": self.max_wait_seconds * 1000.0,
+                "totalRequests": total_requests,
+                "totalBatches": total_batches,
+                "forwardPasses": self._forward_passes, # More than totalBatches when batches mix models
+                "meanBatchSize": (total_requests / total_batches) if total_batches else 0.0,
+                "largestBatch": self._max_batch_seen,
+                "fullFlushes": self._full_flushes,
+                "timeoutFlushes": self._timeout_flushes,
+                "batchSizeHistogram": histogram,
+                "queueWaitMs": {
+                    "mean": (self._total_wait_ms / total_requests) if total_requests else 0.0,
+                    "p50": float(np.percentile(waits, 50)) if waits.size else 0.0,
+                    "p95": float(np.percentile(waits, 95)) if waits.size else 0.0,
+                    "p99": float(np.percentile(waits, 99)) if waits.size else 0.0,
+                    "max": float(waits.max()) if waits.size else 0.0,
+                },
+                "queueDepth": len(self._queue),
+            }
+        return stats
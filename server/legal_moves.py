@@ -0,0 +1,305 @@
+# server/legal_moves.py
+#
+# Server-side legal action generation. Derives the legal BUILD_ROAD, BUILD_SETTLEMENT,
+# BUILD_CITY, BANK_TRADE_4_1 and END_TURN actions of the current player straight from the
+# board, in the 201-slot index space of action_mapping, so clients may omit availableActions.
+# Follows the game client's rules (Controller.GetPossibleActions):
+#   - settlement: empty intersection with no structure on a neighbouring intersection; outside
+#     the starting phase it must touch one of the player's roads and costs wood/brick/sheep/wheat
+#   - road: empty edge with an endpoint holding the player's structure or touching the player's
+#     road; costs wood/brick. In the starting phase only roads at the settlement just placed
+#   - city: one of the player's settlements, costs 2 wheat + 3 stone
+#   - 4:1 bank trade: any resource the player holds at least 4 of, for each other resource
+#   - END_TURN: always, except in the starting phase
+# The starting phase is not part of the State JSON: it is taken to last until both players
+# have placed their two free roads (fewer than 2 * NUM_PLAYERS roads on the board), and the
+# current player is placing a road when one of their settlements has no road of theirs yet.
+#
+# Intersections and edges are held as Python int bitmasks (bit i = intersection/edge i), so
+# each rule is a few AND/OR operations over the adjacency masks of board_topology.
+#
+# Usage (from the project root):
+#   python server/legal_moves.py            # consistency check on random self-play games, actions/sec benchmark
+
+import logging
+import random
+import time
+
+import numpy as np
+
+try:
+    if __package__:
+        from .action_mapping import (ACTION_INDEX_TO_DICT, BANK_TRADE_MAPPING, BUILD_ROAD_ACTIONS_START,
+                                     BUILD_SETTLEMENT_ACTIONS_START, BUILD_CITY_ACTIONS_START, END_TURN_ACTION_INDEX,
+                                     TOTAL_ACTIONS)
+        from .game_state_encoder import (BUILD_COSTS, BANK_TRADE_RATE, BUILDING_TYPE_TO_INDEX, RESOURCE_ORDER, NUM_ROADS,
+                                         NUM_INTERSECTIONS, NUM_PLAYERS, NUM_RESOURCES, MAX_RESOURCES_PER_TYPE,
+                                         ROAD_SECTION_OFFSET, ROAD_SECTION_SIZE, FEATURES_PER_ROAD, BUILDING_SECTION_OFFSET,
+                                         BUILDING_SECTION_SIZE, FEATURES_PER_BUILDING, FEATURES_PER_BUILDING_OWNER,
+                                         PLAYER_SECTION_OFFSET, FEATURES_PER_PLAYER, GLOBAL_SECTION_OFFSET)
+        from .board_topology import (EDGE_INTERSECTIONS_LIST, ALL_INTERSECTIONS_MASK, EDGE_ENDPOINTS_MASK,
+                                     INTERSECTION_EDGES_MASK, INTERSECTION_NEIGHBOURS_MASK)
+    else:
+        from action_mapping import (ACTION_INDEX_TO_DICT, BANK_TRADE_MAPPING, BUILD_ROAD_ACTIONS_START,
+                                    BUILD_SETTLEMENT_ACTIONS_START, BUILD_CITY_ACTIONS_START, END_TURN_ACTION_INDEX,
+                                    TOTAL_ACTIONS)
+        from game_state_encoder import (BUILD_COSTS, BANK_TRADE_RATE, BUILDING_TYPE_TO_INDEX, RESOURCE_ORDER, NUM_ROADS,
+                                        NUM_INTERSECTIONS, NUM_PLAYERS, NUM_RESOURCES, MAX_RESOURCES_PER_TYPE,
+                                        ROAD_SECTION_OFFSET, ROAD_SECTION_SIZE, FEATURES_PER_ROAD, BUILDING_SECTION_OFFSET,
+                                        BUILDING_SECTION_SIZE, FEATURES_PER_BUILDING, FEATURES_PER_BUILDING_OWNER,
+                                        PLAYER_SECTION_OFFSET, FEATURES_PER_PLAYER, GLOBAL_SECTION_OFFSET)
+        from board_topology import (EDGE_INTERSECTIONS_LIST, ALL_INTERSECTIONS_MASK, EDGE_ENDPOINTS_MASK,
+                                    INTERSECTION_EDGES_MASK, INTERSECTION_NEIGHBOURS_MASK)
+except ImportError as e:
+    logging.error(f"Legal Moves Import Error: {e}")
+    raise
+
+#  Cost tables as (resource position, amount) pairs over RESOURCE_ORDER
+ROAD_COST = tuple((RESOURCE_ORDER.index(res), amount) for res, amount in BUILD_COSTS["BUILD_ROAD"].items())
+SETTLEMENT_COST = tuple((RESOURCE_ORDER.index(res), amount) for res, amount in BUILD_COSTS["BUILD_SETTLEMENT"].items())
+CITY_COST = tuple((RESOURCE_ORDER.index(res), amount) for res, amount in BUILD_COSTS["BUILD_CITY"].items())
+# Per resource given away: the action indices of trading it for each other resource
+BANK_TRADE_INDICES = [[BANK_TRADE_MAPPING[(res_out, res_in)] for res_in in RESOURCE_ORDER if res_in != res_out]
+                      for res_out in RESOURCE_ORDER]
+
+SETTLEMENT_TYPE = BUILDING_TYPE_TO_INDEX["SETTLEMENT"]
+
+
+def _bits(flags) -> int:
+    """Bool array -> int bitmask (bit i set where flags[i])."""
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+def _set_bits(mask):
+    """Positions of the set bits of an int bitmask, ascending."""
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
+
+def _union(table, mask) -> int:
+    """OR of table[i] over the set bits i of mask."""
+    result = 0
+    while mask:
+        low = mask & -mask
+        result |= table[low.bit_length() - 1]
+        mask ^= low
+    return result
+
+def _affordable(resources, cost) -> bool:
+    return all(resources[position] >= amount for position, amount in cost)
+
+
+def legal_action_indices(road_owner, building_owner, building_type, resources, current_player, starting_phase=None):
+    """
+    Sorted global action indices legal for current_player.
+
+    road_owner (NUM_ROADS,), building_owner/building_type (NUM_INTERSECTIONS,): owners -1 for
+    empty (anything outside 0..NUM_PLAYERS-1 counts as empty), types index BUILDING_TYPES.
+    resources: the current player's counts in RESOURCE_ORDER. starting_phase=None infers it
+    from the number of roads on the board (see the module notes).
+    """
+    road_owner = np.asarray(road_owner)
+    building_owner = np.asarray(building_owner)
+    player = int(current_player)
+
+    own_roads = _bits(road_owner == player)
+    empty_edges = _bits((road_owner < 0) | (road_owner >= NUM_PLAYERS))
+    occupied = _bits((building_owner >= 0) & (building_owner < NUM_PLAYERS))
+    own_buildings = _bits(building_owner == player)
+    own_settlements = _bits((building_owner == player) & (np.asarray(building_type) == SETTLEMENT_TYPE))
+    own_road_ends = _union(EDGE_ENDPOINTS_MASK, own_roads) # Intersections touched by the player's roads
+    # Distance rule: no structure on the spot or on any neighbouring spot
+    free_spots = ALL_INTERSECTIONS_MASK & ~occupied & ~_union(INTERSECTION_NEIGHBOURS_MASK, occupied)
+
+    if starting_phase is None:
+        starting_phase = bin(_bits((road_owner >= 0) & (road_owner < NUM_PLAYERS))).count("1") < 2 * NUM_PLAYERS
+    if starting_phase:
+        unconnected = own_settlements & ~own_road_ends
+        if unconnected:
+            # Placing the free road: only at the settlement just placed
+            last_settlement = unconnected.bit_length() - 1
+            edges = empty_edges & INTERSECTION_EDGES_MASK[last_settlement]
+            return [BUILD_ROAD_ACTIONS_START + e for e in _set_bits(edges)]
+        return [BUILD_SETTLEMENT_ACTIONS_START + i for i in _set_bits(free_spots)]
+
+    indices = []
+    if _affordable(resources, ROAD_COST):
+        edges = empty_edges & _union(INTERSECTION_EDGES_MASK, own_buildings | own_road_ends)
+        indices += [BUILD_ROAD_ACTIONS_START + e for e in _set_bits(edges)]
+    if _affordable(resources, SETTLEMENT_COST):
+        indices += [BUILD_SETTLEMENT_ACTIONS_START + i for i in _set_bits(free_spots & own_road_ends)]
+    if _affordable(resources, CITY_COST):
+        indices += [BUILD_CITY_ACTIONS_START + i for i in _set_bits(own_settlements)]
+    for position in range(NUM_RESOURCES):
+        if resources[position] >= BANK_TRADE_RATE:
+            indices += BANK_TRADE_INDICES[position]
+    indices.sort() # Trades are grouped by resource given, not by index
+    indices.append(END_TURN_ACTION_INDEX)
+    return indices
+
+
+#  Front ends: State JSON dicts and encoded state vectors
+def _owner(entry) -> int:
+    owner = entry.get("ownerPlayerIndex", -1)
+    return owner if type(owner) is int else -1 # Malformed owners count as empty
+
+def fields_from_state(state_data):
+    """
+    (road_owner, building_owner, building_type, resources, current_player) of a State JSON dict,
+    or None if its roads/buildings/players sections are missing or miscounted.
+    """
+    roads = state_data.get('roads') or []
+    buildings = state_data.get('buildings') or []
+    players = state_data.get('players') or []
+    current_player = state_data.get('currentPlayerIndex', 0)
+    if (len(roads) != NUM_ROADS or len(buildings) != NUM_INTERSECTIONS or len(players) != NUM_PLAYERS
+            or not isinstance(current_player, int) or not 0 <= current_player < NUM_PLAYERS):
+        return None
+    player_resources = players[current_player].get("resources") or {}
+    return ([_owner(r) for r in roads],
+            [_owner(b) for b in buildings],
+            [BUILDING_TYPE_TO_INDEX.get(b.get("type", "NONE"), 0) for b in buildings],
+            [player_resources.get(res, 0) for res in RESOURCE_ORDER],
+            current_player)
+
+def fields_from_vector(state_vector):
+    """The same fields decoded from a vectorize_state vector (resource counts decode exactly, see action_delta)."""
+    state_vector = np.asarray(state_vector)
+    roads = state_vector[ROAD_SECTION_OFFSET:ROAD_SECTION_OFFSET + ROAD_SECTION_SIZE].reshape(NUM_ROADS, FEATURES_PER_ROAD)
+    buildings = state_vector[BUILDING_SECTION_OFFSET:BUILDING_SECTION_OFFSET + BUILDING_SECTION_SIZE].reshape(NUM_INTERSECTIONS, FEATURES_PER_BUILDING)
+    current_player = int(state_vector[GLOBAL_SECTION_OFFSET + 0])
+    player_offset = PLAYER_SECTION_OFFSET + current_player * FEATURES_PER_PLAYER
+    resources = np.rint(state_vector[player_offset:player_offset + NUM_RESOURCES] * MAX_RESOURCES_PER_TYPE).astype(int).tolist()
+    return (roads.argmax(axis=1) - 1, buildings[:, :FEATURES_PER_BUILDING_OWNER].argmax(axis=1) - 1,
+            buildings[:, FEATURES_PER_BUILDING_OWNER:].argmax(axis=1), resources, current_player)
+
+def legal_actions(state_data, starting_phase=None):
+    """Legal actions of a State JSON dict as availableActions dicts (fresh copies), or None if the state is incomplete."""
+    fields = fields_from_state(state_data)
+    if fields is None:
+        return None
+    return [dict(ACTION_INDEX_TO_DICT[idx]) for idx in legal_action_indices(*fields, starting_phase=starting_phase)]
+
+def legal_actions_from_vector(state_vector, starting_phase=None):
+    """Legal actions of an encoded state (e.g. a session's delta-patched vector) as availableActions dicts."""
+    return [dict(ACTION_INDEX_TO_DICT[idx]) for idx in legal_action_indices(*fields_from_vector(state_vector), starting_phase=starting_phase)]
+
+def legal_action_mask(state_vector, starting_phase=None):
+    """Boolean (TOTAL_ACTIONS,) mask of the legal actions of an encoded state (see action_mapping.build_action_masks)."""
+    mask = np.zeros(TOTAL_ACTIONS, dtype=bool)
+    mask[legal_action_indices(*fields_from_vector(state_vector), starting_phase=starting_phase)] = True
+    return mask
+
+
+#  Consistency check and benchmark
+def _reference_indices(road_owner, building_owner, building_type, resources, player, starting_phase):
+    """Plain set-based restatement of the rules, to check the bitmask version against."""
+    neighbours = {i: set() for i in range(NUM_INTERSECTIONS)}
+    for a, b in EDGE_INTERSECTIONS_LIST:
+        neighbours[a].add(b); neighbours[b].add(a)
+    occupied = {i for i, o in enumerate(building_owner) if 0 <= o < NUM_PLAYERS}
+    own_road_ends = {x for e, o in enumerate(road_owner) if o == player for x in EDGE_INTERSECTIONS_LIST[e]}
+    free = [i for i in range(NUM_INTERSECTIONS) if i not in occupied and not (neighbours[i] & occupied)]
+    empty = [e for e, o in enumerate(road_owner) if not 0 <= o < NUM_PLAYERS]
+    own_settlements = [i for i in range(NUM_INTERSECTIONS) if building_owner[i] == player and building_type[i] == SETTLEMENT_TYPE]
+    if starting_phase:
+        unconnected = [i for i in own_settlements if i not in own_road_ends]
+        if unconnected:
+            return [BUILD_ROAD_ACTIONS_START + e for e in empty if max(unconnected) in EDGE_INTERSECTIONS_LIST[e]]
+        return [BUILD_SETTLEMENT_ACTIONS_START + i for i in free]
+    viable = own_road_ends | {i for i, o in enumerate(building_owner) if o == player}
+    indices = []
+    if resources[RESOURCE_ORDER.index("WOOD")] >= 1 and resources[RESOURCE_ORDER.index("BRICK")] >= 1:
+        indices += [BUILD_ROAD_ACTIONS_START + e for e in empty if set(EDGE_INTERSECTIONS_LIST[e]) & viable]
+    if all(resources[RESOURCE_ORDER.index(r)] >= 1 for r in ("WOOD", "BRICK", "SHEEP", "WHEAT")):
+        indices += [BUILD_SETTLEMENT_ACTIONS_START + i for i in free if i in own_road_ends]
+    if resources[RESOURCE_ORDER.index("WHEAT")] >= 2 and resources[RESOURCE_ORDER.index("STONE")] >= 3:
+        indices += [BUILD_CITY_ACTIONS_START + i for i in own_settlements]
+    indices += sorted(BANK_TRADE_MAPPING[(o, n)] for o in RESOURCE_ORDER for n in RESOURCE_ORDER
+                      if o != n and resources[RESOURCE_ORDER.index(o)] >= 4)
+    return sorted(indices) + [END_TURN_ACTION_INDEX]
+
+
+def random_game_states(num_games, max_turns=200, seed=0):
+    """
+    State JSON dicts from random self-play: both players pick uniformly from the legal actions,
+    with random dice income after every END_TURN. Used for the check and the benchmark.
+    """
+    rng = random.Random(seed)
+    states = []
+    for _ in range(num_games):
+        state = {
+            "currentPlayerIndex": 0, "diceResult": 0,
+            "hexes": [{"id": i + 1, "resource": rng.choice(RESOURCE_ORDER + ["DESERT"]), "numberToken": rng.choice([2, 3, 4, 5, 6, 8, 9, 10, 11, 12])} for i in range(19)],
+            "roads": [{"id": i, "ownerPlayerIndex": -1} for i in range(NUM_ROADS)],
+            "buildings": [{"id": i, "ownerPlayerIndex": -1, "type": "NONE"} for i in range(NUM_INTERSECTIONS)],
+            "players": [{"index": p, "resources": {res: 0 for res in RESOURCE_ORDER}, "victoryPoints": 0} for p in range(NUM_PLAYERS)],
+        }
+        for _ in range(max_turns):
+            actions = legal_actions(state)
+            state["availableActions"] = actions
+            states.append(json_copy(state))
+            action = rng.choice(actions)
+            player_idx = state["currentPlayerIndex"]
+            player = state["players"][player_idx]
+            action_type = action["actionType"]
+            starting = sum(r["ownerPlayerIndex"] >= 0 for r in state["roads"]) < 2 * NUM_PLAYERS
+            if action_type == "BUILD_ROAD":
+                state["roads"][action["edgeIndex"]]["ownerPlayerIndex"] = player_idx
+            elif action_type in ("BUILD_SETTLEMENT", "BUILD_CITY"):
+                state["buildings"][action["intersectionIndex"]].update(ownerPlayerIndex=player_idx, type=action_type[len("BUILD_"):])
+                player["victoryPoints"] += 1
+            if action_type in BUILD_COSTS and not starting:
+                for res, amount in BUILD_COSTS[action_type].items():
+                    player["resources"][res] -= amount
+            elif action_type == "BANK_TRADE_4_1":
+                player["resources"][action["resourceOut"]] -= BANK_TRADE_RATE
+                player["resources"][action["resourceIn"]] += 1
+            if action_type == "END_TURN" or (starting and action_type == "BUILD_ROAD"):
+                # Starting phase order 0, 1, 1, 0: the second player places both rounds back to back
+                roads_placed = sum(r["ownerPlayerIndex"] >= 0 for r in state["roads"])
+                if not (starting and roads_placed == NUM_PLAYERS):
+                    state["currentPlayerIndex"] = (player_idx + 1) % NUM_PLAYERS
+                state["diceResult"] = rng.randint(2, 12)
+                incoming = state["players"][state["currentPlayerIndex"]]["resources"]
+                for res in rng.sample(RESOURCE_ORDER, 2):
+                    incoming[res] = min(MAX_RESOURCES_PER_TYPE, incoming[res] + rng.randint(0, 2))
+    return states
+
+def json_copy(state):
+    return {key: ([dict(entry) for entry in value] if isinstance(value, list) else value) for key, value in state.items()}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if __package__:
+        from .game_state_encoder import vectorize_state
+    else:
+        from game_state_encoder import vectorize_state
+
+    states = random_game_states(num_games=50)
+    mismatches = 0
+    for state in states:
+        fields = fields_from_state(state)
+        starting = sum(o >= 0 for o in fields[0]) < 2 * NUM_PLAYERS
+        expected = _reference_indices(*fields, starting)
+        from_dict = legal_action_indices(*fields)
+        from_vector = legal_action_indices(*fields_from_vector(vectorize_state(state)))
+        mismatches += int(from_dict != expected or from_vector != expected)
+    sizes = [len(s["availableActions"]) for s in states]
+    print(f"\nChecked {len(states)} states from 50 random games against the reference rules: {mismatches} mismatches")
+    print(f"Legal actions per state: min {min(sizes)}, mean {np.mean(sizes):.1f}, max {max(sizes)}")
+
+    vectors = [vectorize_state(state) for state in states]
+    for label, generate, inputs in (("from State JSON", legal_actions, states),
+                                    ("from state vector", legal_actions_from_vector, vectors),
+                                    ("mask from state vector", legal_action_mask, vectors)):
+        t0 = time.perf_counter()
+        repeats = 5
+        for _ in range(repeats):
+            for item in inputs:
+                generate(item)
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<24} {repeats * len(inputs) / elapsed:>9.0f} states/s {repeats * sum(sizes) / elapsed:>10.0f} actions/s")
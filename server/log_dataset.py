@@ -0,0 +1,480 @@
+# server/log_dataset.py
+#
+# Preprocessed, memory-mapped training data. Game logs are parsed and vectorized once into
+# on-disk shards (one set of .npy arrays per ingest: state vectors, action indices, rewards,
+# game ids); training memory-maps them instead of re-reading every .jsonl file and re-running
+# vectorize_state on every turn.
+#
+# Layout: <cache dir>/<log dir name>-<hash of its absolute path>/<key>/
+#   manifest.json              log file name -> size, mtime, shard and row range, game id, parse counters
+#   shard_00000.states.npy     (rows, TOTAL_VECTOR_SIZE) float32
+#   shard_00000.actions.npy    (rows,) int64
+#   shard_00000.rewards.npy    (rows,) float32
+#   shard_00000.game_ids.npy   (rows,) int32
+# The key combines ENCODER_VERSION with anything else baked into the rows (see train_from_logs),
+# so a schema change starts a fresh directory and the old ones of the same log directory are
+# removed (caches of other log directories are left alone). Opening the dataset
+# ingests new or changed log files into one new shard, and forgets files that are no longer in the
+# log directory; shards no file refers to any more are deleted.
+#
+# Usage (from the project root):
+#   python server/log_dataset.py                       # build/update the cache for client/SelfPlayLogs, timings
+#   python server/log_dataset.py --log-dir path/to/logs --cache-dir /tmp/catan_cache
+#   python server/log_dataset.py --scaling              # parallel ingestion of 1k / 10k synthetic game logs per worker count
+
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+
+try:
+    if __package__:
+        from .game_state_encoder import vectorize_states, TOTAL_VECTOR_SIZE
+        from .action_mapping import get_action_index
+        from .log_reader import GameLogReader
+    else:
+        from game_state_encoder import vectorize_states, TOTAL_VECTOR_SIZE
+        from action_mapping import get_action_index
+        from log_reader import GameLogReader
+except ImportError as e:
+    logging.error(f"Log Dataset Import Error: {e}")
+    raise
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.environ.get("CATAN_DATASET_CACHE_DIR", os.path.join(SCRIPT_DIR, "dataset_cache"))
+# Processes that parse and vectorize log files (1: in the calling process, 0: one per CPU core)
+INGEST_WORKERS = int(os.environ.get("CATAN_INGEST_WORKERS", "1"))
+STREAM_VECTORIZE_BATCH = 64 # Turns decoded before they are vectorized together
+
+MANIFEST_NAME = "manifest.json"
+SHARD_ARRAYS = {"states": np.float32, "actions": np.int64, "rewards": np.float32, "game_ids": np.int32}
+
+
+#  Parsing (one game per log file)
+def parse_game_log(file_path, win_bonus, target_turns, max_turns):
+    """
+    Parses one game log, applies reward shaping (win bonus scaled by game length, see
+    train_from_logs) and vectorizes its turns. Runs in ingestion worker processes.
+    Turns are streamed (log_reader.GameLogReader) and vectorized in batches of
+    STREAM_VECTORIZE_BATCH, so memory does not grow with the decoded game; a corrupt or
+    truncated log keeps every turn before the corrupt point.
+
+    Returns:
+        (state_vectors, action_indices, rewards, invalid_data_points, game_processed_successfully),
+        with (n, TOTAL_VECTOR_SIZE) float32 vectors and (n,) action/reward arrays, or None if the
+        file holds no game (empty, invalid JSON or no turns).
+    """
+    file_name = os.path.basename(file_path)
+    game_processed_successfully = True
+    invalid_data_points = 0
+
+    vector_parts, game_actions, game_rewards, game_turn_indices = [], [], [], []
+    turn_players = [] # currentPlayerIndex of every turn, for the winning turn bonus
+    pending_states, pending_rows = [], []
+
+    def flush():
+        nonlocal invalid_data_points
+        state_vectors, valid = vectorize_states(pending_states, return_valid=True)
+        invalid_data_points += int((~valid).sum())
+        vector_parts.append(state_vectors[valid])
+        for row, is_valid in zip(pending_rows, valid.tolist()):
+            if is_valid:
+                game_turn_indices.append(row[0]); game_actions.append(row[1]); game_rewards.append(row[2])
+        pending_states.clear(); pending_rows.clear()
+
+    reader = GameLogReader(file_path)
+    for idx, (state, action, original_reward) in enumerate(reader):
+        turn_players.append(state.get("currentPlayerIndex") if isinstance(state, dict) else None)
+        try:
+            if state is None or action is None or original_reward is None:
+                invalid_data_points += 1
+                continue
+
+            action_idx = get_action_index(action)
+            if action_idx is None:
+                invalid_data_points += 1
+                continue
+
+            pending_states.append(state)
+            pending_rows.append((idx, action_idx, float(original_reward)))
+            if len(pending_states) >= STREAM_VECTORIZE_BATCH:
+                flush()
+
+        except Exception as turn_err:
+            logging.warning(f"Error processing turn {idx} in {file_name}: {turn_err}")
+            invalid_data_points += 1
+            game_processed_successfully = False
+            continue # Continue processing other turns if possible
+    if pending_states:
+        flush()
+
+    num_turns = reader.turns_read
+    if reader.error is not None:
+        if not num_turns:
+            logging.warning(f"Skipping invalid JSON in file: {file_name} ({reader.error})")
+            return None
+        logging.warning(f"Corrupt log {file_name}: kept the {num_turns} turns before {reader.error}")
+        game_processed_successfully = False
+    if not num_turns:
+        if reader.metadata or reader.layout is not None:
+            logging.warning(f"Skipping game with no turns in {file_name}")
+        else:
+            logging.warning(f"Skipping empty log file: {file_name}")
+        return None
+
+    # Calculate Speed Multiplier (the winner is usually recorded after the turns, so shaping runs last)
+    winner_index = reader.winner_index
+    speed_multiplier = 0.0
+    if winner_index != -1:
+        if num_turns <= target_turns: speed_multiplier = 1.0
+        elif num_turns > max_turns: speed_multiplier = 0.0
+        else: speed_multiplier = 1.0 - ((num_turns - target_turns) / float(max_turns - target_turns))
+        logging.debug(f"Game {file_name}: Winner {winner_index}, Turns {num_turns}, SpeedMultiplier {speed_multiplier:.3f}")
+
+    # Find Last Winning Turn Index
+    last_winning_turn_index = -1
+    if winner_index != -1:
+        for idx in range(num_turns - 1, -1, -1):
+            if turn_players[idx] == winner_index:
+                last_winning_turn_index = idx
+                break
+
+    rewards = np.asarray(game_rewards, dtype=np.float64)
+    if last_winning_turn_index in game_turn_indices:
+        row = game_turn_indices.index(last_winning_turn_index)
+        applied_bonus = win_bonus * speed_multiplier
+        rewards[row] += applied_bonus
+        if applied_bonus > 0: logging.debug(f"  Applied speed bonus {applied_bonus:.2f} to turn {last_winning_turn_index} (Final reward: {rewards[row]:.2f})")
+
+    state_vectors = np.concatenate(vector_parts) if vector_parts else np.zeros((0, TOTAL_VECTOR_SIZE), dtype=np.float32)
+    return (state_vectors, np.asarray(game_actions, dtype=np.int64), rewards.astype(np.float32),
+            invalid_data_points, game_processed_successfully)
+
+def _parse_safely(parse_file, file_path):
+    """(result, None), or (None, error message) if parse_file raised: one bad file never stops a pool."""
+    try:
+        return parse_file(file_path), None
+    except Exception as file_err:
+        return None, str(file_err)
+
+def parse_log_files(parse_file, file_paths, workers=1):
+    """
+    [(result, error message)] of parse_file for each path, in the order of file_paths whatever the
+    worker count. workers > 1 fans the files out to a process pool (parse_file must be picklable,
+    e.g. a functools.partial of a module-level function); each worker returns one game's compact
+    NumPy arrays rather than per-turn objects.
+    """
+    task = functools.partial(_parse_safely, parse_file)
+    workers = (os.cpu_count() or 1) if workers == 0 else workers
+    workers = max(1, min(int(workers), len(file_paths)))
+    if workers == 1:
+        return [task(path) for path in file_paths]
+    with multiprocessing.get_context().Pool(workers) as pool:
+        # Ordered map: results merge deterministically. Chunks amortize the per-task IPC overhead
+        return pool.map(task, file_paths, chunksize=max(1, len(file_paths) // (workers * 8)))
+
+
+def _shard_path(directory, shard, array_name):
+    return os.path.join(directory, f"shard_{shard:05d}.{array_name}.npy")
+
+def _save_atomic(path, array):
+    tmp_path = path + ".tmp.npy" # np.save appends .npy to other names
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path) # A crash never leaves a truncated shard under its final name
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ShardedDataset:
+    """
+    Rows of one or more memory-mapped shards, in log file name order. states stay on disk (read
+    on access); actions, rewards and game_ids are small and held in memory.
+    """
+
+    def __init__(self, shard_states, shard_of_row, row_in_shard, actions, rewards, game_ids):
+        self.shard_states = shard_states # shard number -> (rows, TOTAL_VECTOR_SIZE) memmap
+        self.shard_of_row = shard_of_row
+        self.row_in_shard = row_in_shard
+        self.actions = actions
+        self.rewards = rewards
+        self.game_ids = game_ids
+
+    @classmethod
+    def from_arrays(cls, states, actions, rewards, game_ids=None):
+        """In-memory dataset with the same interface (e.g. from train_from_logs.load_training_data)."""
+        count = len(actions)
+        states = np.asarray(states, dtype=np.float32).reshape(count, TOTAL_VECTOR_SIZE)
+        game_ids = np.zeros(count, dtype=np.int32) if game_ids is None else np.asarray(game_ids, dtype=np.int32)
+        return cls({0: states}, np.zeros(count, dtype=np.int32), np.arange(count, dtype=np.int64),
+                   np.asarray(actions, dtype=np.int64), np.asarray(rewards, dtype=np.float32), game_ids)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def gather(self, indices):
+        """(states float32 (n, TOTAL_VECTOR_SIZE), actions int64 (n,), rewards float32 (n,)) for the given rows."""
+        indices = np.asarray(indices, dtype=np.int64)
+        states = np.empty((len(indices), TOTAL_VECTOR_SIZE), dtype=np.float32)
+        shards = self.shard_of_row[indices]
+        rows = self.row_in_shard[indices]
+        for shard in np.unique(shards).tolist():
+            selected = shards == shard
+            states[selected] = self.shard_states[shard][rows[selected]]
+        return states, self.actions[indices], self.rewards[indices]
+
+
+def log_parse_counters(entries, label):
+    """Logs the games, turns and invalid data points of manifest entries, as load_training_data does for a full parse."""
+    entries = list(entries)
+    processed_games = sum(entry["processed_ok"] for entry in entries)
+    games_with_issues = sum(entry["skipped"] for entry in entries)
+    turns = sum(entry["stop"] - entry["start"] for entry in entries)
+    invalid_data_points = sum(entry["invalid_data_points"] for entry in entries)
+    logging.info(f"{label}: {len(entries)} log files, processed {processed_games} games successfully.")
+    if games_with_issues > 0: logging.warning(f"{label}: skipped or encountered issues processing {games_with_issues} game files.")
+    logging.info(f"{label}: total turns processed: {turns}. Invalid/skipped data points: {invalid_data_points}.")
+
+
+class LogDatasetCache:
+    """
+    Shard cache for one log directory. parse_file(path) returns a tuple starting with the (state
+    vectors, action indices, rewards, invalid data points, processed successfully) of one log file,
+    or None if it holds no usable game (see parse_game_log). Every log directory gets its own
+    subdirectory of cache_dir, holding one subdirectory per key; key must change whenever
+    parse_file would produce different rows. New files are parsed by `workers` processes (see
+    parse_log_files).
+    """
+
+    def __init__(self, cache_dir, key, parse_file, workers=INGEST_WORKERS):
+        self.root = cache_dir
+        self.key = key
+        self.parse_file = parse_file
+        self.workers = workers
+
+    def log_dir_root(self, log_dir):
+        """Cache subdirectory for one log directory: its name plus a hash of its absolute path."""
+        log_dir = os.path.normcase(os.path.abspath(log_dir))
+        digest = hashlib.sha1(log_dir.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.root, f"{os.path.basename(log_dir) or 'logs'}-{digest}")
+
+    def directory(self, log_dir):
+        return os.path.join(self.log_dir_root(log_dir), self.key)
+
+    def _load_manifest(self, directory, log_dir):
+        try:
+            with open(os.path.join(directory, MANIFEST_NAME), "r") as f:
+                manifest = json.load(f)
+            if manifest.get("key") == self.key:
+                return manifest
+            logging.warning(f"Dataset cache manifest in {directory} has key {manifest.get('key')!r}, rebuilding.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"Unreadable dataset cache manifest in {directory} ({e}), rebuilding.")
+        return {"key": self.key, "log_dir": os.path.abspath(log_dir), "next_shard": 0, "next_game_id": 0, "files": {}}
+
+    def _save_manifest(self, directory, manifest):
+        path = os.path.join(directory, MANIFEST_NAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def _remove_stale_keys(self, log_dir):
+        """Deletes this log directory's caches written under other keys (older encoder versions or reward settings)."""
+        root = self.log_dir_root(log_dir)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name != self.key and os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+                shutil.rmtree(path, ignore_errors=True)
+                logging.info(f"Removed dataset cache for old key {name} of {log_dir}.")
+
+    def update(self, log_dir):
+        """
+        Ingests log files that are new or changed since the last update into one new shard and drops
+        files that have left log_dir. Returns (manifest, number of files ingested).
+        """
+        directory = self.directory(log_dir)
+        os.makedirs(directory, exist_ok=True)
+        self._remove_stale_keys(log_dir)
+        manifest = self._load_manifest(directory, log_dir)
+        entries = manifest["files"]
+        log_files = sorted(f for f in os.listdir(log_dir) if f.endswith(".jsonl")) if os.path.isdir(log_dir) else []
+
+        for name in [name for name in entries if name not in log_files]:
+            del entries[name] # Moved to OldLogs (or deleted): no longer part of the training set
+        pending = []
+        for name in log_files:
+            size, mtime_ns = _file_signature(os.path.join(log_dir, name))
+            entry = entries.get(name)
+            if entry is None or entry["size"] != size or entry["mtime_ns"] != mtime_ns:
+                pending.append((name, size, mtime_ns))
+
+        if pending:
+            shard = manifest["next_shard"]
+            parts = {array_name: [] for array_name in SHARD_ARRAYS}
+            rows = 0
+            results = parse_log_files(self.parse_file, [os.path.join(log_dir, name) for name, _, _ in pending], self.workers)
+            for (name, size, mtime_ns), (parsed, error) in zip(pending, results):
+                if error is not None:
+                    logging.error(f"Error processing file {name}: {error}")
+                    parsed = None
+                game_id = manifest["next_game_id"]
+                manifest["next_game_id"] += 1
+                count = 0 if parsed is None else len(parsed[1])
+                if count:
+                    state_vectors, actions, rewards = parsed[:3]
+                    parts["states"].append(np.asarray(state_vectors, dtype=np.float32).reshape(count, TOTAL_VECTOR_SIZE))
+                    parts["actions"].append(np.asarray(actions, dtype=np.int64))
+                    parts["rewards"].append(np.asarray(rewards, dtype=np.float32))
+                    parts["game_ids"].append(np.full(count, game_id, dtype=np.int32))
+                # Files without usable turns are recorded too, so they are not re-parsed on every run
+                # The parse counters are kept so cached runs report them like a full parse
+                entries[name] = {"size": size, "mtime_ns": mtime_ns, "shard": shard if count else None,
+                                 "start": rows, "stop": rows + count, "game_id": game_id,
+                                 "invalid_data_points": 0 if parsed is None else int(parsed[3]),
+                                 "processed_ok": parsed is not None and bool(parsed[4]), "skipped": parsed is None}
+                rows += count
+            if rows:
+                for array_name, dtype in SHARD_ARRAYS.items():
+                    _save_atomic(_shard_path(directory, shard, array_name), np.concatenate(parts[array_name]).astype(dtype, copy=False))
+                manifest["next_shard"] = shard + 1
+            logging.info(f"Ingested {len(pending)} new or changed log files into dataset cache ({rows} turns).")
+            log_parse_counters([entries[name] for name, _, _ in pending], "Ingested")
+
+        self._save_manifest(directory, manifest) # After the shard arrays, so it never points at missing files
+        self._remove_unused_shards(directory, manifest)
+        return manifest, len(pending)
+
+    def _remove_unused_shards(self, directory, manifest):
+        used = {entry["shard"] for entry in manifest["files"].values()}
+        for name in os.listdir(directory):
+            if name.startswith("shard_") and int(name[len("shard_"):len("shard_") + 5]) not in used:
+                os.remove(os.path.join(directory, name))
+
+    def open(self, log_dir):
+        """Updates the cache for log_dir and returns its rows as a ShardedDataset."""
+        manifest, _ = self.update(log_dir)
+        directory = self.directory(log_dir)
+        log_parse_counters(manifest["files"].values(), "Dataset")
+        entries = [manifest["files"][name] for name in sorted(manifest["files"])]
+        entries = [entry for entry in entries if entry["shard"] is not None]
+        shard_states, shard_arrays = {}, {}
+        for shard in sorted({entry["shard"] for entry in entries}):
+            shard_states[shard] = np.load(_shard_path(directory, shard, "states"), mmap_mode="r")
+            shard_arrays[shard] = {array_name: np.load(_shard_path(directory, shard, array_name), mmap_mode="r")
+                                   for array_name in ("actions", "rewards", "game_ids")}
+
+        shard_of_row = [np.full(entry["stop"] - entry["start"], entry["shard"], dtype=np.int32) for entry in entries]
+        row_in_shard = [np.arange(entry["start"], entry["stop"], dtype=np.int64) for entry in entries]
+        columns = {array_name: [np.asarray(shard_arrays[entry["shard"]][array_name][entry["start"]:entry["stop"]]) for entry in entries]
+                   for array_name in ("actions", "rewards", "game_ids")}
+
+        def joined(parts, dtype):
+            return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+
+        return ShardedDataset(shard_states, joined(shard_of_row, np.int32), joined(row_in_shard, np.int64),
+                              joined(columns["actions"], np.int64), joined(columns["rewards"], np.float32),
+                              joined(columns["game_ids"], np.int32))
+
+
+#  Benchmarks
+def write_synthetic_logs(log_dir, num_games, turns_per_game=20, distinct_games=50, seed=0):
+    """
+    Writes num_games self-play style logs (random legal play from legal_moves.py). Only
+    distinct_games games are simulated; the other files repeat their contents, which costs the
+    parser exactly as much as new games.
+    """
+    if __package__:
+        from .legal_moves import random_game_states
+    else:
+        from legal_moves import random_game_states
+
+    rng = np.random.default_rng(seed)
+    states = random_game_states(distinct_games, max_turns=turns_per_game, seed=seed)
+    records = []
+    for g in range(distinct_games):
+        game_states = states[g * turns_per_game:(g + 1) * turns_per_game]
+        turns = [{"state": state, "action": state["availableActions"][0], "reward": float(rng.uniform(-1, 1))} for state in game_states]
+        records.append(json.dumps({"winnerPlayerIndex": int(rng.integers(-1, 2)), "turns": turns}) + "\n")
+    os.makedirs(log_dir, exist_ok=True)
+    for i in range(num_games):
+        with open(os.path.join(log_dir, f"game_{i:06d}.jsonl"), "w") as f:
+            f.write(records[i % distinct_games])
+
+def ingest_scaling(parse_file, log_dir, worker_counts):
+    """Times parse_log_files over every log in log_dir per worker count; checks the merged rows are identical."""
+    paths = sorted(os.path.join(log_dir, f) for f in os.listdir(log_dir) if f.endswith(".jsonl"))
+    timings, reference = [], None
+    for workers in worker_counts:
+        t0 = time.perf_counter()
+        results = parse_log_files(parse_file, paths, workers)
+        seconds = time.perf_counter() - t0
+        merged = np.concatenate([parsed[0] for parsed, _ in results if parsed is not None])
+        reference = merged if reference is None else reference
+        timings.append((workers, seconds, len(merged), np.array_equal(merged, reference)))
+    return len(paths), timings
+
+
+def main():
+    import argparse
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if __package__:
+        from .train_from_logs import LOG_DIR, load_training_data, open_log_dataset, log_parser
+    else:
+        from train_from_logs import LOG_DIR, load_training_data, open_log_dataset, log_parser
+
+    parser = argparse.ArgumentParser(description="Build or update the preprocessed training data cache and time it.")
+    parser.add_argument("--log-dir", default=LOG_DIR, help="Directory of self-play .jsonl logs")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--scaling", action="store_true", help="Instead: time parallel ingestion of synthetic logs per worker count")
+    parser.add_argument("--games", type=int, nargs="+", default=[1000, 10000], help="Synthetic log counts for --scaling")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per synthetic game for --scaling")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts for --scaling (default: 1, 2, 4, ... up to the CPU count)")
+    args = parser.parse_args()
+
+    if args.scaling:
+        cpus = os.cpu_count() or 1
+        worker_counts = args.workers or sorted({1, cpus} | {2 ** k for k in range(1, 8) if 2 ** k < cpus})
+        print(f"\nParallel log ingestion (parse + reward shaping + vectorize), {cpus} CPU cores, {args.turns} turns per game:")
+        print(f"{'games':>7} {'workers':>8} {'seconds':>9} {'games/s':>9} {'speedup':>8} {'same rows':>10}")
+        for num_games in args.games:
+            with tempfile.TemporaryDirectory() as log_dir:
+                write_synthetic_logs(log_dir, num_games, args.turns)
+                _, timings = ingest_scaling(log_parser(), log_dir, worker_counts)
+            for workers, seconds, rows, same in timings:
+                print(f"{num_games:>7} {workers:>8} {seconds:>9.2f} {num_games / seconds:>9.0f} {timings[0][1] / seconds:>7.2f}x {str(same):>10}")
+        return
+
+    t0 = time.perf_counter()
+    states, _, _ = load_training_data(args.log_dir)
+    parse_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    dataset = open_log_dataset(args.log_dir, args.cache_dir)
+    update_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    dataset = open_log_dataset(args.log_dir, args.cache_dir)
+    open_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for start in range(0, len(dataset), 256):
+        dataset.gather(np.arange(start, min(start + 256, len(dataset))))
+    read_seconds = time.perf_counter() - t0
+
+    print(f"\n{len(states)} turns from {args.log_dir}")
+    print(f"parse + vectorize all logs (load_training_data): {parse_seconds:8.3f} s")
+    print(f"update cache (ingest new/changed logs):          {update_seconds:8.3f} s")
+    print(f"open cache (no new logs):                        {open_seconds:8.3f} s")
+    print(f"read every row from the memory-mapped shards:    {read_seconds:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# server/log_reader.py
+#
+# Streaming reader for game logs. The Unity client writes a whole game as one JSON object on
+# one line ({"winnerPlayerIndex": ..., "turns": [{"state": ..., "action": ..., "reward": ...}, ...]}),
+# hundreds of full board snapshots long. GameLogReader decodes the "turns" array one element at a
+# time from a bounded text buffer, so memory stays at a few turns whatever the game length, and a
+# corrupt or truncated tail only loses the turns after the corrupt point.
+#
+# Two layouts are read:
+#   - record: one object holding a "turns" array (the client's format); other keys are metadata
+#   - lines:  one turn object per line ({"state", "action", "reward"}), plus an optional metadata
+#             line such as {"winnerPlayerIndex": 1} anywhere (usually last, once the game ends)
+#
+# Usage (from the project root):
+#   python server/log_reader.py                 # peak memory and speed vs json.loads, salvage of a truncated log
+
+import json
+import logging
+import re
+
+READ_CHUNK_CHARS = 1 << 16
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+class GameLogReader:
+    """
+    Iterates over the turns of one game log as (state, action, reward) tuples (None for missing
+    fields). After iteration: metadata holds the top-level non-turn fields (winner_index reads
+    "winnerPlayerIndex"), turns_read the number of turns yielded, layout "record" or "lines", and
+    error None, or a description of the corrupt point where reading stopped.
+    """
+
+    def __init__(self, file_path, chunk_chars=READ_CHUNK_CHARS):
+        self.file_path = file_path
+        self.chunk_chars = chunk_chars
+        self.metadata = {}
+        self.turns_read = 0
+        self.layout = None
+        self.error = None
+
+    @property
+    def winner_index(self):
+        return self.metadata.get("winnerPlayerIndex", -1)
+
+    def __iter__(self):
+        self.metadata, self.turns_read, self.layout, self.error = {}, 0, None, None
+        with open(self.file_path, "r") as f:
+            self._file, self._buf, self._pos, self._consumed, self._eof = f, "", 0, 0, False
+            try:
+                yield from self._top_level()
+            except ValueError as decode_err: # json.JSONDecodeError is a ValueError
+                message = getattr(decode_err, "msg", str(decode_err)) # Without the buffer-relative position
+                self.error = f"offset {self._consumed + self._pos} after {self.turns_read} turns: {message}"
+            finally:
+                self._file = self._buf = None
+
+    #  Scanner over a sliding buffer
+    def _fill(self):
+        """Appends the next chunk (at least doubling a large pending value); False at end of file."""
+        if self._eof:
+            return False
+        chunk = self._file.read(max(self.chunk_chars, len(self._buf) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._consumed += self._pos
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Next non-whitespace character, not consumed ('' at end of file)."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r}, found {char or 'end of file'!r}")
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """Decodes the next complete JSON value, reading more of the file while it is cut off by the buffer end."""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof: # A number at the buffer end may continue in the next chunk
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def _keys(self):
+        """Yields the keys of the object whose '{' was just consumed; the caller consumes each value."""
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            if not isinstance(key, str):
+                raise ValueError(f"expected an object key, found {key!r}")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    #  Layouts
+    def _top_level(self):
+        while self._peek():
+            self._expect("{")
+            fields = {}
+            for key in self._keys():
+                if key == "turns" and self._peek() == "[":
+                    self.layout = "record"
+                    yield from self._turn_array()
+                else:
+                    fields[key] = self._value()
+            if "state" in fields or "action" in fields:
+                self.layout = self.layout or "lines"
+                self.turns_read += 1
+                yield _turn_fields(fields)
+            else:
+                self.metadata.update(fields)
+
+    def _turn_array(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            turn = self._value()
+            self.turns_read += 1
+            yield _turn_fields(turn)
+            if self._expect(",]") == "]":
+                return
+
+
+def _turn_fields(turn):
+    if not isinstance(turn, dict):
+        return None, None, None
+    return turn.get("state"), turn.get("action"), turn.get("reward")
+
+
+def write_turn_lines(file_path, turns, metadata=None):
+    """Writes a game in the one-turn-per-line layout (turns: dicts with state/action/reward; metadata on the last line)."""
+    with open(file_path, "w") as f:
+        for turn in turns:
+            f.write(json.dumps(turn) + "\n")
+        if metadata:
+            f.write(json.dumps(metadata) + "\n")
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+    import tracemalloc
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if __package__:
+        from .legal_moves import random_game_states
+    else:
+        from legal_moves import random_game_states
+
+    def peak_mb(read):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        count = read()
+        seconds = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        return count, seconds, peak
+
+    def whole_record(path):
+        with open(path, "r") as f:
+            return len(json.loads(f.readline())["turns"])
+
+    def streamed(path):
+        return sum(1 for _ in GameLogReader(path))
+
+    print(f"\n{'game':<26} {'size MB':>8} {'json.loads peak MB':>19} {'stream peak MB':>15} {'json.loads s':>13} {'stream s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_turns in (100, 400, 1000):
+            states = random_game_states(1, max_turns=num_turns, seed=num_turns)
+            turns = [{"state": s, "action": s["availableActions"][0], "reward": 0.0} for s in states]
+            record_path = os.path.join(tmp, f"game_{num_turns}.jsonl")
+            with open(record_path, "w") as f:
+                f.write(json.dumps({"winnerPlayerIndex": 0, "turns": turns}) + "\n")
+            lines_path = os.path.join(tmp, f"game_{num_turns}_lines.jsonl")
+            write_turn_lines(lines_path, turns, {"winnerPlayerIndex": 0})
+            _, loads_seconds, loads_peak = peak_mb(lambda: whole_record(record_path))
+            _, stream_seconds, stream_peak = peak_mb(lambda: streamed(record_path))
+            _, lines_seconds, lines_peak = peak_mb(lambda: streamed(lines_path))
+            size_mb = os.path.getsize(record_path) / 2**20
+            print(f"{f'{num_turns} turns, record':<26} {size_mb:>8.1f} {loads_peak:>19.1f} {stream_peak:>15.1f} {loads_seconds:>13.3f} {stream_seconds:>9.3f}")
+            print(f"{f'{num_turns} turns, one per line':<26} {size_mb:>8.1f} {'':>19} {lines_peak:>15.1f} {'':>13} {lines_seconds:>9.3f}")
+
+        # Salvage: cut the 1000-turn record in the middle of a turn
+        with open(record_path, "r") as f:
+            text = f.read()
+        cut_path = os.path.join(tmp, "truncated.jsonl")
+        with open(cut_path, "w") as f:
+            f.write(text[:len(text) * 2 // 3])
+        reader = GameLogReader(cut_path)
+        salvaged = sum(1 for _ in reader)
+        try:
+            whole_record(cut_path)
+            loads_turns = "all"
+        except json.JSONDecodeError:
+            loads_turns = 0
+        print(f"\nLog cut at 2/3 of its length: json.loads recovers {loads_turns} turns, the stream {salvaged} of {num_turns}")
+        print(f"  stopped at {reader.error}")
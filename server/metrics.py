@@ -0,0 +1,194 @@
+# server/metrics.py
+#
+# Minimal in-process metrics with Prometheus text exposition output (format 0.0.4),
+# so a local Prometheus-compatible scraper can read GET /metrics without extra
+# dependencies. Every update is one lock acquire plus a dict lookup (histograms add a
+# bisect over the bucket bounds), which is cheap enough to leave on during bulktrain runs.
+
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds: 50us .. 5s
+DEFAULT_LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {} # label values tuple -> value (or bucket state for histograms)
+
+    def _check_labels(self, label_values):
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {label_values}")
+        return label_values
+
+    def _label_text(self, label_values, extra=()):
+        pairs = list(zip(self.label_names, label_values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f"{self.name}{self._label_text(labels)} {_format_value(value)}" for labels, value in items]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels."""
+    metric_type = "counter"
+
+    def inc(self, *label_values, amount=1):
+        key = self._check_labels(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, *label_values):
+        return self._values.get(label_values, 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (e.g. requests currently in flight)."""
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        if not self.label_names:
+            self._values[()] = 0
+
+    def inc(self, *label_values, amount=1):
+        key = self._check_labels(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        key = self._check_labels(label_values)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, *label_values):
+        return self._values.get(label_values, 0)
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values (seconds for latencies) over fixed buckets.
+    Bucket counts are kept non-cumulative and only summed up when rendered.
+    """
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        key = self._check_labels(label_values)
+        bucket = bisect.bisect_left(self.buckets, value) # Index of the first bound >= value
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0] # bucket counts, sum, count
+            state[0][bucket] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *label_values):
+        """Context manager that observes the time spent inside the with-block."""
+        return _HistogramTimer(self, label_values)
+
+    def _render_samples(self, items):
+        lines = []
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._label_text(labels, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them all in the Prometheus text format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Overhead check: cost of one timed histogram observation
+if __name__ == "__main__":
+    registry = MetricsRegistry()
+    stage_seconds = registry.histogram("demo_stage_seconds", "Demo stage latency.", ["stage"])
+    requests_total = registry.counter("demo_requests_total", "Demo requests.", ["action_type"])
+
+    iterations = 200_000
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        with stage_seconds.time("forward"):
+            pass
+        requests_total.inc("END_TURN")
+    elapsed = time.perf_counter() - t0
+    print(f"{elapsed / iterations * 1e6:.2f} us per timed observation + counter increment")
+    print(registry.render())
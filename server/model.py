@@ -5,14 +5,15 @@ import torch.nn as nn
 import torch.nn.functional as F
 import logging
 import random
+import numpy as np
 # Need action mapping for predict_action
 try:
     # Adjust relative imports if running directly vs as part of a package
     if __package__:
-        from .action_mapping import get_action_index, TOTAL_ACTIONS
+        from .action_mapping import get_action_index, build_action_masks, TOTAL_ACTIONS
         from .game_state_encoder import TOTAL_VECTOR_SIZE # Import constant
     else:
-        from action_mapping import get_action_index, TOTAL_ACTIONS
+        from action_mapping import get_action_index, build_action_masks, TOTAL_ACTIONS
         from game_state_encoder import TOTAL_VECTOR_SIZE
 except ImportError as e:
      # Fallback if direct run or structure issues
@@ -20,6 +21,12 @@ except ImportError as e:
      TOTAL_VECTOR_SIZE = 687
      TOTAL_ACTIONS = 201
      def get_action_index(action_dict): return None # Placeholder
+     def build_action_masks(available_actions_lists, num_actions=TOTAL_ACTIONS): # Placeholder: nothing is mappable
+         return np.zeros((len(available_actions_lists), num_actions), dtype=bool), [{} for _ in available_actions_lists]
+
+
+# Epsilon-greedy exploration (percent as decimal): chance to take a random action (explore)
+DEFAULT_EPSILON = 0.15
 
 
 #  Define the Neural Network 
@@ -45,7 +52,7 @@ class CatanSimpleMLP(nn.Module):
         self.dropout = nn.Dropout(p=self.dropout_prob)
 
         # Epsilon-greedy exploration (percent as decimal)
-        self.epsilon = 0.15 # Percentage chance to take a random action (explore)
+        self.epsilon = DEFAULT_EPSILON # Percentage chance to take a random action (explore)
 
         logging.info(
             f"Initialized CatanSimpleMLP: Input={input_size}, "
@@ -89,42 +96,92 @@ class CatanSimpleMLP(nn.Module):
 
             model_output = self.forward(state_tensor) # Uses the updated forward pass
 
+            return self.select_action(model_output.squeeze(0), available_actions, use_exploration)
+
+    def predict_actions(self, states, masks, epsilon=None, generator=None):
+        """
+        Batched, reproducible epsilon-greedy: scores all states in one forward pass and returns
+        a LongTensor of chosen action indices, one per row (-1 for rows with an empty mask).
+        masks is a bool (N, output_size) array/tensor of legal actions (action_mapping.build_action_masks).
+        All randomness comes from `generator` (see make_generator / draw_exploration), so a
+        generator seeded per game makes the game's choices exactly replayable.
+        """
+        with torch.no_grad():
+            scores = self.forward(states)
+        masks = torch.as_tensor(masks, dtype=torch.bool)
+        explored = self.draw_exploration(masks, epsilon, generator).to(scores.device)
+        masks = masks.to(scores.device)
+        greedy = scores.masked_fill(~masks, float("-inf")).argmax(dim=1)
+        chosen = torch.where(explored >= 0, explored, greedy)
+        return torch.where(masks.any(dim=1), chosen, torch.full_like(chosen, -1))
+
+    @staticmethod
+    def make_generator(seed):
+        """Seeded random source for predict_actions / draw_exploration (CPU torch.Generator)."""
+        return torch.Generator().manual_seed(int(seed))
+
+    def draw_exploration(self, masks, epsilon=None, generator=None):
+        """
+        The exploration half of predict_actions: for each row, explores with probability epsilon
+        (self.epsilon if None) and then picks a uniformly random legal action. Returns a CPU
+        LongTensor with the explored action index per row, or -1 for rows left to the greedy choice.
+        Every call draws N + N * output_size uniforms from generator (global torch RNG if None),
+        whatever the outcome, so a seeded stream stays aligned with the decisions.
+        """
+        masks = torch.as_tensor(masks, dtype=torch.bool).cpu()
+        epsilon = self.epsilon if epsilon is None else epsilon
+        explore = torch.rand(masks.shape[0], generator=generator) < epsilon
+        random_keys = torch.rand(masks.shape, generator=generator).masked_fill(~masks, -1.0)
+        random_choice = random_keys.argmax(dim=1) # Uniform over the legal actions of each row
+        return torch.where(explore & masks.any(dim=1), random_choice, torch.full_like(random_choice, -1))
+
+    def select_action(self, scores, available_actions, use_exploration=True):
+        """
+        Picks an action from available_actions given one row of model scores (shape [output_size]).
+        Split out of predict_action so batched inference can score many states in one
+        forward pass and then choose per row.
+        """
+        return self.select_actions(scores.unsqueeze(0), [available_actions], use_exploration)[0]
+
+    def select_actions(self, scores, available_actions_lists, use_exploration=True):
+        """
+        Batched select_action: picks one action per row of scores (shape [N, output_size]).
+        Each row explores with probability epsilon (random choice from its list); all other rows
+        are decided by one masked argmax over the batch, with masks from action_mapping.build_action_masks.
+        """
+        chosen_actions = [None] * len(available_actions_lists)
+        greedy_rows = []
+        for row, available_actions in enumerate(available_actions_lists):
             if not available_actions:
                 logging.warning("predict_action called with no available actions.")
-                return None
+                continue
 
             #  Exploration
             if use_exploration and random.random() < self.epsilon:
-                random_action = random.choice(available_actions)
-                return random_action
-
-            #  Otherwise pick best-scoring available action 
-            best_score = -float('inf')
-            chosen_action = None
-            scores = model_output.squeeze(0) # Remove batch dimension
-
-            available_indices = []
-            action_map = {}
-            for action_dict in available_actions:
-                action_idx = get_action_index(action_dict)
-                if action_idx is not None and 0 <= action_idx < self.output_size:
-                     available_indices.append(action_idx)
-                     action_map[action_idx] = action_dict # Map index back to dict
-
-            if not available_indices:
-                 logging.error("No available actions could be mapped to valid indices!")
-                 end_turn_action = next((a for a in available_actions if a.get("actionType") == "END_TURN"), None)
-                 return end_turn_action # Return END_TURN if found, else None
-
-            # Efficiently find best score among available actions using tensor operations
-            available_scores = scores[available_indices] # Get scores only for available actions
-            best_local_idx = torch.argmax(available_scores).item() # Index within available_scores
-            best_global_idx = available_indices[best_local_idx] # Map back to global action index
-            chosen_action = action_map[best_global_idx]
-            # best_score = available_scores[best_local_idx].item()
-
-            # logging.debug(f"Chosen action: {chosen_action} with score {best_score:.4f}")
-            return chosen_action
+                chosen_actions[row] = random.choice(available_actions)
+            else:
+                greedy_rows.append(row)
+        if not greedy_rows:
+            return chosen_actions
+
+        #  Otherwise pick best-scoring available action: scores outside the mask become -inf
+        mask, lookups = build_action_masks([available_actions_lists[row] for row in greedy_rows], self.output_size)
+        greedy_scores = scores[greedy_rows] if len(greedy_rows) < scores.shape[0] else scores
+        if greedy_scores.device.type == "cpu":
+            # NumPy view of the scores: far less per-call overhead than torch ops at small batch sizes
+            best_indices = np.where(mask, greedy_scores.detach().numpy(), -np.inf).argmax(axis=1).tolist()
+        else:
+            mask_tensor = torch.from_numpy(mask).to(greedy_scores.device)
+            best_indices = greedy_scores.masked_fill(~mask_tensor, float("-inf")).argmax(dim=1).tolist()
+
+        for row, lookup, best_global_idx in zip(greedy_rows, lookups, best_indices):
+            if lookup:
+                chosen_actions[row] = lookup[best_global_idx] # Map back to the action dict
+            else:
+                logging.error("No available actions could be mapped to valid indices!")
+                # Return END_TURN if found, else None
+                chosen_actions[row] = next((a for a in available_actions_lists[row] if a.get("actionType") == "END_TURN"), None)
+        return chosen_actions
 
 
 #  Example Usage (for testing this file directly) 
@@ -171,4 +228,48 @@ if __name__ == "__main__":
         print(f"Predicted action (no exploration): {chosen}")
 
         chosen_explore = model.predict_action(dummy_input, test_actions, use_exploration=True)
-        print(f"Predicted action (with exploration): {chosen_explore}")
\ No newline at end of file
+        print(f"Predicted action (with exploration): {chosen_explore}")
+
+
+    # Benchmark: masked argmax (select_actions) vs the per-dict get_action_index loop it replaced
+    import time
+    if __package__:
+        from .action_mapping import ACTION_INDEX_TO_DICT, NUM_ROADS, BUILD_SETTLEMENT_ACTIONS_START, NUM_INTERSECTIONS
+    else:
+        from action_mapping import ACTION_INDEX_TO_DICT, NUM_ROADS, BUILD_SETTLEMENT_ACTIONS_START, NUM_INTERSECTIONS
+    logging.disable(logging.WARNING)
+
+    def select_with_loop(scores, available_actions):
+        available_indices, action_map = [], {}
+        for action_dict in available_actions:
+            action_idx = get_action_index(action_dict)
+            if action_idx is not None and 0 <= action_idx < model.output_size:
+                available_indices.append(action_idx)
+                action_map[action_idx] = action_dict
+        return action_map[available_indices[torch.argmax(scores[available_indices]).item()]]
+
+    rng = random.Random(0)
+    settlements = [dict(a) for a in ACTION_INDEX_TO_DICT[BUILD_SETTLEMENT_ACTIONS_START:BUILD_SETTLEMENT_ACTIONS_START + NUM_INTERSECTIONS]]
+    roads = [dict(a) for a in ACTION_INDEX_TO_DICT[:NUM_ROADS]]
+    trades_and_cities = [dict(a) for a in ACTION_INDEX_TO_DICT[NUM_ROADS + NUM_INTERSECTIONS:-1]]
+    scenarios = {
+        "opening settlement (~50 spots)": lambda: rng.sample(settlements, 50),
+        "opening road (3)": lambda: rng.sample(roads, 3),
+        "mid-game (12)": lambda: rng.sample(roads, 6) + rng.sample(trades_and_cities, 5) + [{"actionType": "END_TURN"}],
+        "late game (30)": lambda: rng.sample(roads, 12) + rng.sample(settlements, 4) + rng.sample(trades_and_cities, 13) + [{"actionType": "END_TURN"}],
+    }
+    print(f"\n{'actions':<32} {'batch':>6} {'loop us/state':>14} {'mask us/state':>14} {'speedup':>8}")
+    for label, make_actions in scenarios.items():
+        for batch_size in (1, 256):
+            lists = [make_actions() for _ in range(batch_size)]
+            scores = torch.randn(batch_size, TOTAL_ACTIONS)
+            assert [select_with_loop(scores[row], lists[row]) for row in range(batch_size)] == model.select_actions(scores, lists, use_exploration=False)
+            timings = []
+            for select in (lambda: [select_with_loop(scores[row], lists[row]) for row in range(batch_size)],
+                           lambda: model.select_actions(scores, lists, use_exploration=False)):
+                repeats = max(1, 2000 // batch_size)
+                t0 = time.perf_counter()
+                for _ in range(repeats):
+                    select()
+                timings.append((time.perf_counter() - t0) / (repeats * batch_size) * 1e6)
+            print(f"{label:<32} {batch_size:>6} {timings[0]:>14.1f} {timings[1]:>14.1f} {timings[0] / timings[1]:>7.1f}x")
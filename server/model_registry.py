@@ -0,0 +1,195 @@
+# server/model_registry.py
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    if __package__:
+        from .model_store import ModelStore
+    else:
+        from model_store import ModelStore
+except ImportError as e:
+    logging.error(f"Model Registry Import Error: {e}")
+    raise
+
+#  Defaults (overridable via environment in catan_ai.py)
+DEFAULT_MODEL_ID = "default"
+DEFAULT_MAX_RESIDENT_MODELS = 4
+MODEL_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$") # Checkpoint file names only, no paths
+
+
+class UnknownModelError(LookupError):
+    """Raised for a model id that is malformed or has no checkpoint file."""
+
+
+def model_memory_bytes(model):
+    """
+    Approximate memory held by a model's weights: NumPy arrays for numpy_policy.NumpyPolicy,
+    otherwise the tensors of its state dict (parameters and buffers).
+    Returns None if nothing can be measured (e.g. packed quantized weights inside a TorchScript graph).
+    """
+    if getattr(model, "runs_on_numpy", False):
+        return sum(a.nbytes for a in model.weights + model.biases)
+    try:
+        tensors = [t for t in model.state_dict().values() if hasattr(t, "element_size")]
+    except Exception:
+        return None
+    total = sum(t.numel() * t.element_size() for t in tensors)
+    return total or None
+
+
+class _ResidentModel:
+    """One loaded checkpoint in the registry."""
+    __slots__ = ("model_id", "store", "memory_bytes", "loaded_at", "last_used", "requests")
+
+    def __init__(self, model_id, store, memory_bytes):
+        self.model_id = model_id
+        self.store = store
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.requests = 0
+
+
+class ModelRegistry:
+    """
+    Routes inference to one of several models by model id.
+
+    The default model (model id None or DEFAULT_MODEL_ID) is the server's hot-reloaded
+    ModelStore. Any other id names a checkpoint file <checkpoint_dir>/<model_id><extension>
+    (e.g. "settlerbot_3" -> server/iterations/settlerbot_3.pth), loaded on first use with the
+    same factory/loader as the default model. At most max_models checkpoints stay resident;
+    the least recently used one is dropped when another has to be loaded. Checkpoints are
+    treated as immutable: a resident one is not reloaded if its file changes.
+
+    get(model_id) returns a (model, version) snapshot like ModelStore.get(), so it can be
+    used directly as the InferenceBatcher's model_provider.
+    """
+
+    def __init__(self, default_store, checkpoint_dir, device, model_factory, loader=None, extension=".pth",
+                 max_models=DEFAULT_MAX_RESIDENT_MODELS):
+        self.default_store = default_store
+        self.checkpoint_dir = checkpoint_dir
+        self.device = device
+        self.model_factory = model_factory
+        self.loader = loader
+        self.extension = extension
+        self.max_models = max(1, int(max_models))
+
+        self._resident = OrderedDict() # model_id -> _ResidentModel, least recently used first
+        self._lock = threading.Lock() # Guards _resident and the counters (held only briefly)
+        self._load_lock = threading.Lock() # Serializes checkpoint loads so each id is loaded once
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.failed_loads = 0
+
+    @staticmethod
+    def is_default(model_id):
+        return model_id is None or model_id == DEFAULT_MODEL_ID
+
+    def checkpoint_path(self, model_id):
+        """Path of the checkpoint file for model_id. Raises UnknownModelError for malformed ids."""
+        if not isinstance(model_id, str) or not MODEL_ID_PATTERN.match(model_id) or model_id.startswith("."):
+            raise UnknownModelError(f"Invalid model id {model_id!r}")
+        return os.path.join(self.checkpoint_dir, model_id + self.extension)
+
+    #  Readers
+    def get(self, model_id=None):
+        """
+        Returns the (model, version) snapshot for model_id, loading the checkpoint if it is not resident.
+        Raises UnknownModelError if there is no such checkpoint or it cannot be loaded.
+        """
+        if self.is_default(model_id):
+            return self.default_store.get()
+
+        with self._lock:
+            entry = self._resident.get(model_id)
+            if entry is not None:
+                self._touch(entry)
+                self.hits += 1
+                return entry.store.get()
+
+        with self._load_lock:
+            with self._lock:
+                entry = self._resident.get(model_id) # Loaded by another thread while we waited
+                if entry is not None:
+                    self._touch(entry)
+                    self.hits += 1
+                    return entry.store.get()
+            entry = self._load(model_id)
+            with self._lock:
+                self._resident[model_id] = entry
+                self._touch(entry)
+                self.loads += 1
+                while len(self._resident) > self.max_models:
+                    evicted_id, _ = self._resident.popitem(last=False)
+                    self.evictions += 1
+                    logging.info(f"Model {evicted_id} evicted from the model cache.")
+            return entry.store.get()
+
+    def _touch(self, entry):
+        entry.last_used = time.time()
+        entry.requests += 1
+        self._resident.move_to_end(entry.model_id)
+
+    def _load(self, model_id):
+        path = self.checkpoint_path(model_id)
+        if not os.path.isfile(path):
+            with self._lock:
+                self.failed_loads += 1
+            raise UnknownModelError(f"No checkpoint for model {model_id!r} ({path})")
+        store = ModelStore(path, self.device, self.model_factory, loader=self.loader)
+        if not store.reload(force=True):
+            with self._lock:
+                self.failed_loads += 1
+            raise UnknownModelError(f"Could not load model {model_id!r}: {store.last_error}")
+        logging.info(f"Loaded model {model_id} from {path} (version {store.version}).")
+        return _ResidentModel(model_id, store, model_memory_bytes(store.model))
+
+    def available_models(self):
+        """Model ids with a checkpoint file in checkpoint_dir, sorted."""
+        try:
+            names = os.listdir(self.checkpoint_dir)
+        except OSError:
+            return []
+        ids = [name[:-len(self.extension)] for name in names if name.endswith(self.extension)]
+        return sorted(i for i in ids if MODEL_ID_PATTERN.match(i))
+
+    def get_stats(self):
+        """Reports resident checkpoints with their memory use, plus cache counters, as a JSON-serializable dict."""
+        now = time.time()
+        default_model, default_version = self.default_store.get()
+        with self._lock:
+            resident = [{
+                "modelId": entry.model_id,
+                "version": entry.store.version,
+                "path": entry.store.weights_path,
+                "memoryBytes": entry.memory_bytes,
+                "requests": entry.requests,
+                "idleSeconds": round(now - entry.last_used, 3),
+                "loadedSecondsAgo": round(now - entry.loaded_at, 3),
+            } for entry in reversed(self._resident.values())] # Most recently used first
+            stats = {
+                "defaultModel": {
+                    "modelId": DEFAULT_MODEL_ID,
+                    "version": default_version,
+                    "path": self.default_store.weights_path,
+                    "memoryBytes": model_memory_bytes(default_model) if default_model is not None else None,
+                },
+                "maxResidentModels": self.max_models,
+                "resident": resident,
+                "residentMemoryBytes": sum(entry["memoryBytes"] or 0 for entry in resident),
+                "checkpointDir": self.checkpoint_dir,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "failedLoads": self.failed_loads,
+            }
+        stats["available"] = self.available_models()
+        return stats
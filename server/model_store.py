@@ -0,0 +1,152 @@
+# server/model_store.py
+
+import hashlib
+import io
+import logging
+import os
+import threading
+
+UNTRAINED_VERSION = "untrained"
+
+
+def weights_version(weights_bytes):
+    """Short content hash identifying a set of weights (same bytes -> same version)."""
+    return hashlib.sha256(weights_bytes).hexdigest()[:12]
+
+
+class ModelStore:
+    """
+    Holds the active model together with the version of the weights it was loaded from.
+
+    The (model, version) pair is published as one tuple and replaced with a single
+    reference assignment, so a reader that calls get() once per request (or per batch)
+    always sees a fully loaded model and the version that belongs to it. New weights are
+    loaded into a fresh model instance off to the side and only swapped in afterwards.
+
+    By default the weights file is a state dict loaded into model_factory(). A custom
+    loader(weights_bytes) -> model can be given for other artifacts (e.g. compiled models).
+    """
+
+    def __init__(self, weights_path, device, model_factory, loader=None):
+        self.weights_path = weights_path
+        self.device = device
+        self.model_factory = model_factory
+        self.loader = loader
+
+        self._active = (None, UNTRAINED_VERSION)
+        self._reload_lock = threading.Lock() # Serializes reloads, never taken by readers
+        self._file_signature = None # (mtime_ns, size) of the weights file last seen
+        self._watcher = None
+        self._stop_event = threading.Event()
+
+        self.reload_count = 0
+        self.last_error = None
+
+    #  Readers
+    def get(self):
+        """Returns the active (model, version) snapshot."""
+        return self._active
+
+    @property
+    def model(self):
+        return self._active[0]
+
+    @property
+    def version(self):
+        return self._active[1]
+
+    #  Loading
+    def _build_model(self, state_dict=None):
+        model = self.model_factory()
+        if state_dict is not None:
+            model.load_state_dict(state_dict)
+        model.to(self.device)
+        model.eval()
+        return model
+
+    def _read_signature(self):
+        try:
+            st = os.stat(self.weights_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def load_initial(self):
+        """Loads weights at startup, falling back to a freshly initialized model."""
+        if os.path.exists(self.weights_path):
+            if self.reload(force=True):
+                logging.info(f"Loaded existing model weights from {self.weights_path} onto {self.device} (version {self.version}).")
+                return
+            logging.error(f"Error loading weights from {self.weights_path}. Starting fresh.")
+        else:
+            logging.info(f"No weights found at {self.weights_path}. Starting fresh.")
+        self._active = (self._build_model(), UNTRAINED_VERSION)
+
+    def reload(self, force=False):
+        """
+        Loads the weights file into a new model and swaps it in if the content changed.
+        Returns True if a new model became active. On failure the current model is kept.
+        """
+        with self._reload_lock:
+            signature = self._read_signature()
+            if signature is None:
+                self.last_error = f"Weights file not found: {self.weights_path}"
+                logging.warning(self.last_error)
+                return False
+            if not force and signature == self._file_signature:
+                return False
+
+            try:
+                with open(self.weights_path, "rb") as f:
+                    weights_bytes = f.read()
+                new_version = weights_version(weights_bytes)
+                self._file_signature = signature
+                if not force and new_version == self.version:
+                    return False # Touched but identical content
+
+                if self.loader is not None:
+                    new_model = self.loader(weights_bytes)
+                else:
+                    import torch # Not needed (or loaded) when a custom loader is used
+                    state_dict = torch.load(io.BytesIO(weights_bytes), map_location=self.device)
+                    new_model = self._build_model(state_dict)
+            except Exception as e:
+                self.last_error = f"Failed to load weights from {self.weights_path}: {e}"
+                logging.error(f"{self.last_error}. Keeping version {self.version}.")
+                return False
+
+            old_version = self.version
+            self._active = (new_model, new_version) # Atomic swap: in-flight requests keep their snapshot
+            self.reload_count += 1
+            self.last_error = None
+            logging.info(f"Model weights reloaded: {old_version} -> {new_version}")
+            return True
+
+    def reload_async(self, force=False):
+        """Starts a reload in a background thread and returns the thread."""
+        thread = threading.Thread(target=self.reload, kwargs={"force": force}, name="ModelReload", daemon=True)
+        thread.start()
+        return thread
+
+    #  File Watching
+    def start_watcher(self, poll_seconds):
+        """Polls the weights file every poll_seconds and reloads it when it changes."""
+        if poll_seconds <= 0 or (self._watcher is not None and self._watcher.is_alive()):
+            return
+        if self._file_signature is None:
+            self._file_signature = self._read_signature()
+
+        def watch():
+            while not self._stop_event.wait(poll_seconds):
+                try:
+                    if self._read_signature() not in (None, self._file_signature):
+                        self.reload()
+                except Exception:
+                    logging.exception("Error in weights watcher:")
+
+        self._watcher = threading.Thread(target=watch, name="WeightsWatcher", daemon=True)
+        self._watcher.start()
+        logging.info(f"Watching {self.weights_path} for new weights every {poll_seconds}s.")
+
+    def stop_watcher(self):
+        self._stop_event.set()
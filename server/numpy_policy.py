@@ -0,0 +1,274 @@
+# server/numpy_policy.py
+#
+# Torch-free inference for CatanSimpleMLP. The weights of model_weights.pth are converted
+# once to a plain .npz archive (fc1/fc2/fc3 weight and bias arrays); NumpyPolicy runs the
+# same three-layer forward pass and masked action choice as CatanSimpleMLP.predict_action
+# with NumPy only, so the AI server can start without importing torch
+# (CATAN_INFERENCE_BACKEND=numpy, launcher: --backend numpy).
+#
+# Usage (from the project root):
+#   python server/numpy_policy.py convert                 # server/model_weights.pth -> server/model_weights.npz
+#   python server/numpy_policy.py convert --weights server/iterations/settlerbot_2.pth --output bot2.npz
+#   python server/numpy_policy.py report                  # cold start time / RSS: torch vs numpy, plus parity
+
+import argparse
+import io
+import logging
+import os
+import random
+import subprocess
+import sys
+
+import numpy as np
+
+try:
+    if __package__:
+        from .action_mapping import build_action_masks, TOTAL_ACTIONS
+    else:
+        from action_mapping import build_action_masks, TOTAL_ACTIONS
+except ImportError as e:
+    logging.error(f"NumPy Policy Import Error: {e}")
+    raise
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WEIGHTS_PATH = os.path.join(SCRIPT_DIR, "model_weights.pth")
+
+LAYER_NAMES = ("fc1", "fc2", "fc3")
+DEFAULT_EPSILON = 0.15 # Same as model.DEFAULT_EPSILON (not imported: model.py imports torch)
+
+
+def npz_path_for(weights_path):
+    """model_weights.pth -> model_weights.npz (next to the checkpoint)."""
+    return os.path.splitext(weights_path)[0] + ".npz"
+
+
+def convert_weights(weights_path, output_path=None):
+    """Converts a CatanSimpleMLP state dict (.pth) into a .npz archive. Needs torch. Returns the output path."""
+    import torch # Only the one-off conversion needs torch
+
+    output_path = output_path or npz_path_for(weights_path)
+    state_dict = torch.load(weights_path, map_location="cpu")
+    arrays = {}
+    for layer in LAYER_NAMES:
+        arrays[f"{layer}.weight"] = state_dict[f"{layer}.weight"].numpy().astype(np.float32)
+        arrays[f"{layer}.bias"] = state_dict[f"{layer}.bias"].numpy().astype(np.float32)
+
+    tmp_path = output_path + ".tmp.npz" # np.savez appends .npz to other names
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, output_path) # Atomic, so a watching server never reads a partial file
+    logging.info(f"Converted {weights_path} -> {output_path}")
+    return output_path
+
+
+def ensure_npz(weights_path):
+    """
+    The .npz for a .pth state dict, converted first when it is missing or older than the .pth
+    (the conversion imports torch). Raises RuntimeError when the .pth exists but no .npz can be made.
+    """
+    output_path = npz_path_for(weights_path)
+    if not os.path.exists(weights_path):
+        return output_path
+    if os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(weights_path):
+        return output_path
+    try:
+        return convert_weights(weights_path, output_path)
+    except Exception as e:
+        if not os.path.exists(output_path):
+            raise RuntimeError(f"Could not convert {weights_path} to {output_path} ({e}). "
+                               f"Run 'python server/numpy_policy.py convert' where torch is installed.") from e
+        logging.warning(f"Could not convert {weights_path} ({e}). Using the older {output_path}.")
+        return output_path
+
+
+class NumpyPolicy:
+    """
+    NumPy implementation of CatanSimpleMLP inference (eval mode: dropout is a no-op).
+    Takes (N, input_size) or (input_size,) float32 arrays and returns (N, output_size) scores.
+    """
+
+    runs_on_numpy = True # Tells the server/batcher to pass NumPy arrays instead of torch tensors
+
+    def __init__(self, arrays, epsilon=DEFAULT_EPSILON):
+        self.weights = [np.ascontiguousarray(arrays[f"{layer}.weight"].T, dtype=np.float32) for layer in LAYER_NAMES]
+        self.biases = [np.asarray(arrays[f"{layer}.bias"], dtype=np.float32) for layer in LAYER_NAMES]
+        self.input_size = self.weights[0].shape[0]
+        self.output_size = self.weights[-1].shape[1]
+        self.epsilon = epsilon
+
+    @classmethod
+    def initialized(cls, input_size, output_size, hidden_sizes=(512, 256), seed=None):
+        """Freshly initialized policy (used when no weights exist yet), with nn.Linear's default uniform init."""
+        rng = np.random.default_rng(seed)
+        sizes = (input_size,) + tuple(hidden_sizes) + (output_size,)
+        arrays = {}
+        for layer, fan_in, fan_out in zip(LAYER_NAMES, sizes[:-1], sizes[1:]):
+            bound = 1.0 / np.sqrt(fan_in)
+            arrays[f"{layer}.weight"] = rng.uniform(-bound, bound, (fan_out, fan_in)).astype(np.float32)
+            arrays[f"{layer}.bias"] = rng.uniform(-bound, bound, fan_out).astype(np.float32)
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, npz_bytes_or_path):
+        """Loads a .npz written by convert_weights (path or raw file bytes)."""
+        source = io.BytesIO(npz_bytes_or_path) if isinstance(npz_bytes_or_path, bytes) else npz_bytes_or_path
+        with np.load(source) as archive:
+            return cls({name: archive[name] for name in archive.files})
+
+    def forward(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[None, :]
+        x = np.maximum(x @ self.weights[0] + self.biases[0], 0.0)
+        x = np.maximum(x @ self.weights[1] + self.biases[1], 0.0)
+        return x @ self.weights[2] + self.biases[2]
+
+    __call__ = forward
+
+    # Model-store compatibility with torch modules (no devices or training mode to switch)
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+    def predict_action(self, state_vector, available_actions, use_exploration=True):
+        """Same contract as CatanSimpleMLP.predict_action, for a single state vector."""
+        return self.select_action(self.forward(state_vector)[0], available_actions, use_exploration)
+
+    def predict_actions(self, states, masks, epsilon=None, generator=None):
+        """Same contract as CatanSimpleMLP.predict_actions, with a NumPy Generator; returns an int64 array."""
+        scores = self.forward(states)
+        masks = np.asarray(masks, dtype=bool)
+        explored = self.draw_exploration(masks, epsilon, generator)
+        greedy = np.where(masks, scores, -np.inf).argmax(axis=1)
+        chosen = np.where(explored >= 0, explored, greedy)
+        return np.where(masks.any(axis=1), chosen, -1)
+
+    @staticmethod
+    def make_generator(seed):
+        """Seeded random source for predict_actions / draw_exploration (np.random.Generator)."""
+        return np.random.default_rng(int(seed))
+
+    def draw_exploration(self, masks, epsilon=None, generator=None):
+        """Same draws as CatanSimpleMLP.draw_exploration (N + N * output_size uniforms), from a NumPy Generator."""
+        masks = np.asarray(masks, dtype=bool)
+        generator = generator if generator is not None else np.random.default_rng()
+        epsilon = self.epsilon if epsilon is None else epsilon
+        explore = generator.random(masks.shape[0]) < epsilon
+        random_choice = np.where(masks, generator.random(masks.shape), -1.0).argmax(axis=1)
+        return np.where(explore & masks.any(axis=1), random_choice, -1)
+
+    def select_action(self, scores, available_actions, use_exploration=True):
+        """Same choice as CatanSimpleMLP.select_action, given one row of scores (shape [output_size])."""
+        return self.select_actions(np.asarray(scores)[None, :], [available_actions], use_exploration)[0]
+
+    def select_actions(self, scores, available_actions_lists, use_exploration=True):
+        """Same choices as CatanSimpleMLP.select_actions: exploration per row, then one masked argmax."""
+        chosen_actions = [None] * len(available_actions_lists)
+        greedy_rows = []
+        for row, available_actions in enumerate(available_actions_lists):
+            if not available_actions:
+                logging.warning("predict_action called with no available actions.")
+                continue
+
+            #  Exploration
+            if use_exploration and random.random() < self.epsilon:
+                chosen_actions[row] = random.choice(available_actions)
+            else:
+                greedy_rows.append(row)
+        if not greedy_rows:
+            return chosen_actions
+
+        #  Otherwise pick best-scoring available action
+        mask, lookups = build_action_masks([available_actions_lists[row] for row in greedy_rows], self.output_size)
+        best_indices = np.where(mask, scores[greedy_rows], -np.inf).argmax(axis=1).tolist()
+        for row, lookup, best_global_idx in zip(greedy_rows, lookups, best_indices):
+            if lookup:
+                chosen_actions[row] = lookup[best_global_idx]
+            else:
+                logging.error("No available actions could be mapped to valid indices!")
+                chosen_actions[row] = next((a for a in available_actions_lists[row] if a.get("actionType") == "END_TURN"), None)
+        return chosen_actions
+
+
+#  Cold start report
+# Fresh interpreter that imports the AI server module (which loads the model) with the given backend
+_COLD_START_TEMPLATE = (
+    "import time, sys, os\n"
+    "t0 = time.perf_counter()\n"
+    "os.environ.update(CATAN_INFERENCE_BACKEND={backend!r}, CATAN_WEIGHTS_PATH={weights!r},\n"
+    "                  CATAN_WEIGHTS_POLL_SECONDS='0', CATAN_BATCHING='0')\n"
+    "sys.path.insert(0, {server_dir!r})\n"
+    "import catan_ai\n"
+    "elapsed = time.perf_counter() - t0\n"
+    "try:\n"
+    "    # Peak RSS of this process (ru_maxrss would include the parent's peak on Linux)\n"
+    "    with open('/proc/self/status') as f:\n"
+    "        rss_mb = next(int(l.split()[1]) for l in f if l.startswith('VmHWM')) / 1024.0\n"
+    "except OSError:\n"
+    "    rss_mb = float('nan') # Not available on Windows\n"
+    "print(elapsed, rss_mb, 'torch' in sys.modules)\n"
+)
+
+
+def measure_cold_start(backend, weights_path, runs=3):
+    """Starts fresh interpreters that import the server and load the model. Returns (best seconds, peak RSS MB, torch imported)."""
+    code = _COLD_START_TEMPLATE.format(backend=backend, weights=weights_path, server_dir=SCRIPT_DIR)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()[-3:]
+        results.append((float(output[0]), float(output[1]), output[2] == "True"))
+    return min(r[0] for r in results), max(r[1] for r in results), results[0][2]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Torch-free NumPy inference for CatanSimpleMLP.")
+    parser.add_argument("command", choices=["convert", "report"])
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH, help="CatanSimpleMLP checkpoint (.pth)")
+    parser.add_argument("--output", default=None, help="Output .npz (default: next to the checkpoint)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logging.error(f"Weights file not found: {args.weights}")
+        sys.exit(1)
+    npz_path = convert_weights(args.weights, args.output)
+    if args.command == "convert":
+        return
+
+    # Parity with the torch model on random schema-valid states
+    import torch
+    if __package__:
+        from .model import CatanSimpleMLP
+        from .game_state_encoder import vectorize_state
+        from .benchmark_server import make_dummy_state
+    else:
+        from model import CatanSimpleMLP
+        from game_state_encoder import vectorize_state
+        from benchmark_server import make_dummy_state
+    torch_model = CatanSimpleMLP()
+    torch_model.load_state_dict(torch.load(args.weights, map_location="cpu"))
+    torch_model.eval()
+    numpy_model = NumpyPolicy.load(npz_path)
+
+    rng = random.Random(0)
+    states = [make_dummy_state(rng, num_actions=24) for _ in range(2000)]
+    vectors = np.stack([vectorize_state(s) for s in states])
+    with torch.no_grad():
+        torch_scores = torch_model(torch.from_numpy(vectors))
+    numpy_scores = numpy_model(vectors)
+    differing = sum(1 for row, s in enumerate(states)
+                    if torch_model.select_action(torch_scores[row], s["availableActions"], use_exploration=False)
+                    != numpy_model.select_action(numpy_scores[row], s["availableActions"], use_exploration=False))
+    print(f"\nParity on {len(states)} random states: {differing} different choices, "
+          f"max |score difference| {np.abs(torch_scores.numpy() - numpy_scores).max():.2e}")
+
+    print(f"\nCold start (fresh interpreter: import catan_ai, which loads the model), best of 3:")
+    print(f"{'backend':<8} {'seconds':>9} {'peak RSS MB':>12} {'torch imported':>15}")
+    for backend in ("torch", "numpy"):
+        seconds, rss_mb, torch_imported = measure_cold_start(backend, args.weights)
+        print(f"{backend:<8} {seconds:>9.3f} {rss_mb:>12.1f} {str(torch_imported):>15}")
+
+
+if __name__ == "__main__":
+    main()
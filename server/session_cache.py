@@ -0,0 +1,165 @@
+# server/session_cache.py
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+#  Defaults (overridable via environment in catan_ai.py)
+DEFAULT_MAX_SESSIONS = 256
+DEFAULT_TTL_SECONDS = 600.0
+
+
+def derive_game_seed(base_seed, game_id):
+    """Per-game exploration seed from a server-wide base seed and the game id (stable across runs and platforms)."""
+    digest = hashlib.sha256(f"{base_seed}:{game_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") >> 1 # Non-negative 63-bit int, valid for torch and NumPy
+
+
+class GameSession:
+    """
+    Cached state vector of one game (patched by delta requests), the model the game is routed to
+    and, for seeded games, the random generator its exploration draws come from.
+    """
+    __slots__ = ("game_id", "state_vector", "model_id", "seed", "generator", "lock", "created_at", "last_access")
+
+    def __init__(self, game_id, state_vector, model_id=None):
+        self.game_id = game_id
+        self.state_vector = state_vector
+        self.model_id = model_id # None: the server's default model
+        self.seed = None
+        self.generator = None # Created on the first seeded decision (see SessionCache.generator_for)
+        self.lock = threading.Lock() # Held while the vector is patched or copied
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+
+
+class SessionCache:
+    """
+    Maps a game id to its GameSession. Bounded in two ways so games abandoned by
+    timed-out or killed clients do not accumulate: at most max_sessions entries
+    (least recently used is evicted first) and sessions idle for longer than
+    ttl_seconds are dropped on the next access to the cache.
+    """
+
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_sessions = max(1, int(max_sessions))
+        self.ttl_seconds = float(ttl_seconds)
+        self._sessions = OrderedDict() # game_id -> GameSession, least recently used first
+        self._lock = threading.Lock()
+
+        self.lru_evictions = 0
+        self.ttl_evictions = 0
+        self.misses = 0
+        self.full_updates = 0
+        self.delta_updates = 0
+
+    def _expire(self, now):
+        # Oldest entries sit at the front, so stop at the first one still alive
+        while self._sessions:
+            game_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            del self._sessions[game_id]
+            self.ttl_evictions += 1
+            logging.info(f"Session {game_id} expired after {self.ttl_seconds}s idle.")
+
+    def put(self, game_id, state_vector, model_id=None):
+        """
+        Starts (or restarts) a session from a fully vectorized state. Returns the session.
+        A model_id routes the game's later requests to that checkpoint; None keeps the current routing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.pop(game_id, None)
+            if session is None:
+                session = GameSession(game_id, state_vector, model_id)
+            else:
+                with session.lock:
+                    session.state_vector = state_vector
+                if model_id is not None:
+                    session.model_id = model_id
+            session.last_access = now
+            self.full_updates += 1
+            self._sessions[game_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.lru_evictions += 1
+        return session
+
+    def get(self, game_id):
+        """Returns the live session for game_id (marking it recently used), or None if unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(game_id)
+            if session is None:
+                self.misses += 1
+                return None
+            session.last_access = now
+            self._sessions.move_to_end(game_id)
+        return session
+
+    def patch(self, game_id, patch_fn):
+        """
+        Calls patch_fn(state_vector) on the session's cached vector (modifying it in place)
+        and returns a copy of the patched vector, or None if the session is unknown or expired.
+        Exceptions raised by patch_fn propagate to the caller.
+        """
+        session = self.get(game_id)
+        if session is None:
+            return None
+        with session.lock:
+            patch_fn(session.state_vector)
+            patched = session.state_vector.copy() # Callers may queue it; later deltas must not change it
+        with self._lock:
+            self.delta_updates += 1
+        return patched
+
+    def generator_for(self, game_id, seed, make_generator):
+        """
+        Returns (session, generator) for a seeded game. The generator is created with
+        make_generator(seed) on first use and recreated if a different seed is sent; seed=None
+        keeps the game's current one. It continues across requests, so the Nth decision of a
+        game always uses the Nth draw. generator is None for an unseeded game, and both are
+        None for an unknown or expired session. Draw from it while holding session.lock.
+        """
+        with self._lock:
+            session = self._sessions.get(game_id)
+        if session is None:
+            return None, None
+        with session.lock:
+            if seed is not None and (session.generator is None or session.seed != seed):
+                session.seed = seed
+                session.generator = make_generator(seed)
+            return session, session.generator
+
+    def model_id_for(self, game_id):
+        """Model id the game is routed to (None for the default model or an unknown session)."""
+        with self._lock:
+            session = self._sessions.get(game_id)
+            return session.model_id if session is not None else None
+
+    def discard(self, game_id):
+        with self._lock:
+            return self._sessions.pop(game_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get_stats(self):
+        """Returns session counts and eviction counters as a JSON-serializable dict."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "activeSessions": len(self._sessions),
+                "maxSessions": self.max_sessions,
+                "ttlSeconds": self.ttl_seconds,
+                "lruEvictions": self.lru_evictions,
+                "ttlEvictions": self.ttl_evictions,
+                "misses": self.misses,
+                "fullUpdates": self.full_updates,
+                "deltaUpdates": self.delta_updates,
+            }
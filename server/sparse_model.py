@@ -0,0 +1,199 @@
+# server/sparse_model.py
+#
+# Sparse front end for CatanSimpleMLP. Only about a third of the 687 state features are
+# non-zero (one-hot road/building owners and types, a few scalars), so the first layer can be
+# computed as an EmbeddingBag-style weighted sum of the fc1 weight rows of the active
+# features instead of a dense (687 x 512) matrix product. Input is the
+# (indices, values, offsets) layout of game_state_encoder.to_sparse.
+#
+# CatanSparseMLP keeps the state dict format of CatanSimpleMLP, so model_weights.pth and the
+# iteration checkpoints load into it unchanged (and its own checkpoints load into the dense model).
+#
+# Usage (from the project root):
+#   python server/sparse_model.py                      # parity with the dense model, CPU latency and dataset memory
+#   python server/sparse_model.py --weights server/iterations/settlerbot_2.pth --threads 1
+
+import argparse
+import io
+import logging
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+try:
+    if __package__:
+        from .model import CatanSimpleMLP
+        from .game_state_encoder import vectorize_states, to_sparse, vectorize_states_sparse, TOTAL_VECTOR_SIZE
+        from .action_mapping import TOTAL_ACTIONS
+    else:
+        from model import CatanSimpleMLP
+        from game_state_encoder import vectorize_states, to_sparse, vectorize_states_sparse, TOTAL_VECTOR_SIZE
+        from action_mapping import TOTAL_ACTIONS
+except ImportError as e:
+    logging.error(f"Sparse Model Import Error: {e}")
+    raise
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_WEIGHTS_PATH = os.path.join(SCRIPT_DIR, "model_weights.pth")
+BENCHMARK_BATCH_SIZES = (1, 16, 256)
+
+
+def sparse_batch(indices, values, offsets):
+    """to_sparse output (NumPy) -> the (indices, values, offsets) tensors CatanSparseMLP takes."""
+    return (torch.from_numpy(np.asarray(indices, dtype=np.int64)),
+            torch.from_numpy(np.asarray(values, dtype=np.float32)),
+            torch.from_numpy(np.asarray(offsets, dtype=np.int64)))
+
+
+class SparseLinear(nn.Module):
+    """
+    nn.Linear whose input may be sparse: weight is stored transposed, (in_features, out_features),
+    so each active feature selects one contiguous row (the layout of nn.EmbeddingBag).
+    State dicts use nn.Linear's (out_features, in_features) layout in both directions.
+    """
+
+    def __init__(self, in_features, out_features):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        linear = nn.Linear(in_features, out_features) # Same initialization as the dense layer
+        self.weight = nn.Parameter(linear.weight.detach().t().contiguous())
+        self.bias = nn.Parameter(linear.bias.detach().clone())
+
+    def forward(self, x):
+        """x: a dense (N, in_features) tensor, or an (indices, values, offsets) tuple with len(offsets) == N + 1."""
+        if isinstance(x, (tuple, list)):
+            indices, values, offsets = x
+            return F.embedding_bag(indices, self.weight, offsets, mode="sum",
+                                   per_sample_weights=values, include_last_offset=True) + self.bias
+        return torch.addmm(self.bias, x, self.weight)
+
+    def _save_to_state_dict(self, destination, prefix, keep_vars):
+        weight = self.weight if keep_vars else self.weight.detach()
+        destination[prefix + "weight"] = weight.t()
+        destination[prefix + "bias"] = self.bias if keep_vars else self.bias.detach()
+
+    def _load_from_state_dict(self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs):
+        key = prefix + "weight"
+        if key in state_dict and tuple(state_dict[key].shape) == (self.out_features, self.in_features):
+            state_dict[key] = state_dict[key].t() # load_state_dict passes a copy of the caller's dict
+        super()._load_from_state_dict(state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs)
+
+
+class CatanSparseMLP(CatanSimpleMLP):
+    """
+    CatanSimpleMLP with a sparse first layer. forward() takes either dense state vectors
+    (same as CatanSimpleMLP) or sparse_batch(*to_sparse(...)), and gives the same scores up to
+    float summation order. predict_action / select_action are inherited.
+    """
+
+    def __init__(self, input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS,
+                 hidden_size1=512, hidden_size2=256, dropout_prob=0.3):
+        super().__init__(input_size, output_size, hidden_size1, hidden_size2, dropout_prob)
+        self.fc1 = SparseLinear(input_size, hidden_size1)
+
+    def forward(self, x):
+        if not isinstance(x, (tuple, list)):
+            if not isinstance(x, torch.Tensor):
+                x = torch.tensor(x, dtype=torch.float32)
+            if x.dim() == 1:
+                x = x.unsqueeze(0)
+            elif x.dim() > 2:
+                x = x.view(x.size(0), -1)
+
+        x = F.relu(self.fc1(x))
+        x = self.dropout(x)
+        x = F.relu(self.fc2(x))
+        x = self.dropout(x)
+        return self.fc3(x)
+
+
+def load_sparse_model(weights_bytes_or_path):
+    """Builds an eval-mode CatanSparseMLP on the CPU from a (dense) CatanSimpleMLP .pth state dict."""
+    source = io.BytesIO(weights_bytes_or_path) if isinstance(weights_bytes_or_path, bytes) else weights_bytes_or_path
+    model = CatanSparseMLP(input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS)
+    model.load_state_dict(torch.load(source, map_location="cpu"))
+    return model.eval()
+
+
+#  Benchmark
+def benchmark(model, model_input, batch_size, seconds=1.0):
+    """Returns mean latency in ms per forward pass of model_input (a batch of batch_size states) on the CPU."""
+    with torch.no_grad():
+        for _ in range(10):
+            model(model_input) # Warm-up
+        iterations = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < seconds:
+            model(model_input)
+            iterations += 1
+    return (time.perf_counter() - t0) / iterations * 1000.0
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compare the sparse-input CatanSparseMLP with the dense CatanSimpleMLP.")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS_PATH, help="CatanSimpleMLP checkpoint (.pth)")
+    parser.add_argument("--states", type=int, default=5000, help="Number of states for the parity check and memory report")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads for the benchmark")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        logging.error(f"Weights file not found: {args.weights}")
+        sys.exit(1)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if __package__:
+        from .compiled_model import load_fp32_model, load_replay_states, DEFAULT_REPLAY_DIRS
+        from .benchmark_server import make_dummy_state
+    else:
+        from compiled_model import load_fp32_model, load_replay_states, DEFAULT_REPLAY_DIRS
+        from benchmark_server import make_dummy_state
+
+    dense_model = load_fp32_model(args.weights)
+    sparse_model = load_sparse_model(args.weights)
+    states = load_replay_states(DEFAULT_REPLAY_DIRS, args.states)
+    source = "replayed states from self-play logs"
+    if not states:
+        rng = random.Random(0)
+        states = [make_dummy_state(rng, num_actions=24) for _ in range(args.states)]
+        source = "random states (no self-play logs found)"
+
+    #  Parity
+    dense_vectors = vectorize_states(states)
+    indices, values, offsets = vectorize_states_sparse(states)
+    with torch.no_grad():
+        dense_scores = dense_model(torch.from_numpy(dense_vectors))
+        sparse_scores = sparse_model(sparse_batch(indices, values, offsets))
+    differing = sum(1 for row, s in enumerate(states)
+                    if dense_model.select_action(dense_scores[row], s["availableActions"], use_exploration=False)
+                    != sparse_model.select_action(sparse_scores[row], s["availableActions"], use_exploration=False))
+    print(f"\nParity on {len(states)} {source}: {differing} different choices, "
+          f"max |score difference| {(dense_scores - sparse_scores).abs().max().item():.2e}")
+
+    #  Dataset memory
+    dense_bytes = dense_vectors.nbytes
+    sparse_bytes = indices.nbytes + values.nbytes + offsets.nbytes
+    print(f"\nTraining data for {len(states)} states: dense {dense_bytes / 2**20:.2f} MB, "
+          f"sparse {sparse_bytes / 2**20:.2f} MB ({100.0 * (1 - sparse_bytes / dense_bytes):.0f}% saved, "
+          f"{len(indices) / len(states):.0f} of {TOTAL_VECTOR_SIZE} features active per state)")
+
+    #  Latency
+    print(f"\nCPU forward latency ({torch.get_num_threads()} threads), inputs already encoded:")
+    print(f"{'batch':>6} {'dense ms':>10} {'sparse ms':>10} {'speedup':>8}")
+    for batch_size in BENCHMARK_BATCH_SIZES:
+        dense_input = torch.from_numpy(dense_vectors[:batch_size])
+        sparse_input = sparse_batch(*to_sparse(dense_vectors[:batch_size]))
+        dense_ms = benchmark(dense_model, dense_input, batch_size)
+        sparse_ms = benchmark(sparse_model, sparse_input, batch_size)
+        print(f"{batch_size:>6} {dense_ms:>10.3f} {sparse_ms:>10.3f} {dense_ms / sparse_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-import json
+import functools
 import os
 import random
 import sys
+import time
 from tqdm import tqdm
 import logging
 import numpy as np
@@ -18,12 +19,16 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 try:
     if __package__:
         from .model import CatanSimpleMLP
-        from .game_state_encoder import vectorize_state, TOTAL_VECTOR_SIZE
-        from .action_mapping import get_action_index, TOTAL_ACTIONS
+        from .game_state_encoder import TOTAL_VECTOR_SIZE, ENCODER_VERSION
+        from .action_mapping import TOTAL_ACTIONS
+        from .numpy_policy import convert_weights
+        from .log_dataset import LogDatasetCache, ShardedDataset, DEFAULT_CACHE_DIR, INGEST_WORKERS, parse_game_log, parse_log_files
     else:
         from model import CatanSimpleMLP
-        from game_state_encoder import vectorize_state, TOTAL_VECTOR_SIZE
-        from action_mapping import get_action_index, TOTAL_ACTIONS
+        from game_state_encoder import TOTAL_VECTOR_SIZE, ENCODER_VERSION
+        from action_mapping import TOTAL_ACTIONS
+        from numpy_policy import convert_weights
+        from log_dataset import LogDatasetCache, ShardedDataset, DEFAULT_CACHE_DIR, INGEST_WORKERS, parse_game_log, parse_log_files
 except ImportError as e:
      logging.error(f"Import Error: {e}. Make sure running from correct directory or package installed.")
      sys.exit(1)
@@ -32,6 +37,8 @@ except ImportError as e:
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_DIR = os.path.join(SCRIPT_DIR, "..", "client", "SelfPlayLogs")
 WEIGHTS_PATH = os.path.join(SCRIPT_DIR, "model_weights.pth")
+# Preprocessed shards of the logs (log_dataset.py); CATAN_DATASET_CACHE=0 re-parses every log on each run
+USE_DATASET_CACHE = os.environ.get("CATAN_DATASET_CACHE", "1") != "0"
 
 #  Hyperparameters 
 NORMAL_LR = 0.001
@@ -45,37 +52,42 @@ TARGET_TURNS = 120
 MAX_TURNS = 400
 
 #  Play Mode Boost 
-# How many times to duplicate samples from Human vs Bot games
-PLAY_MODE_DUPLICATION_FACTOR = 20 # Increased for play mode to boost training from human games
+# How many times each sample from Human vs Bot games is drawn per epoch (sample_order: the
+# same draws as duplicating every sample, without storing the copies)
+PLAY_MODE_SAMPLE_FACTOR = 20 # Increased for play mode to boost training from human games
 
 # 
 
-#  Updated load_training_data with duplication_factor 
-def load_training_data(log_dir, duplication_factor=1):
+def log_parser():
+    """parse_game_log with this script's reward shaping, as a picklable callable for ingestion workers."""
+    return functools.partial(parse_game_log, win_bonus=BASE_WIN_BONUS, target_turns=TARGET_TURNS, max_turns=MAX_TURNS)
+
+def parse_log_file(file_path):
+    """Parses, reward-shapes and vectorizes one game log (see log_dataset.parse_game_log)."""
+    return log_parser()(file_path)
+
+
+def load_training_data(log_dir, workers=INGEST_WORKERS):
     """
-    Loads training data from .jsonl logs, applying reward shaping and sample duplication.
+    Loads training data from .jsonl logs, applying reward shaping.
 
     Args:
         log_dir (str): Path to the directory containing log files.
-        duplication_factor (int): How many times to repeat each sample (turn).
-                                   Defaults to 1. Use >1 for play mode boost.
+        workers (int): Processes parsing log files (CATAN_INGEST_WORKERS; 0 = one per CPU core).
+                       Files are merged in name order whatever the worker count.
     """
     states, actions, rewards = [], [], []
     logging.info(f"Attempting to load logs from: {log_dir}")
-    if duplication_factor > 1:
-        logging.info(f"Applying Sample Duplication Factor: {duplication_factor}")
     logging.info(f"Reward shaping: BaseWinBonus={BASE_WIN_BONUS}, TargetTurns={TARGET_TURNS}, MaxTurns={MAX_TURNS}")
 
-    # ... (rest of the initial checks and file listing remain the same) ...
-    if not os.path.exists(log_dir) or not os.path.isdir(log_dir): # Check added here
+    if not os.path.exists(log_dir) or not os.path.isdir(log_dir):
         logging.error(f"Log directory {log_dir} does not exist!")
         return states, actions, rewards
 
-    log_files = [f for f in os.listdir(log_dir) if f.endswith(".jsonl")]
-    if not log_files: # Check added here
+    log_files = sorted(f for f in os.listdir(log_dir) if f.endswith(".jsonl"))
+    if not log_files:
         logging.warning(f"No .jsonl files found in {log_dir}.")
         return states, actions, rewards
-    # 
 
     logging.info(f"Found {len(log_files)} log files.")
     processed_games = 0
@@ -83,112 +95,99 @@ def load_training_data(log_dir, duplication_factor=1):
     invalid_data_points = 0
     games_with_issues = 0
 
-    for file_name in log_files:
-        file_path = os.path.join(log_dir, file_name)
-        game_processed_successfully = True
-        try:
-            with open(file_path, "r") as f:
-                line = f.readline()
-                if not line.strip():
-                    logging.warning(f"Skipping empty log file: {file_name}")
-                    games_with_issues += 1
-                    continue
-                game_record = json.loads(line.strip())
-
-            winner_index = game_record.get("winnerPlayerIndex", -1)
-            turns = game_record.get("turns", [])
-            num_turns = len(turns)
-
-            if not turns:
-                logging.warning(f"Skipping game with no turns in {file_name}")
-                games_with_issues += 1
-                continue
-
-            # Calculate Speed Multiplier
-            speed_multiplier = 0.0
-            if winner_index != -1:
-                if num_turns <= TARGET_TURNS: speed_multiplier = 1.0
-                elif num_turns > MAX_TURNS: speed_multiplier = 0.0
-                else: speed_multiplier = 1.0 - ((num_turns - TARGET_TURNS) / float(MAX_TURNS - TARGET_TURNS))
-                logging.debug(f"Game {file_name}: Winner {winner_index}, Turns {num_turns}, SpeedMultiplier {speed_multiplier:.3f}")
-
-            # Find Last Winning Turn Index
-            last_winning_turn_index = -1
-            if winner_index != -1:
-                for idx in range(num_turns - 1, -1, -1):
-                    if turns[idx].get("state", {}).get("currentPlayerIndex") == winner_index:
-                        last_winning_turn_index = idx
-                        break
-
-            # Process each turn
-            for idx, turn in enumerate(turns):
-                try:
-                    state = turn.get("state")
-                    action = turn.get("action")
-                    original_reward = turn.get("reward")
-
-                    if state is None or action is None or original_reward is None:
-                        invalid_data_points += 1
-                        continue
-
-                    state_vector = vectorize_state(state)
-                    if state_vector is None:
-                        invalid_data_points += 1
-                        continue
-
-                    action_idx = get_action_index(action)
-                    if action_idx is None:
-                        invalid_data_points += 1
-                        continue
-
-                    final_reward = float(original_reward)
-                    if idx == last_winning_turn_index:
-                        applied_bonus = BASE_WIN_BONUS * speed_multiplier
-                        final_reward += applied_bonus
-                        if applied_bonus > 0: logging.debug(f"  Applied speed bonus {applied_bonus:.2f} to turn {idx} (Final reward: {final_reward:.2f})")
-
-                    #  Apply Duplication 
-                    for _ in range(duplication_factor):
-                        states.append(state_vector)
-                        actions.append(action_idx)
-                        rewards.append(final_reward)
-                    # 
-                    processed_turns += 1 # Count original turns processed
-
-                except Exception as turn_err:
-                    logging.warning(f"Error processing turn {idx} in {file_name}: {turn_err}")
-                    invalid_data_points += 1
-                    game_processed_successfully = False
-                    continue # Continue processing other turns if possible
-
-            if game_processed_successfully:
-                processed_games += 1
-
-        except json.JSONDecodeError:
-            logging.warning(f"Skipping invalid JSON in file: {file_name}")
+    results = parse_log_files(log_parser(), [os.path.join(log_dir, f) for f in log_files], workers)
+    for file_name, (parsed, error) in zip(log_files, results):
+        if error is not None:
+            logging.error(f"Error processing file {file_name}: {error}")
             games_with_issues += 1
-        except Exception as file_err:
-            logging.error(f"Error processing file {file_name}: {file_err}")
+            continue
+        if parsed is None:
             games_with_issues += 1
+            continue
+        state_vectors, game_actions, game_rewards, game_invalid, game_processed_successfully = parsed
+        invalid_data_points += game_invalid
+        states.extend(state_vectors)
+        actions.extend(game_actions.tolist())
+        rewards.extend(game_rewards.tolist())
+        processed_turns += len(game_actions)
+
+        if game_processed_successfully:
+            processed_games += 1
 
     logging.info(f"Finished loading logs. Processed {processed_games} games successfully.")
     if games_with_issues > 0: logging.warning(f"Skipped or encountered issues processing {games_with_issues} game files.")
-    # Log the total number of samples *after* duplication
     final_sample_count = len(states)
-    logging.info(f"Total original turns processed: {processed_turns}. Invalid/skipped data points: {invalid_data_points}.")
-    logging.info(f"Total training samples loaded (after duplication): {final_sample_count}.")
+    logging.info(f"Total turns processed: {processed_turns}. Invalid/skipped data points: {invalid_data_points}.")
+    logging.info(f"Total training samples loaded: {final_sample_count}.")
     if final_sample_count == 0: logging.error("No valid training data loaded!")
     return states, actions, rewards
 
 
+def dataset_cache_key():
+    """Cache key for preprocessed shards: everything baked into the stored rows (encoder layout, action space, reward shaping)."""
+    return f"enc{ENCODER_VERSION}_v{TOTAL_VECTOR_SIZE}_a{TOTAL_ACTIONS}_bonus{BASE_WIN_BONUS:g}_turns{TARGET_TURNS}-{MAX_TURNS}"
+
+def open_log_dataset(log_dir, cache_dir=DEFAULT_CACHE_DIR):
+    """Brings the shard cache for log_dir up to date and returns its memory-mapped ShardedDataset (see log_dataset.py)."""
+    return LogDatasetCache(cache_dir, dataset_cache_key(), log_parser()).open(log_dir)
+
+
+def sample_order(num_rows, factor=1):
+    """
+    Row order for one epoch: every row drawn factor times, uniformly shuffled. These are the
+    draws of shuffling a dataset holding factor copies of every row, without storing the copies.
+    """
+    if factor == 1:
+        return torch.randperm(num_rows)
+    return torch.arange(num_rows).repeat_interleave(factor)[torch.randperm(num_rows * factor)]
+
+
+def stack_training_tensors(data, device):
+    """
+    Reads every row of data once into contiguous (states, actions, rewards) tensors. For a CUDA
+    device they go to page-locked host memory, so batches can be copied without blocking.
+    """
+    states, actions, rewards = data.gather(np.arange(len(data)))
+    tensors = [torch.from_numpy(array) for array in (states, actions, rewards)]
+    if device.type == "cuda":
+        tensors = [t.pin_memory() for t in tensors]
+    return tensors
+
+def tensor_batches(tensors, batch_size, device, order=None):
+    """
+    Yields (states, actions, rewards) batches on device, visiting the rows in order (default:
+    a fresh random permutation) by slicing it and indexing the stacked tensors. From pinned memory
+    each batch is gathered into one of two pinned buffers and copied with non_blocking=True; a CUDA
+    event keeps a buffer from being refilled while its previous copy is still in flight.
+    """
+    order = torch.randperm(len(tensors[1])) if order is None else order
+    pinned = tensors[0].is_pinned()
+    if pinned:
+        buffers = [[torch.empty((batch_size,) + t.shape[1:], dtype=t.dtype).pin_memory() for t in tensors] for _ in range(2)]
+        copied = [None, None]
+    for step, start in enumerate(range(0, len(order), batch_size)):
+        rows = order[start:start + batch_size]
+        if not pinned:
+            yield [torch.index_select(t, 0, rows).to(device) for t in tensors]
+            continue
+        slot = step % 2
+        if copied[slot] is not None:
+            copied[slot].synchronize()
+        batch = [torch.index_select(t, 0, rows, out=buffer[:len(rows)]) for t, buffer in zip(tensors, buffers[slot])]
+        batch = [b.to(device, non_blocking=True) for b in batch]
+        copied[slot] = torch.cuda.Event()
+        copied[slot].record()
+        yield batch
+
+
 def train(mode="train"):
     logging.info(f"Starting training in '{mode}' mode.")
 
-    #  Determine Duplication Factor based on mode 
-    effective_duplication_factor = 1
+    #  Determine Sample Factor based on mode 
+    sample_factor = 1
     if mode == "play":
-        effective_duplication_factor = PLAY_MODE_DUPLICATION_FACTOR
-        logging.info(f"Play mode detected. Applying duplication factor: {effective_duplication_factor}")
+        sample_factor = PLAY_MODE_SAMPLE_FACTOR
+        logging.info(f"Play mode detected. Drawing every sample {sample_factor} times per epoch.")
     # 
 
     if not os.path.exists(LOG_DIR) or not os.path.isdir(LOG_DIR):
@@ -199,13 +198,18 @@ def train(mode="train"):
     if torch.cuda.is_available(): device = torch.device("cuda"); logging.info("Using GPU.")
     else: device = torch.device("cpu"); logging.info("Using CPU.")
 
-    #  Load Data with potential duplication 
-    states, actions, rewards = load_training_data(LOG_DIR, duplication_factor=effective_duplication_factor)
-    # 
-    if not states:
+    #  Load Data 
+    if USE_DATASET_CACHE:
+        data = open_log_dataset(LOG_DIR)
+        logging.info(f"Memory-mapped {len(data)} preprocessed turns from the dataset cache.")
+    else:
+        states, actions, rewards = load_training_data(LOG_DIR)
+        data = ShardedDataset.from_arrays(states, actions, rewards)
+    if len(data) == 0:
         logging.error("No valid training data loaded. Exiting.")
         return
-    num_samples = len(states) # This is now the potentially duplicated count
+    num_rows = len(data)
+    num_samples = num_rows * sample_factor # Draws per epoch
 
     # Adjust batch size if fewer samples than BATCH_SIZE
     if num_samples < BATCH_SIZE:
@@ -215,6 +219,10 @@ def train(mode="train"):
         effective_batch_size = BATCH_SIZE
     logging.info(f"Using Effective Batch Size: {effective_batch_size}")
 
+    # Stack the dataset once; batches are then slices of a permutation into these tensors
+    tensors = stack_training_tensors(data, device)
+    del data
+
     # Model Setup
     model = CatanSimpleMLP(input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS)
     if os.path.exists(WEIGHTS_PATH):
@@ -231,23 +239,13 @@ def train(mode="train"):
 
     #  Training Loop 
     model.train()
-    dataset = list(zip(states, actions, rewards))
     for epoch in range(EPOCHS):
-        random.shuffle(dataset)
         total_loss = 0.0
         num_batches = (num_samples + effective_batch_size - 1) // effective_batch_size
 
-        pbar = tqdm(range(0, num_samples, effective_batch_size), desc=f"Epoch {epoch+1}/{EPOCHS}", total=num_batches)
-        for i in pbar:
-            batch = dataset[i:min(i + effective_batch_size, num_samples)]
-            if not batch: continue
-
-            # Prepare Batch (Move to Device)
-            batch_states_np = np.array([s for (s, _, _) in batch], dtype=np.float32)
-            batch_states = torch.tensor(batch_states_np).to(device)
-            batch_actions = torch.tensor([a for (_, a, _) in batch], dtype=torch.long).to(device)
-            batch_rewards = torch.tensor([r for (_, _, r) in batch], dtype=torch.float32).to(device)
-
+        order = sample_order(num_rows, sample_factor)
+        pbar = tqdm(tensor_batches(tensors, effective_batch_size, device, order), desc=f"Epoch {epoch+1}/{EPOCHS}", total=num_batches)
+        for batch_states, batch_actions, batch_rewards in pbar:
             # Forward -> Loss -> Backward -> Optimize
             outputs = model(batch_states)
             action_preds = outputs.gather(1, batch_actions.unsqueeze(1)).squeeze(1)
@@ -266,13 +264,164 @@ def train(mode="train"):
     # Save Model Weights
     os.makedirs(os.path.dirname(WEIGHTS_PATH), exist_ok=True)
     try:
-        model.to('cpu'); torch.save(model.state_dict(), WEIGHTS_PATH); logging.info(f"Model weights saved to {WEIGHTS_PATH}."); model.to(device);
+        # Write to a temp file and rename so a running server never hot-reloads a half-written file
+        tmp_path = WEIGHTS_PATH + ".tmp"
+        model.to('cpu'); torch.save(model.state_dict(), tmp_path); os.replace(tmp_path, WEIGHTS_PATH)
+        logging.info(f"Model weights saved to {WEIGHTS_PATH}."); model.to(device);
+        convert_weights(WEIGHTS_PATH) # .npz copy for the NumPy inference backend
     except Exception as e: logging.error(f"Error saving model weights: {e}")
 
+
+#  Reports 
+def _report_data(log_dir):
+    """(states, actions, rewards, description) from the logs in log_dir, or from 100 synthetic self-play games if it has none."""
+    import tempfile
+    if __package__:
+        from .log_dataset import write_synthetic_logs
+    else:
+        from log_dataset import write_synthetic_logs
+
+    states, actions, rewards = load_training_data(log_dir) if os.path.isdir(log_dir) else ([], [], [])
+    if states:
+        return states, actions, rewards, log_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_logs(tmp, 100, 20)
+        states, actions, rewards = load_training_data(tmp)
+    return states, actions, rewards, "100 synthetic games"
+
+def _list_batches(samples, batch_size, device, order=None):
+    """
+    The original loop: shuffle a list of (state, action, reward) tuples (or put it in order) and
+    rebuild every batch from lists.
+    """
+    if order is None:
+        random.shuffle(samples)
+    else:
+        samples = [samples[j] for j in order]
+    for i in range(0, len(samples), batch_size):
+        batch = samples[i:i + batch_size]
+        yield (torch.tensor(np.array([s for (s, _, _) in batch], dtype=np.float32)).to(device),
+               torch.tensor([a for (_, a, _) in batch], dtype=torch.long).to(device),
+               torch.tensor([r for (_, _, r) in batch], dtype=torch.float32).to(device))
+
+def _gather_batches(data, batch_size, device):
+    """The shard loop: shuffle row numbers and gather every batch from the (memory-mapped) shards."""
+    rows = np.random.permutation(len(data))
+    for i in range(0, len(rows), batch_size):
+        states, actions, rewards = data.gather(rows[i:i + batch_size])
+        yield torch.from_numpy(states).to(device), torch.from_numpy(actions).to(device), torch.from_numpy(rewards).to(device)
+
+def _run_steps(batches, device, max_steps=None, lr=NORMAL_LR):
+    """
+    Trains a fresh model (seeded, so runs are comparable) on the batches like train() does.
+    Returns (model, steps, seconds), batch preparation included.
+    """
+    torch.manual_seed(0)
+    model = CatanSimpleMLP(input_size=TOTAL_VECTOR_SIZE, output_size=TOTAL_ACTIONS).to(device)
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    loss_fn = nn.MSELoss()
+    steps, t0 = 0, time.perf_counter()
+    for states, actions, rewards in batches:
+        preds = model(states).gather(1, actions.unsqueeze(1)).squeeze(1)
+        loss = loss_fn(preds, rewards)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        loss.item() # train() reads the loss every step, which also waits for the device
+        steps += 1
+        if steps == max_steps:
+            break
+    return model, steps, time.perf_counter() - t0
+
+def sampling_report(log_dir=LOG_DIR, factor=PLAY_MODE_SAMPLE_FACTOR, batch_size=BATCH_SIZE):
+    """
+    Compares play-mode sampling (sample_order over the stacked tensors) with the old duplication
+    of every sample in Python lists. Both play one epoch from the same initial model and the same
+    shuffle, which must end at identical weights. Also reports the draws per row and the memory and
+    time of the epoch. Uses the logs in log_dir, or synthetic self-play logs when there are none.
+    """
+    import tracemalloc
+
+    states, actions, rewards, source = _report_data(log_dir)
+    data = ShardedDataset.from_arrays(states, actions, rewards)
+    num_rows = len(data)
+    cpu = torch.device("cpu")
+
+    # Draws: every row exactly factor times per epoch
+    draws = torch.bincount(sample_order(num_rows, factor), minlength=num_rows)
+    draws_ok = bool((draws == factor).all())
+
+    # Memory: the old loop appended factor copies of every (state, action, reward) tuple to a list
+    tracemalloc.start()
+    duplicated = []
+    for sample in zip(states, actions, rewards):
+        for _ in range(factor):
+            duplicated.append(sample)
+    old_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # One epoch each. Copy j of the list is row j // factor, so the same permutation of the draws
+    # gives both loops the same batches in the same order.
+    permutation = torch.randperm(num_rows * factor)
+    order = torch.arange(num_rows).repeat_interleave(factor)[permutation]
+    tensors = stack_training_tensors(data, cpu)
+    old_model, old_steps, old_seconds = _run_steps(_list_batches(duplicated, batch_size, cpu, permutation.tolist()), cpu, lr=FAST_LR)
+    new_model, new_steps, new_seconds = _run_steps(tensor_batches(tensors, batch_size, cpu, order), cpu, lr=FAST_LR)
+    max_diff = max((a - b).abs().max().item() for a, b in zip(old_model.parameters(), new_model.parameters()))
+
+    print(f"\nPlay-mode sampling ({factor} draws per row per epoch) vs duplicating every sample {factor}x, "
+          f"{num_rows} turns from {source}, batch size {batch_size}")
+    print(f"every row drawn exactly {factor} times per epoch: {draws_ok}")
+    print(f"after one epoch from the same model and shuffle: {old_steps} vs {new_steps} Adam steps, max |weight difference| {max_diff:.2e}")
+    print(f"sample bookkeeping: duplicated list {old_bytes / 2**20:8.2f} MB, epoch order {order.numel() * order.element_size() / 2**20:6.2f} MB "
+          f"(state data stored once: {tensors[0].numel() * 4 / 2**20:.1f} MB)")
+    print(f"one epoch: duplicated lists {old_seconds:8.2f} s, sampled tensors {new_seconds:8.2f} s ({old_seconds / new_seconds:.2f}x)")
+
+
+def _batches_per_second(batches, max_steps):
+    """Batches prepared per second over up to max_steps batches, without training on them."""
+    steps, t0 = 0, time.perf_counter()
+    for _ in batches:
+        steps += 1
+        if steps == max_steps:
+            break
+    return steps / (time.perf_counter() - t0)
+
+def loop_benchmark(log_dir=LOG_DIR, batch_size=BATCH_SIZE, max_steps=300):
+    """
+    Training steps per second of the list-of-tuples loop, the per-batch shard gather loop and the
+    stacked tensor loop of train(), on the same data, model and objective, and how many batches
+    per second each prepares on its own (the host-side work the stacked tensors remove).
+    """
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    states, actions, rewards, source = _report_data(log_dir)
+    data = ShardedDataset.from_arrays(states, actions, rewards)
+    samples = list(zip(states, actions, rewards))
+
+    t0 = time.perf_counter()
+    tensors = stack_training_tensors(data, device)
+    stack_seconds = time.perf_counter() - t0
+
+    print(f"\nTraining loop on {device}, {len(data)} turns from {source}, batch size {batch_size}, up to {max_steps} steps per loop")
+    print(f"{'loop':<30} {'steps':>6} {'steps/s':>9} {'speedup':>8} {'batches/s (prep only)':>22} {'speedup':>8}")
+    loops = (("list of tuples (original)", lambda: _list_batches(samples, batch_size, device)),
+             ("gather from shards per batch", lambda: _gather_batches(data, batch_size, device)),
+             ("stacked tensors (train)", lambda: tensor_batches(tensors, batch_size, device)))
+    baseline = None
+    for name, batches in loops:
+        _, steps, seconds = _run_steps(batches(), device, max_steps)
+        rate = steps / seconds
+        prep_rate = _batches_per_second(batches(), max_steps)
+        baseline = baseline or (rate, prep_rate)
+        print(f"{name:<30} {steps:>6} {rate:>9.1f} {rate / baseline[0]:>7.2f}x {prep_rate:>22.0f} {prep_rate / baseline[1]:>7.1f}x")
+    print(f"Stacking the dataset into tensors once took {stack_seconds:.3f} s ({tensors[0].numel() * 4 / 2**20:.1f} MB of states).")
+
 if __name__ == "__main__":
     mode = "train"
     if len(sys.argv) > 1:
         arg_mode = sys.argv[1].lower()
+        if arg_mode == "sampling-report": sampling_report(); sys.exit(0)
+        if arg_mode == "loop-benchmark": loop_benchmark(); sys.exit(0)
         if arg_mode in ["train", "play"]: mode = arg_mode
         else: logging.warning(f"Invalid mode '{sys.argv[1]}'. Using default 'train'.")
     train(mode)
\ No newline at end of file